@@ -66,7 +66,7 @@ module "users-task-def" {
       "value" : "30"
     },
     {
-      "name" : "TOTAL_USERS_BY_RUN",
+      "name" : "REGISTRATION_MAX_BATCH_SIZE",
       "value" : "200"
     },
     {
@@ -10,3 +10,5 @@ class Config:
     REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 10080))
     JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "secret")
+    PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
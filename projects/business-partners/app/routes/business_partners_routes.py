@@ -25,13 +25,13 @@ router = APIRouter(
 
 @router.post("/registration")
 async def register_business_partner(business_partner: BusinessPartnerCreate, db: Session = Depends(get_db)):
-    register_business_partner_response = BusinessPartnersService(db).create_business_partner(business_partner)
+    register_business_partner_response = await BusinessPartnersService(db).create_business_partner(business_partner)
     return JSONResponse(content=register_business_partner_response, status_code=201)
 
 
 @router.post("/login")
 async def login_business_partner(business_partner_credentials: BusinessPartnerCredentials, db: Session = Depends(get_db)):
-    auth_data = BusinessPartnersService(db).authenticate_business_partner(business_partner_credentials)
+    auth_data = await BusinessPartnersService(db).authenticate_business_partner(business_partner_credentials)
     return JSONResponse(content=auth_data, status_code=200)
 
 
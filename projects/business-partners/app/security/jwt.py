@@ -21,8 +21,8 @@ class JWTManager:
         except JWTError:
             raise InvalidCredentialsError("Invalid or expired refresh token")
 
-    def process_email_password_login(self, user_id, input_password, user_password):
-        if not PasswordManager.verify_password(input_password, user_password):
+    async def process_email_password_login(self, user_id, input_password, user_password):
+        if not await PasswordManager.verify_password_async(input_password, user_password):
             raise InvalidCredentialsError("Invalid email or password")
 
         scopes = ["business_partner"]
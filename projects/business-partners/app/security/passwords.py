@@ -1,16 +1,52 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from app.config.settings import Config
+
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
 
 class PasswordManager:
+    # bcrypt releases the GIL while hashing, so a thread pool spreads the work over the available cores
+    _executor = None
+
     @staticmethod
     def get_password_hash(password: str) -> str:
-        pwd_bytes = password.encode("utf-8")
-        salt = bcrypt.gensalt(rounds=12)
+        pwd_bytes = password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+        salt = bcrypt.gensalt(rounds=Config.PASSWORD_HASH_ROUNDS)
         hashed_password = bcrypt.hashpw(password=pwd_bytes, salt=salt)
         return hashed_password.decode("utf-8")
 
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
-        password_bytes = password.encode("utf-8")
+        password_bytes = password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
         hashed_password_bytes = hashed_password.encode("utf-8")
         return bcrypt.checkpw(password=password_bytes, hashed_password=hashed_password_bytes)
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        rounds = int(hashed_password.split("$")[2])
+        return rounds < Config.PASSWORD_HASH_ROUNDS
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return cls._executor
+
+    @classmethod
+    async def get_password_hash_async(cls, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(cls._get_executor(), cls.get_password_hash, password)
+
+    @classmethod
+    async def verify_password_async(cls, password: str, hashed_password: str) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(cls._get_executor(), cls.verify_password, password, hashed_password)
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True)
+            cls._executor = None
@@ -40,7 +40,7 @@ class BusinessPartnersService:
         self.aws_service = AWSClient()
         self.external_services = ExternalServices()
 
-    def create_business_partner(self, business_partner: BusinessPartnerCreate):
+    async def create_business_partner(self, business_partner: BusinessPartnerCreate):
         existing_business_partner = (
             self.db.query(BusinessPartner)
             .filter(
@@ -52,7 +52,7 @@ class BusinessPartnersService:
             raise EntityExistsError("Business partner with this email already exists")
 
         business_partner_dict = business_partner.dict()
-        business_partner_dict["hashed_password"] = PasswordManager.get_password_hash(business_partner_dict["password"])
+        business_partner_dict["hashed_password"] = await PasswordManager.get_password_hash_async(business_partner_dict["password"])
         del business_partner_dict["password"]
 
         business_partner = BusinessPartner(**business_partner_dict)
@@ -60,16 +60,16 @@ class BusinessPartnersService:
         self.db.commit()
         return DataClassMapper.to_dict(business_partner)
 
-    def authenticate_business_partner(self, business_partner_credentials: BusinessPartnerCredentials):
+    async def authenticate_business_partner(self, business_partner_credentials: BusinessPartnerCredentials):
         if business_partner_credentials.refresh_token:
             return self.jwt_manager.process_refresh_token_login(business_partner_credentials.refresh_token)
         else:
-            return self._process_email_password_login(
+            return await self._process_email_password_login(
                 business_partner_credentials.email,
                 business_partner_credentials.password,
             )
 
-    def _process_email_password_login(self, business_partner_credentials_email, business_partner_credentials_password):
+    async def _process_email_password_login(self, business_partner_credentials_email, business_partner_credentials_password):
         business_partner = (
             self.db.query(BusinessPartner)
             .filter(
@@ -80,12 +80,19 @@ class BusinessPartnersService:
         if not business_partner:
             raise InvalidCredentialsError("Invalid email or password")
 
-        return self.jwt_manager.process_email_password_login(
+        tokens = await self.jwt_manager.process_email_password_login(
             business_partner.business_partner_id,
             business_partner_credentials_password,
             business_partner.hashed_password,
         )
 
+        # Hashes with fewer rounds than configured are upgraded while the password is known
+        if PasswordManager.needs_rehash(business_partner.hashed_password):
+            business_partner.hashed_password = await PasswordManager.get_password_hash_async(business_partner_credentials_password)
+            self.db.commit()
+
+        return tokens
+
     def create_business_partner_product(self, create_product: CreateBusinessPartnerProduct, business_partner_id):
         business_partner = (
             self.db.query(BusinessPartner)
@@ -6,6 +6,7 @@ from fastapi.responses import JSONResponse
 from app.routes import business_partners_routes
 from app.exceptions.exceptions import NotFoundError, InvalidValueError, InvalidCredentialsError, EntityExistsError, AWSException
 from app.config.db import engine, base
+from app.security.passwords import PasswordManager
 
 load_dotenv()
 app = FastAPI()
@@ -16,6 +17,11 @@ base.metadata.create_all(bind=engine)
 app.include_router(business_partners_routes.router)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    PasswordManager.shutdown()
+
+
 @app.exception_handler(AWSException)
 async def aws_exception_handler(request, exc):
     return JSONResponse(status_code=500, content={"message": str(exc)})
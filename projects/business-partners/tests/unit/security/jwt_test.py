@@ -124,9 +124,19 @@ class TestJWTManager(unittest.TestCase):
             self.jwt_manager.process_refresh_token_login(refresh_token)
         self.assertEqual(str(context.exception), INVALID_EXPIRED_MESSAGE)
 
-    @patch("app.security.jwt.PasswordManager.verify_password")
+
+class TestJWTManagerEmailPasswordLogin(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.jwt_manager = JWTManager(
+            secret_key=fake.word(),
+            algorithm=fake.word(),
+            access_token_expiry_minutes=fake.random_int(1, 10),
+            refresh_token_expiry_minutes=fake.random_int(1, 10),
+        )
+
+    @patch("app.security.jwt.PasswordManager.verify_password_async")
     @patch("app.security.jwt.JWTManager.generate_tokens")
-    def test_process_email_password_login(self, mock_generate_tokens, mock_verify_password):
+    async def test_process_email_password_login(self, mock_generate_tokens, mock_verify_password):
         user_id = fake.uuid4()
         input_password = fake.word()
         user_password = fake.word()
@@ -140,7 +150,7 @@ class TestJWTManager(unittest.TestCase):
             "refresh_token_expires_minutes": fake.random_int(1, 10),
         }
 
-        response = self.jwt_manager.process_email_password_login(
+        response = await self.jwt_manager.process_email_password_login(
             user_id=user_id,
             input_password=input_password,
             user_password=user_password,
@@ -152,8 +162,8 @@ class TestJWTManager(unittest.TestCase):
         self.assertIn("refresh_token", response)
         self.assertIn("refresh_token_expires_minutes", response)
 
-    @patch("app.security.jwt.PasswordManager.verify_password")
-    def test_process_email_password_login_invalid_password(self, mock_verify_password):
+    @patch("app.security.jwt.PasswordManager.verify_password_async")
+    async def test_process_email_password_login_invalid_password(self, mock_verify_password):
         user_id = fake.uuid4()
         input_password = fake.word()
         user_password = fake.word()
@@ -161,7 +171,7 @@ class TestJWTManager(unittest.TestCase):
         mock_verify_password.return_value = False
 
         with self.assertRaises(InvalidCredentialsError) as context:
-            self.jwt_manager.process_email_password_login(
+            await self.jwt_manager.process_email_password_login(
                 user_id=user_id,
                 input_password=input_password,
                 user_password=user_password,
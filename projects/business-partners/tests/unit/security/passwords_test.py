@@ -4,6 +4,8 @@ import unittest
 from unittest.mock import patch
 
 from faker import Faker
+
+from app.config.settings import Config
 from app.security.passwords import PasswordManager
 
 fake = Faker()
@@ -29,6 +31,15 @@ class TestPasswordManager(unittest.TestCase):
 
         hashed_password = PasswordManager.get_password_hash(fake_password)
         self.assertEqual(hashed_password, fake_hashed_password)
+        mock_gensalt.assert_called_once_with(rounds=Config.PASSWORD_HASH_ROUNDS)
+
+    @patch("bcrypt.hashpw")
+    def test_hash_password_truncates_long_passwords(self, mock_hashpw):
+        mock_hashpw.return_value = b"$2b$04$hashed"
+
+        PasswordManager.get_password_hash("a" * 100)
+
+        self.assertEqual(mock_hashpw.call_args.kwargs["password"], b"a" * 72)
 
     @patch("bcrypt.checkpw")
     def test_verify_password(self, mock_checkpw):
@@ -47,3 +58,23 @@ class TestPasswordManager(unittest.TestCase):
 
         is_valid = PasswordManager.verify_password(fake_password, fake_hashed_password)
         self.assertFalse(is_valid)
+
+    def test_needs_rehash(self):
+        hashed_password = PasswordManager.get_password_hash(fake.word())
+
+        self.assertFalse(PasswordManager.needs_rehash(hashed_password))
+        with patch.object(Config, "PASSWORD_HASH_ROUNDS", Config.PASSWORD_HASH_ROUNDS + 1):
+            self.assertTrue(PasswordManager.needs_rehash(hashed_password))
+
+
+class TestPasswordManagerAsync(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        PasswordManager.shutdown()
+
+    async def test_hash_and_verify_password_async(self):
+        fake_password = fake.password()
+
+        hashed_password = await PasswordManager.get_password_hash_async(fake_password)
+
+        self.assertTrue(await PasswordManager.verify_password_async(fake_password, hashed_password))
+        self.assertFalse(await PasswordManager.verify_password_async(fake.word(), hashed_password))
@@ -1,11 +1,12 @@
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, make_url, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
 
 from os import environ as env
 
 
-def _create_engine():
+def _database_url():
     user = env.get("DB_USER", "postgres")
     password = env.get("DB_PASSWORD", "postgres")
     host = env.get("DB_HOST", "localhost")
@@ -13,7 +14,12 @@ def _create_engine():
     db_name = env.get("DB_NAME", "postgres")
     db_driver = env.get("DB_DRIVER", "postgresql")
 
-    db_url = env.get("DATABASE_URL", f"{db_driver}://{user}:{password}@{host}:{port}/{db_name}")
+    return env.get("DATABASE_URL", f"{db_driver}://{user}:{password}@{host}:{port}/{db_name}")
+
+
+def _create_engine():
+    db_driver = env.get("DB_DRIVER", "postgresql")
+    db_url = _database_url()
 
     try:
         if db_driver == "test":
@@ -30,6 +36,23 @@ def _create_engine():
         raise e
 
 
+def _create_async_engine():
+    # The SQLite test mode has no async driver, requests fall back to the sync session there
+    if env.get("DB_DRIVER", "postgresql") == "test" or env.get("DB_ASYNC", "true").lower() != "true":
+        return None, None
+
+    db_url = make_url(_database_url()).set(drivername="postgresql+asyncpg")
+
+    try:
+        new_async_engine = create_async_engine(db_url)
+        new_async_session_local = async_sessionmaker(autocommit=False, autoflush=False, bind=new_async_engine)
+
+        return new_async_engine, new_async_session_local
+    except Exception as e:
+        print(f"Error creating async engine: {e}")
+        raise e
+
+
 def get_db():
     db = session_local()
     try:
@@ -38,5 +61,19 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    if async_session_local is None:
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    async with async_session_local() as db:
+        yield db
+
+
 engine, session_local = _create_engine()
+async_engine, async_session_local = _create_async_engine()
 base = declarative_base()
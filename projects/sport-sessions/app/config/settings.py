@@ -8,3 +8,49 @@ class Config:
     AVG_CALORIES_PER_STEP = float(os.getenv("AVG_CALORIES_PER_STEP", 0.04))
     NO_OWNER_MESSAGE = os.getenv("NO_OWNER_MESSAGE", "User is not the owner of the sport session")
     NOT_FOUND_MESSAGE = os.getenv("NOT_FOUND_MESSAGE", "Sport session not found")
+    MAX_LOCATIONS_PER_BATCH = int(os.getenv("MAX_LOCATIONS_PER_BATCH", 500))
+    MAX_LOCATION_CLOCK_SKEW_SECONDS = float(os.getenv("MAX_LOCATION_CLOCK_SKEW_SECONDS", 300))
+    LOCATION_STREAM_FLUSH_SIZE = int(os.getenv("LOCATION_STREAM_FLUSH_SIZE", 50))
+    LOCATION_STREAM_FLUSH_SECONDS = float(os.getenv("LOCATION_STREAM_FLUSH_SECONDS", 5))
+    LOCATION_STREAM_MAX_PENDING = int(os.getenv("LOCATION_STREAM_MAX_PENDING", 5000))
+    LOCATION_STREAM_MAX_FRAME_SIZE = int(os.getenv("LOCATION_STREAM_MAX_FRAME_SIZE", 262144))
+    MAX_SENSOR_SAMPLES_PER_BATCH = int(os.getenv("MAX_SENSOR_SAMPLES_PER_BATCH", 600))
+    SENSOR_MAX_SAMPLE_GAP = float(os.getenv("SENSOR_MAX_SAMPLE_GAP", 5))
+    HEARTRATE_ZONES = [int(bound) for bound in os.getenv("HEARTRATE_ZONES", "0,114,133,152,171").split(",")]
+    LOCATION_BUFFER_PATH = os.getenv("LOCATION_BUFFER_PATH", "")
+    LOCATION_BUFFER_FLUSH_SECONDS = float(os.getenv("LOCATION_BUFFER_FLUSH_SECONDS", 1))
+    LOCATION_BUFFER_FLUSH_SIZE = int(os.getenv("LOCATION_BUFFER_FLUSH_SIZE", 2000))
+    LOCATION_BUFFER_RETENTION_SECONDS = float(os.getenv("LOCATION_BUFFER_RETENTION_SECONDS", 3600))
+    SESSION_STATE_CACHE_SECONDS = float(os.getenv("SESSION_STATE_CACHE_SECONDS", 5))
+    SESSION_STATE_CACHE_SIZE = int(os.getenv("SESSION_STATE_CACHE_SIZE", 10000))
+    LOCATION_PARTITION_MONTHS_AHEAD = int(os.getenv("LOCATION_PARTITION_MONTHS_AHEAD", 2))
+    LOCATION_RETENTION_DAYS = int(os.getenv("LOCATION_RETENTION_DAYS", 0))
+    LOCATION_RETENTION_BATCH_SIZE = int(os.getenv("LOCATION_RETENTION_BATCH_SIZE", 100))
+    LOCATION_RETENTION_INTERVAL_SECONDS = float(os.getenv("LOCATION_RETENTION_INTERVAL_SECONDS", 3600))
+    LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", 100))
+    LIVE_FEED_PING_SECONDS = int(os.getenv("LIVE_FEED_PING_SECONDS", 15))
+    LIVE_FEED_POLL_SECONDS = float(os.getenv("LIVE_FEED_POLL_SECONDS", 2))
+    GEOHASH_PRECISION = int(os.getenv("GEOHASH_PRECISION", 7))
+    MAX_AREA_QUERY_CELLS = int(os.getenv("MAX_AREA_QUERY_CELLS", 32))
+    MAX_AREA_POLYGON_POINTS = int(os.getenv("MAX_AREA_POLYGON_POINTS", 100))
+    MOVING_SPEED_THRESHOLD = float(os.getenv("MOVING_SPEED_THRESHOLD", 0.5))
+    SPLIT_DISTANCE = float(os.getenv("SPLIT_DISTANCE", 1))
+    AUTO_PAUSE_MIN_SECONDS = float(os.getenv("AUTO_PAUSE_MIN_SECONDS", 10))
+    SEGMENTS_WORKERS = int(os.getenv("SEGMENTS_WORKERS", 2))
+    COMPUTE_SEGMENTS_ON_FINISH = os.getenv("COMPUTE_SEGMENTS_ON_FINISH", "true").lower() == "true"
+    ARCHIVE_TRACKS_ON_FINISH = os.getenv("ARCHIVE_TRACKS_ON_FINISH", "true").lower() == "true"
+    TRACK_ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("TRACK_ARCHIVE_COMPRESSION_LEVEL", 6))
+    ROUTE_TOLERANCE = float(os.getenv("ROUTE_TOLERANCE", 5))
+    ROUTE_MAX_POINTS = int(os.getenv("ROUTE_MAX_POINTS", 500))
+    MAX_ROUTE_POINTS = int(os.getenv("MAX_ROUTE_POINTS", 5000))
+    # Cached routes are keyed by these steps, so near identical requests share one row
+    ROUTE_TOLERANCE_STEP = float(os.getenv("ROUTE_TOLERANCE_STEP", 1))
+    ROUTE_MAX_POINTS_STEP = int(os.getenv("ROUTE_MAX_POINTS_STEP", 50))
+    MAX_ROUTE_TOLERANCE = float(os.getenv("MAX_ROUTE_TOLERANCE", 1000))
+    MAX_CACHED_ROUTES_PER_SESSION = int(os.getenv("MAX_CACHED_ROUTES_PER_SESSION", 10))
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 65536))
+    SPORT_SESSIONS_PAGE_SIZE = int(os.getenv("SPORT_SESSIONS_PAGE_SIZE", 50))
+    MAX_SPORT_SESSIONS_PAGE_SIZE = int(os.getenv("MAX_SPORT_SESSIONS_PAGE_SIZE", 200))
+    REBUILD_ACTIVE_POSITIONS_ON_STARTUP = os.getenv("REBUILD_ACTIVE_POSITIONS_ON_STARTUP", "false").lower() == "true"
+    REBUILD_STATISTICS_ON_STARTUP = os.getenv("REBUILD_STATISTICS_ON_STARTUP", "false").lower() == "true"
@@ -8,6 +8,21 @@ class NotActiveError(Exception):
         super().__init__(message)
 
 
+class NotOwnerError(Exception):
+    def __init__(self, message="User is not the owner of the resource"):
+        super().__init__(message)
+
+
+class InvalidCursorError(Exception):
+    def __init__(self, message="Invalid pagination cursor"):
+        super().__init__(message)
+
+
+class InvalidLocationError(Exception):
+    def __init__(self, message="Invalid location"):
+        super().__init__(message)
+
+
 class InvalidApiKeyError(Exception):
     def __init__(self, message="Invalid API Key"):
         super().__init__(message)
@@ -2,8 +2,8 @@ from datetime import datetime
 from typing import List
 from uuid import uuid4
 
-from sqlalchemy import Column, Uuid, Integer, Float, ForeignKey, Boolean, DateTime
-from sqlalchemy.orm import relationship, Mapped
+from sqlalchemy import Column, Uuid, Integer, Float, ForeignKey, Boolean, DateTime, Date, String, LargeBinary, Index, JSON
+from sqlalchemy.orm import relationship, Mapped, deferred
 from app.config.db import base
 
 
@@ -23,6 +23,33 @@ class SportSession(base):
     avg_heartrate = Column(Integer, nullable=True)
     is_active = Column(Boolean, nullable=False, default=True)
     started_at = Column(DateTime, nullable=False, default=datetime.now())
+    finished_at = Column(DateTime, nullable=True)
+    location_count = Column(Integer, nullable=True, default=0)
+    tracked_distance = Column(Float, nullable=True, default=0)
+    speed_sum = Column(Float, nullable=True, default=0)
+    speed_count = Column(Integer, nullable=True, default=0)
+    last_latitude = Column(Float, nullable=True)
+    last_longitude = Column(Float, nullable=True)
+    last_location_at = Column(DateTime, nullable=True)
+    min_latitude = Column(Float, nullable=True)
+    max_latitude = Column(Float, nullable=True)
+    min_longitude = Column(Float, nullable=True)
+    max_longitude = Column(Float, nullable=True)
+    track_archive = deferred(Column(LargeBinary, nullable=True))
+    track_archived_at = Column(DateTime, nullable=True)
+    sensor_sample_count = Column(Integer, nullable=True, default=0)
+    heartrate_sum = Column(Float, nullable=True, default=0)
+    heartrate_count = Column(Integer, nullable=True, default=0)
+    cadence_sum = Column(Float, nullable=True, default=0)
+    cadence_count = Column(Integer, nullable=True, default=0)
+    power_sum = Column(Float, nullable=True, default=0)
+    power_count = Column(Integer, nullable=True, default=0)
+    max_power = Column(Float, nullable=True)
+    last_heartrate = Column(Float, nullable=True)
+    last_heartrate_at = Column(DateTime, nullable=True)
+    heartrate_zone_seconds = Column(JSON, nullable=True)
+
+    __table_args__ = (Index("ix_sport_sessions_user_id_started_at", "user_id", "started_at", "session_id"),)
 
 
 class Location(base):
@@ -37,4 +64,72 @@ class Location(base):
     altitude_accuracy = Column(Float, nullable=True)
     heading = Column(Float, nullable=True)
     speed = Column(Float, nullable=True)
-    created_at = Column(DateTime, nullable=False, default=datetime.now())
+    created_at = Column(DateTime, nullable=False, primary_key=True, default=datetime.now())
+
+    # One fix per session and timestamp, retried uploads are dropped by ON CONFLICT DO NOTHING. The index also serves
+    # track reads. On PostgreSQL the table is partitioned by month, so both keys include created_at.
+    __table_args__ = (
+        Index("ux_sport_session_locations_session_id_created_at", session_id, created_at, unique=True),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class SportSessionSensorChunk(base):
+    __tablename__ = "sport_session_sensor_chunks"
+    chunk_id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("sport_sessions.session_id"), nullable=False, index=True)
+    first_sample_at = Column(DateTime, nullable=False)
+    last_sample_at = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    samples = Column(LargeBinary, nullable=False)
+
+
+class ActiveSportSessionPosition(base):
+    __tablename__ = "active_sport_session_positions"
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("sport_sessions.session_id"), primary_key=True)
+    user_id = Column(Uuid(as_uuid=True), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    geohash = Column(String(12), nullable=True)
+    updated_at = Column(DateTime, nullable=False)
+
+    # Area queries filter on geohash prefixes, the pattern ops let PostgreSQL use the index for LIKE 'prefix%'
+    __table_args__ = (Index("ix_active_sport_session_positions_geohash", geohash, postgresql_ops={"geohash": "varchar_pattern_ops"}),)
+
+
+class SportSessionRoute(base):
+    __tablename__ = "sport_session_routes"
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("sport_sessions.session_id"), primary_key=True)
+    tolerance = Column(Float, primary_key=True)
+    max_points = Column(Integer, primary_key=True)
+    original_point_count = Column(Integer, nullable=False)
+    track = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class SportSessionSegments(base):
+    __tablename__ = "sport_session_segments"
+    session_id = Column(Uuid(as_uuid=True), ForeignKey("sport_sessions.session_id"), primary_key=True)
+    split_distance = Column(Float, nullable=False)
+    duration = Column(Float, nullable=False)
+    moving_time = Column(Float, nullable=False)
+    paused_time = Column(Float, nullable=False)
+    moving_speed = Column(Float, nullable=True)
+    splits = Column(JSON, nullable=False)
+    pauses = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+
+
+class SportSessionStatistic(base):
+    __tablename__ = "sport_session_statistics"
+    user_id = Column(Uuid(as_uuid=True), primary_key=True)
+    sport_id = Column(Uuid(as_uuid=True), primary_key=True)
+    period = Column(String(5), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    session_count = Column(Integer, nullable=False, default=0)
+    total_distance = Column(Float, nullable=False, default=0)
+    total_duration = Column(Integer, nullable=False, default=0)
+    total_calories = Column(Float, nullable=False, default=0)
+    total_steps = Column(Integer, nullable=False, default=0)
+    heartrate_sum = Column(Float, nullable=False, default=0)
+    heartrate_count = Column(Integer, nullable=False, default=0)
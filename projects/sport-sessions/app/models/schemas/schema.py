@@ -1,7 +1,9 @@
 import datetime
 from typing import Optional
 
-from pydantic import BaseModel, UUID4, conint, confloat
+from pydantic import BaseModel, UUID4, conint, confloat, conlist, model_validator
+
+from app.config.settings import Config
 
 
 class SportSessionLocationCreate(BaseModel):
@@ -12,6 +14,20 @@ class SportSessionLocationCreate(BaseModel):
     altitude_accuracy: Optional[float] = None
     heading: Optional[float] = None
     speed: Optional[float] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+SportSessionLocationBatch = conlist(SportSessionLocationCreate, min_length=1, max_length=Config.MAX_LOCATIONS_PER_BATCH)
+
+
+class SportSessionSensorSample(BaseModel):
+    heartrate: Optional[confloat(gt=0, lt=300)] = None
+    cadence: Optional[confloat(ge=0)] = None
+    power: Optional[confloat(ge=0)] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+SportSessionSensorBatch = conlist(SportSessionSensorSample, min_length=1, max_length=Config.MAX_SENSOR_SAMPLES_PER_BATCH)
 
 
 class SportSessionFinish(BaseModel):
@@ -25,8 +41,52 @@ class SportSessionFinish(BaseModel):
     avg_heartrate: Optional[confloat(gt=0)] = None
 
 
+class SportSessionFilters(BaseModel):
+    sport_id: Optional[UUID4] = None
+    started_from: Optional[datetime.datetime] = None
+    started_to: Optional[datetime.datetime] = None
+    is_active: Optional[bool] = None
+
+
 class SportSessionStart(BaseModel):
     sport_id: UUID4
     user_id: UUID4
     started_at: datetime.datetime
     initial_location: SportSessionLocationCreate
+
+
+class Coordinate(BaseModel):
+    latitude: confloat(ge=-90, le=90)
+    longitude: confloat(ge=-180, le=180)
+
+
+class BoundingBox(BaseModel):
+    min_latitude: confloat(ge=-90, le=90)
+    min_longitude: confloat(ge=-180, le=180)
+    max_latitude: confloat(ge=-90, le=90)
+    max_longitude: confloat(ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.min_latitude > self.max_latitude or self.min_longitude > self.max_longitude:
+            raise ValueError("min bounds must not be greater than max bounds")
+        return self
+
+
+class ActiveSportSessionArea(BaseModel):
+    bbox: Optional[BoundingBox] = None
+    polygon: Optional[conlist(Coordinate, min_length=3, max_length=Config.MAX_AREA_POLYGON_POINTS)] = None
+
+    @model_validator(mode="after")
+    def check_single_area(self):
+        if (self.bbox is None) == (self.polygon is None):
+            raise ValueError("exactly one of bbox or polygon is required")
+        return self
+
+    def get_bounding_box(self) -> BoundingBox:
+        if self.bbox:
+            return self.bbox
+
+        latitudes = [point.latitude for point in self.polygon]
+        longitudes = [point.longitude for point in self.polygon]
+        return BoundingBox(min_latitude=min(latitudes), min_longitude=min(longitudes), max_latitude=max(latitudes), max_longitude=max(longitudes))
@@ -1,13 +1,35 @@
-from typing import Annotated
+import asyncio
+import contextlib
+import datetime
+import json
+from typing import Annotated, Literal
 
-from fastapi import Depends, APIRouter, Header
-from fastapi.responses import JSONResponse
+from fastapi import Depends, APIRouter, Header, Query, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import UUID4
+from sse_starlette.sse import EventSourceResponse
 
-from app.models.schemas.schema import SportSessionFinish, SportSessionStart, SportSessionLocationCreate
-from app.services.sport_sessions import SportSessionService
-from app.config.db import get_db
+from app.models.schemas.schema import (
+    SportSessionFinish,
+    SportSessionStart,
+    SportSessionLocationCreate,
+    SportSessionLocationBatch,
+    SportSessionFilters,
+    SportSessionSensorBatch,
+    ActiveSportSessionArea,
+)
+from app.services.async_sport_sessions import AsyncSportSessionService, AsyncSportSessionStatisticsService
+from app.services.location_buffer import location_write_buffer
+from app.services.location_stream import LocationStreamBuffer
+from app.services.live_feed import live_session_feed
+from app.services.export import EXPORT_MEDIA_TYPES, stream_sport_sessions_export
+from app.services.utils import check_location_timestamps, to_utc_naive
+from app.tasks.archive import archive_sport_session_track
+from app.tasks.segments import compute_sport_session_segments
+from app.exceptions.exceptions import NotFoundError, NotActiveError, InvalidLocationError
+from app.config.db import get_async_db
 from app.config.settings import Config
 from app.utils import utils
 
@@ -19,60 +41,348 @@ router = APIRouter(
 
 
 @router.post("/")
-async def start_sport_session(sport_session: SportSessionStart, user_id: Annotated[UUID4 | None, Header()] = None, db: Session = Depends(get_db)):
+async def start_sport_session(sport_session: SportSessionStart, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
     if user_id and str(user_id) != str(sport_session.user_id):
         return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
 
-    sport_session = SportSessionService(db).start_sport_session(sport_session)
+    sport_session = await AsyncSportSessionService(db).start_sport_session(sport_session)
     return JSONResponse(content=sport_session, status_code=200)
 
 
 @router.get("/")
-async def get_all_sport_sessions(user_id: Annotated[UUID4 | None, Header()] = None, db: Session = Depends(get_db)):
-    sport_sessions = SportSessionService(db).get_sport_sessions(user_id)
-    return JSONResponse(content=sport_sessions, status_code=200)
+async def get_all_sport_sessions(
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    sport_id: UUID4 | None = None,
+    started_from: datetime.datetime | None = None,
+    started_to: datetime.datetime | None = None,
+    is_active: bool | None = None,
+    limit: Annotated[int, Query(ge=1, le=Config.MAX_SPORT_SESSIONS_PAGE_SIZE)] = Config.SPORT_SESSIONS_PAGE_SIZE,
+    cursor: str | None = None,
+    view: Literal["full", "summary"] = "full",
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    filters = SportSessionFilters(sport_id=sport_id, started_from=started_from, started_to=started_to, is_active=is_active)
+    sport_sessions, next_cursor = await AsyncSportSessionService(db).get_sport_sessions_page(user_id, filters, limit, cursor, summary=view == "summary")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return JSONResponse(content=sport_sessions, status_code=200, headers=headers)
 
 
 @router.get("/active-sport-sessions")
-async def get_active_sport_sessions(db: Session = Depends(get_db), x_api_key: Annotated[str | None, Header()] = None):
+async def get_active_sport_sessions(db: AsyncSession | Session = Depends(get_async_db), x_api_key: Annotated[str | None, Header()] = None):
+    utils.validate_api_key(x_api_key)
+    sport_sessions = await AsyncSportSessionService(db).get_active_sport_sessions()
+    return JSONResponse(content=sport_sessions, status_code=200)
+
+
+@router.post("/active-sport-sessions/search")
+async def search_active_sport_sessions(area: ActiveSportSessionArea, db: AsyncSession | Session = Depends(get_async_db), x_api_key: Annotated[str | None, Header()] = None):
     utils.validate_api_key(x_api_key)
-    sport_sessions = SportSessionService(db).get_active_sport_sessions()
+    sport_sessions = await AsyncSportSessionService(db).get_active_sport_sessions(area)
     return JSONResponse(content=sport_sessions, status_code=200)
 
 
+@router.get("/statistics")
+async def get_sport_session_statistics(
+    period: Literal["week", "month"] = "week",
+    sport_id: UUID4 | None = None,
+    started_from: datetime.date | None = None,
+    started_to: datetime.date | None = None,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    statistics = await AsyncSportSessionStatisticsService(db).get_statistics(user_id, period, sport_id, started_from, started_to)
+    return JSONResponse(content=statistics, status_code=200)
+
+
+@router.get("/export")
+async def export_sport_sessions(user_id: Annotated[UUID4, Header()], export_format: Annotated[Literal["ndjson", "csv", "gpx"], Query(alias="format")] = "ndjson"):
+    return StreamingResponse(
+        stream_sport_sessions_export(user_id, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="sport-sessions-{user_id}.{export_format}"'},
+    )
+
+
 @router.put("/{sport_session_id}/location")
 async def add_locations_to_sport_session(
     sport_session_id: UUID4,
     location: SportSessionLocationCreate,
     user_id: Annotated[UUID4 | None, Header()] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession | Session = Depends(get_async_db),
 ):
-    if user_id:
-        sport_session = SportSessionService(db).get_sport_session(sport_session_id)
-        if sport_session["user_id"] != str(user_id):
-            return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+    if location_write_buffer:
+        # Fixes the flusher would reject are refused here, before they are acknowledged
+        await AsyncSportSessionService(db).check_active_sport_session(sport_session_id, user_id, [location])
+        buffered = await asyncio.to_thread(location_write_buffer.append, sport_session_id, [location], user_id)
+        return JSONResponse(content=buffered, status_code=202)
 
-    sport_session = SportSessionService(db).add_location_to_sport_session(sport_session_id, location)
+    sport_session = await AsyncSportSessionService(db).add_location_to_sport_session(sport_session_id, location, user_id)
     return JSONResponse(content=sport_session, status_code=200)
 
 
+@router.put("/{sport_session_id}/locations")
+async def add_location_batch_to_sport_session(
+    sport_session_id: UUID4,
+    locations: SportSessionLocationBatch,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    if location_write_buffer:
+        # Fixes the flusher would reject are refused here, before they are acknowledged
+        await AsyncSportSessionService(db).check_active_sport_session(sport_session_id, user_id, locations)
+        buffered = await asyncio.to_thread(location_write_buffer.append, sport_session_id, locations, user_id)
+        return JSONResponse(content=buffered, status_code=202)
+
+    locations_batch = await AsyncSportSessionService(db).add_location_batch_to_sport_session(sport_session_id, locations, user_id)
+    return JSONResponse(content=locations_batch, status_code=200)
+
+
+@router.put("/{sport_session_id}/sensors")
+async def add_sensor_samples_to_sport_session(
+    sport_session_id: UUID4,
+    samples: SportSessionSensorBatch,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    samples_batch = await AsyncSportSessionService(db).add_sensor_samples_to_sport_session(sport_session_id, samples, user_id)
+    return JSONResponse(content=samples_batch, status_code=200)
+
+
+@router.websocket("/{sport_session_id}/location/stream")
+async def stream_locations_to_sport_session(
+    websocket: WebSocket,
+    sport_session_id: UUID4,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    try:
+        sport_session = await AsyncSportSessionService(db).get_sport_session(sport_session_id)
+    except NotFoundError as e:
+        await websocket.close(code=4404, reason=str(e))
+        return
+
+    # The stream can stay open for hours, the connection of the initial read goes back to the pool until the first flush
+    await utils.run_with_session(db, lambda session: session.rollback())
+
+    if user_id and sport_session["user_id"] != str(user_id):
+        await websocket.close(code=4403, reason=Config.NO_OWNER_MESSAGE)
+        return
+
+    await websocket.accept()
+    started_at = to_utc_naive(datetime.datetime.fromisoformat(sport_session["started_at"]))
+    location_buffer = LocationStreamBuffer(Config.LOCATION_STREAM_FLUSH_SIZE, Config.LOCATION_STREAM_FLUSH_SECONDS, Config.LOCATION_STREAM_MAX_PENDING)
+
+    async def flush_locations():
+        locations = location_buffer.drain()
+        # Fixes restored after failed flushes can exceed a batch, they are written in batches of the size the batch route accepts
+        for start in range(0, len(locations), Config.MAX_LOCATIONS_PER_BATCH):
+            try:
+                locations_batch = await AsyncSportSessionService(db).add_location_batch_to_sport_session(
+                    sport_session_id, locations[start : start + Config.MAX_LOCATIONS_PER_BATCH], user_id
+                )
+            except NotActiveError:
+                raise
+            except Exception as e:
+                # The fixes are kept for the next flush instead of closing the stream, the client is told they aren't stored yet
+                print(f"Error flushing streamed locations of sport session {sport_session_id}: {e}")
+                await utils.run_with_session(db, lambda session: session.rollback())
+                location_buffer.restore(locations[start:])
+                await websocket.send_json(
+                    {"status": "error", "message": "Locations could not be stored yet, they will be retried", "locations_pending": len(location_buffer.locations)}
+                )
+                return
+            await websocket.send_json({"status": "flushed", **locations_batch})
+
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=location_buffer.seconds_until_flush())
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                if message.get("text") is None:
+                    await websocket.send_json({"status": "error", "message": "Locations must be sent as JSON text frames"})
+                elif len(message["text"]) > Config.LOCATION_STREAM_MAX_FRAME_SIZE:
+                    await websocket.send_json({"status": "error", "message": f"Frames can't be larger than {Config.LOCATION_STREAM_MAX_FRAME_SIZE} characters"})
+                else:
+                    locations = json.loads(message["text"])
+                    locations = locations if isinstance(locations, list) else [locations]
+                    if len(locations) > Config.MAX_LOCATIONS_PER_BATCH:
+                        raise ValueError(f"Frames can't carry more than {Config.MAX_LOCATIONS_PER_BATCH} locations")
+                    # A frame is taken whole or not at all, so the client knows which fixes to send again
+                    frame_locations = [SportSessionLocationCreate(**location) for location in locations]
+                    check_location_timestamps(frame_locations, started_at)
+                    if not location_buffer.has_room(len(frame_locations)):
+                        # The unacknowledged fixes are sent again by the client once the database is back
+                        await websocket.close(code=1013, reason="Locations can't be stored at the moment, try again later")
+                        return
+                    for location in frame_locations:
+                        location_buffer.add(location)
+            except asyncio.TimeoutError:
+                pass
+            except (ValueError, TypeError, InvalidLocationError) as e:
+                await websocket.send_json({"status": "error", "message": str(e)})
+
+            if location_buffer.should_flush():
+                await flush_locations()
+    except WebSocketDisconnect:
+        # The client is gone, so whatever is still buffered is written without an acknowledgement
+        locations = location_buffer.drain()
+        try:
+            for start in range(0, len(locations), Config.MAX_LOCATIONS_PER_BATCH):
+                await AsyncSportSessionService(db).add_location_batch_to_sport_session(sport_session_id, locations[start : start + Config.MAX_LOCATIONS_PER_BATCH], user_id)
+        except NotActiveError:
+            pass
+        except Exception as e:
+            print(f"Error flushing streamed locations of sport session {sport_session_id} after disconnect: {e}")
+    except NotActiveError as e:
+        await websocket.close(code=4423, reason=str(e))
+
+
 @router.patch("/{sport_session_id}")
-async def finish_sport_session(sport_session_id: UUID4, sport_session_input: SportSessionFinish, user_id: Annotated[UUID4 | None, Header()] = None, db: Session = Depends(get_db)):
-    if user_id:
-        sport_session = SportSessionService(db).get_sport_session(sport_session_id)
-        if sport_session["user_id"] != str(user_id):
-            return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+async def finish_sport_session(
+    sport_session_id: UUID4,
+    sport_session_input: SportSessionFinish,
+    background_tasks: BackgroundTasks,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    sport_session = await AsyncSportSessionService(db).finish_sport_session(sport_session_id, sport_session_input, user_id, location_write_buffer)
+
+    # Splits and pauses are computed off the request path, before the track is archived
+    if Config.COMPUTE_SEGMENTS_ON_FINISH:
+        background_tasks.add_task(compute_sport_session_segments, sport_session_id)
+    if Config.ARCHIVE_TRACKS_ON_FINISH:
+        background_tasks.add_task(archive_sport_session_track, sport_session_id)
 
-    sport_session = SportSessionService(db).finish_sport_session(sport_session_id, sport_session_input)
     return JSONResponse(content=sport_session, status_code=200)
 
 
 @router.get("/{sport_session_id}")
-async def get_sport_session(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: Session = Depends(get_db)):
-    sport_session = SportSessionService(db).get_sport_session(sport_session_id)
+async def get_sport_session(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sport_session = await AsyncSportSessionService(db).get_sport_session(sport_session_id)
 
     if user_id:
         if sport_session["user_id"] != str(user_id):
             return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
 
     return JSONResponse(content=sport_session, status_code=200)
+
+
+@router.get("/{sport_session_id}/metrics")
+async def get_sport_session_metrics(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sport_session_metrics = await AsyncSportSessionService(db).get_sport_session_metrics(sport_session_id)
+
+    if user_id and sport_session_metrics["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sport_session_metrics, status_code=200)
+
+
+@router.get("/{sport_session_id}/segments")
+async def get_sport_session_segments(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sport_session_segments = await AsyncSportSessionService(db).get_sport_session_segments(sport_session_id)
+
+    if user_id and sport_session_segments["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sport_session_segments, status_code=200)
+
+
+@router.get("/{sport_session_id}/track")
+async def get_sport_session_track(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sport_session_track = await AsyncSportSessionService(db).get_sport_session_track(sport_session_id)
+
+    if user_id and sport_session_track["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sport_session_track, status_code=200)
+
+
+@router.get("/{sport_session_id}/route")
+async def get_sport_session_route(
+    sport_session_id: UUID4,
+    tolerance: Annotated[float, Query(ge=0, le=Config.MAX_ROUTE_TOLERANCE)] = Config.ROUTE_TOLERANCE,
+    max_points: Annotated[int, Query(ge=2, le=Config.MAX_ROUTE_POINTS)] = Config.ROUTE_MAX_POINTS,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    sport_session_route = await AsyncSportSessionService(db).get_sport_session_route(sport_session_id, tolerance, max_points)
+
+    if user_id and sport_session_route["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sport_session_route, status_code=200)
+
+
+@router.get("/{sport_session_id}/sensors")
+async def get_sport_session_sensor_samples(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sensor_samples = await AsyncSportSessionService(db).get_sport_session_sensor_samples(sport_session_id)
+
+    if user_id and sensor_samples["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sensor_samples, status_code=200)
+
+
+@router.get("/{sport_session_id}/sensors/summary")
+async def get_sport_session_sensor_summary(sport_session_id: UUID4, user_id: Annotated[UUID4 | None, Header()] = None, db: AsyncSession | Session = Depends(get_async_db)):
+    sensor_summary = await AsyncSportSessionService(db).get_sport_session_sensor_summary(sport_session_id)
+
+    if user_id and sensor_summary["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    return JSONResponse(content=sensor_summary, status_code=200)
+
+
+@router.get("/{sport_session_id}/live")
+async def get_live_sport_session(
+    sport_session_id: UUID4,
+    user_id: Annotated[UUID4 | None, Header()] = None,
+    x_api_key: Annotated[str | None, Header()] = None,
+    db: AsyncSession | Session = Depends(get_async_db),
+):
+    # The feed carries the athlete's live position: only the owner or a service holding the API key (e.g. for spectators) gets it
+    if x_api_key is not None:
+        utils.validate_api_key(x_api_key)
+    elif not user_id:
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    snapshot = await AsyncSportSessionService(db).get_live_sport_session(sport_session_id)
+
+    if x_api_key is None and snapshot["user_id"] != str(user_id):
+        return JSONResponse(content={"error": Config.NO_OWNER_MESSAGE}, status_code=403)
+
+    async def get_live_event():
+        # The stream outlives the request scoped session, each read takes its own one and releases it at once
+        try:
+            async with contextlib.asynccontextmanager(get_async_db)() as live_db:
+                return await AsyncSportSessionService(live_db).get_live_sport_session_event(sport_session_id)
+        except Exception as e:
+            print(f"Error reading live sport session {sport_session_id}: {e}")
+            return None
+
+    async def event_generator():
+        # Subscribed before the session is read again, so a finish is either seen by that read or waits in the queue
+        with live_session_feed.subscribe(sport_session_id) as queue:
+            message = await get_live_event() or {"event": "update", "data": snapshot}
+            if message["event"] == "finished":
+                yield {"event": "finished", "data": json.dumps(message["data"])}
+                return
+
+            last_state = message["data"]
+            yield {"event": "snapshot", "data": json.dumps(last_state)}
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), Config.LIVE_FEED_POLL_SECONDS)
+                except TimeoutError:
+                    # Every update carries the full live state, one written by another worker is caught up by this read
+                    message = await get_live_event()
+                    if message is None or message["data"] == last_state:
+                        continue
+                if message["event"] == "update":
+                    last_state = message["data"]
+                yield {"event": message["event"], "data": json.dumps(message["data"])}
+                if message["event"] == "finished":
+                    break
+
+    return EventSourceResponse(event_generator(), ping=Config.LIVE_FEED_PING_SECONDS)
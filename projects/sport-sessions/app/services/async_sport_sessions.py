@@ -0,0 +1,109 @@
+import datetime
+from typing import List, Optional
+
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config.settings import Config
+from app.models.schemas.schema import SportSessionFinish, SportSessionStart, SportSessionLocationCreate, SportSessionFilters, SportSessionSensorSample, ActiveSportSessionArea
+from app.services.location_buffer import LocationWriteBuffer, sport_session_state_cache
+from app.services.sport_sessions import SportSessionService
+from app.services.statistics import SportSessionStatisticsService
+from app.utils.utils import run_with_session
+
+
+class AsyncSportSessionService:
+    """Awaitable counterpart of SportSessionService for the request handlers.
+
+    With an AsyncSession every call runs the sync service through run_sync, so queries go through asyncpg and never block
+    the event loop. The sync Session of the SQLite test mode is used directly.
+    """
+
+    def __init__(self, db: AsyncSession | Session):
+        self.db = db
+
+    async def get_sport_session(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session(sport_session_id))
+
+    async def start_sport_session(self, sport_session_input: SportSessionStart):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).start_sport_session(sport_session_input))
+
+    async def add_location_to_sport_session(self, sport_session_id: UUID4, location: SportSessionLocationCreate, user_id: Optional[UUID4] = None):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).add_location_to_sport_session(sport_session_id, location, user_id))
+
+    async def add_location_batch_to_sport_session(self, sport_session_id: UUID4, locations: List[SportSessionLocationCreate], user_id: Optional[UUID4] = None):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).add_location_batch_to_sport_session(sport_session_id, locations, user_id))
+
+    async def finish_sport_session(
+        self, sport_session_id: UUID4, sport_session_input: SportSessionFinish, user_id: Optional[UUID4] = None, location_buffer: Optional[LocationWriteBuffer] = None
+    ):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).finish_sport_session(sport_session_id, sport_session_input, user_id, location_buffer))
+
+    async def add_sensor_samples_to_sport_session(self, sport_session_id: UUID4, samples: List[SportSessionSensorSample], user_id: Optional[UUID4] = None):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).add_sensor_samples_to_sport_session(sport_session_id, samples, user_id))
+
+    async def check_active_sport_session(self, sport_session_id: UUID4, user_id: Optional[UUID4] = None, locations: Optional[List[SportSessionLocationCreate]] = None):
+        # The database is only read when the state of the session isn't cached, a slow database doesn't hold buffered acknowledgements
+        state = sport_session_state_cache.get(sport_session_id)
+        if state is None:
+            state = await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_state(sport_session_id))
+            sport_session_state_cache.set(sport_session_id, state)
+        SportSessionService.check_sport_session_state(state, user_id, locations)
+
+    async def get_live_sport_session(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_live_sport_session(sport_session_id))
+
+    async def get_live_sport_session_event(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_live_sport_session_event(sport_session_id))
+
+    async def get_sport_session_sensor_summary(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_sensor_summary(sport_session_id))
+
+    async def get_sport_session_sensor_samples(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_sensor_samples(sport_session_id))
+
+    async def get_sport_session_track(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_track(sport_session_id))
+
+    async def get_sport_session_metrics(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_metrics(sport_session_id))
+
+    async def get_sport_session_segments(self, sport_session_id: UUID4):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_segments(sport_session_id))
+
+    async def get_sport_session_route(self, sport_session_id: UUID4, tolerance: float = Config.ROUTE_TOLERANCE, max_points: int = Config.ROUTE_MAX_POINTS):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_session_route(sport_session_id, tolerance, max_points))
+
+    async def get_sport_sessions(
+        self,
+        user_id,
+        filters: Optional[SportSessionFilters] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        summary: bool = False,
+    ):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_sessions(user_id, filters, limit, cursor, summary=summary))
+
+    async def get_sport_sessions_page(
+        self, user_id, filters: Optional[SportSessionFilters] = None, limit: int = Config.SPORT_SESSIONS_PAGE_SIZE, cursor: Optional[str] = None, summary: bool = False
+    ):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_sport_sessions_page(user_id, filters, limit, cursor, summary=summary))
+
+    async def get_active_sport_sessions(self, area: Optional[ActiveSportSessionArea] = None):
+        return await run_with_session(self.db, lambda db: SportSessionService(db).get_active_sport_sessions(area))
+
+
+class AsyncSportSessionStatisticsService:
+    def __init__(self, db: AsyncSession | Session):
+        self.db = db
+
+    async def get_statistics(
+        self,
+        user_id: UUID4,
+        period: str,
+        sport_id: Optional[UUID4] = None,
+        started_from: Optional[datetime.date] = None,
+        started_to: Optional[datetime.date] = None,
+    ):
+        return await run_with_session(self.db, lambda db: SportSessionStatisticsService(db).get_statistics(user_id, period, sport_id, started_from, started_to))
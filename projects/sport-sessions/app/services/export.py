@@ -0,0 +1,162 @@
+import csv
+import datetime
+import io
+import json
+from typing import Iterable, Iterator, Tuple
+from xml.sax.saxutils import quoteattr, escape
+
+from pydantic import UUID4
+from sqlalchemy.orm import Session
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.models.model import SportSession, Location
+from app.services.track_codec import TRACK_FIELDS, decode_track
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "gpx": "application/gpx+xml"}
+
+SESSION_EXPORT_FIELDS = (
+    "session_id",
+    "sport_id",
+    "started_at",
+    "is_active",
+    "duration",
+    "steps",
+    "distance",
+    "calories",
+    "average_speed",
+    "min_heartrate",
+    "max_heartrate",
+    "avg_heartrate",
+)
+LOCATION_EXPORT_FIELDS = (*TRACK_FIELDS, "created_at")
+
+
+def _format_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=datetime.UTC).isoformat()
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def _chunked(lines: Iterable[str], chunk_size: int) -> Iterator[str]:
+    # Rows are tiny, grouping them keeps the number of writes to the socket reasonable
+    buffer = []
+    buffered = 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+class SportSessionExportService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def export(self, user_id: UUID4, export_format: str) -> Iterator[str]:
+        events = self._iter_track_events(user_id)
+        lines = {"ndjson": self._to_ndjson, "csv": self._to_csv, "gpx": self._to_gpx}[export_format](events)
+        return _chunked(lines, Config.EXPORT_CHUNK_SIZE)
+
+    def _iter_track_events(self, user_id: UUID4) -> Iterator[Tuple[str, dict]]:
+        """Yields ("session", session) followed by its ("location", location) events, one session at a time."""
+        rows = (
+            self.db.query(
+                *[getattr(SportSession, field) for field in SESSION_EXPORT_FIELDS],
+                SportSession.track_archived_at,
+                *[getattr(Location, field) for field in TRACK_FIELDS],
+                Location.created_at.label("location_created_at"),
+            )
+            .outerjoin(Location, SportSession.session_id == Location.session_id)
+            .filter(SportSession.user_id == user_id)
+            .order_by(SportSession.started_at, SportSession.session_id, Location.created_at)
+            .yield_per(Config.EXPORT_BATCH_SIZE)
+        )
+
+        current_session_id = None
+        for row in rows:
+            if row.session_id != current_session_id:
+                current_session_id = row.session_id
+                yield "session", {field: getattr(row, field) for field in SESSION_EXPORT_FIELDS}
+
+                # Archived sessions have no location rows left, their fixes come from the archive
+                if row.track_archived_at:
+                    archive = self.db.query(SportSession.track_archive).filter(SportSession.session_id == row.session_id).scalar()
+                    for location in decode_track(archive):
+                        yield "location", location
+
+            if row.location_created_at is not None:
+                yield "location", {**{field: getattr(row, field) for field in TRACK_FIELDS}, "created_at": row.location_created_at}
+
+    @staticmethod
+    def _to_ndjson(events: Iterable[Tuple[str, dict]]) -> Iterator[str]:
+        session_id = None
+        for event, item in events:
+            if event == "session":
+                session_id = item["session_id"]
+                yield json.dumps({"type": event, **{field: _format_value(value) for field, value in item.items()}}) + "\n"
+            else:
+                yield json.dumps({"type": event, "session_id": str(session_id), **{field: _format_value(item[field]) for field in LOCATION_EXPORT_FIELDS}}) + "\n"
+
+    @staticmethod
+    def _to_csv(events: Iterable[Tuple[str, dict]]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def write_row(row):
+            writer.writerow(row)
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return line
+
+        yield write_row([*SESSION_EXPORT_FIELDS, *LOCATION_EXPORT_FIELDS])
+
+        # One row per location, sessions without any location still get a row with empty location columns
+        session_row, session_has_locations = None, True
+        for event, item in events:
+            if event == "session":
+                if not session_has_locations:
+                    yield write_row([*session_row, *[None] * len(LOCATION_EXPORT_FIELDS)])
+                session_row = [_format_value(item[field]) for field in SESSION_EXPORT_FIELDS]
+                session_has_locations = False
+            else:
+                session_has_locations = True
+                yield write_row([*session_row, *[_format_value(item[field]) for field in LOCATION_EXPORT_FIELDS]])
+
+        if not session_has_locations:
+            yield write_row([*session_row, *[None] * len(LOCATION_EXPORT_FIELDS)])
+
+    @staticmethod
+    def _to_gpx(events: Iterable[Tuple[str, dict]]) -> Iterator[str]:
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<gpx version="1.1" creator="sportapp" xmlns="http://www.topografix.com/GPX/1/1">\n'
+
+        in_track = False
+        for event, item in events:
+            if event == "session":
+                if in_track:
+                    yield "</trkseg></trk>\n"
+                yield f"<trk><name>{escape(str(item['session_id']))}</name><type>{escape(str(item['sport_id']))}</type><trkseg>\n"
+                in_track = True
+            else:
+                elevation = f"<ele>{item['altitude']}</ele>" if item["altitude"] is not None else ""
+                yield f"<trkpt lat={quoteattr(str(item['latitude']))} lon={quoteattr(str(item['longitude']))}>{elevation}<time>{item['created_at'].isoformat()}Z</time></trkpt>\n"
+
+        if in_track:
+            yield "</trkseg></trk>\n"
+        yield "</gpx>\n"
+
+
+def stream_sport_sessions_export(user_id: UUID4, export_format: str) -> Iterator[str]:
+    # The response outlives the request scoped session, so the stream owns its own one
+    db = session_local()
+    try:
+        yield from SportSessionExportService(db).export(user_id, export_format)
+    finally:
+        db.close()
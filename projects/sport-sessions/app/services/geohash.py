@@ -0,0 +1,66 @@
+from typing import List, Sequence, Tuple
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    min_latitude, max_latitude = -90.0, 90.0
+    min_longitude, max_longitude = -180.0, 180.0
+    geohash = []
+    bits = 0
+    bit_count = 0
+    is_longitude = True
+
+    while len(geohash) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        if is_longitude:
+            middle = (min_longitude + max_longitude) / 2
+            bits = bits << 1 | (longitude >= middle)
+            min_longitude, max_longitude = (middle, max_longitude) if longitude >= middle else (min_longitude, middle)
+        else:
+            middle = (min_latitude + max_latitude) / 2
+            bits = bits << 1 | (latitude >= middle)
+            min_latitude, max_latitude = (middle, max_latitude) if latitude >= middle else (min_latitude, middle)
+        is_longitude = not is_longitude
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def get_cell_size(precision: int) -> Tuple[float, float]:
+    longitude_bits = (5 * precision + 1) // 2
+    latitude_bits = 5 * precision // 2
+    return 180.0 / 2**latitude_bits, 360.0 / 2**longitude_bits
+
+
+def cover_bounding_box(min_latitude: float, min_longitude: float, max_latitude: float, max_longitude: float, precision: int, max_cells: int) -> List[str]:
+    # Coarser cells are used until the box is covered by at most max_cells prefixes
+    for cell_precision in range(precision, 0, -1):
+        cell_height, cell_width = get_cell_size(cell_precision)
+        first_row, last_row = int((min_latitude + 90) // cell_height), int(min((max_latitude + 90) // cell_height, 180 / cell_height - 1))
+        first_column, last_column = int((min_longitude + 180) // cell_width), int(min((max_longitude + 180) // cell_width, 360 / cell_width - 1))
+
+        if (last_row - first_row + 1) * (last_column - first_column + 1) <= max_cells or cell_precision == 1:
+            # Encoding each cell center gives the prefix of every point inside that cell
+            return [
+                encode_geohash(-90 + (row + 0.5) * cell_height, -180 + (column + 0.5) * cell_width, cell_precision)
+                for row in range(first_row, last_row + 1)
+                for column in range(first_column, last_column + 1)
+            ]
+
+
+def is_point_in_polygon(latitude: float, longitude: float, polygon: Sequence[Tuple[float, float]]) -> bool:
+    inside = False
+    previous_latitude, previous_longitude = polygon[-1]
+    for vertex_latitude, vertex_longitude in polygon:
+        if (vertex_latitude > latitude) != (previous_latitude > latitude):
+            crossing_longitude = vertex_longitude + (latitude - vertex_latitude) * (previous_longitude - vertex_longitude) / (previous_latitude - vertex_latitude)
+            if longitude < crossing_longitude:
+                inside = not inside
+        previous_latitude, previous_longitude = vertex_latitude, vertex_longitude
+    return inside
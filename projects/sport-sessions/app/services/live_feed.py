@@ -0,0 +1,57 @@
+import asyncio
+import contextlib
+import threading
+from collections import defaultdict
+
+from app.config.settings import Config
+
+
+class LiveSessionFeed:
+    """In-process pub/sub of live sport session updates, keyed by session. Updates written by another worker are not
+    published here, the live route reads the session from the database when its subscription stays quiet.
+
+    Writers publish from the event loop or from worker threads, each event is handed to the subscriber's own loop with
+    call_soon_threadsafe. Queues are bounded, a spectator that falls behind loses its oldest updates, not the newest.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def subscribe(self, sport_session_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        key = str(sport_session_id)
+
+        with self._lock:
+            self._subscribers[key].add(subscriber)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers[key].discard(subscriber)
+                if not self._subscribers[key]:
+                    del self._subscribers[key]
+
+    def has_subscribers(self, sport_session_id) -> bool:
+        return str(sport_session_id) in self._subscribers
+
+    def publish(self, sport_session_id, event: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(sport_session_id), ()))
+
+        for loop, queue in subscribers:
+            # The subscriber's loop may already be shutting down
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(self._enqueue, queue, {"event": event, "data": data})
+
+    @staticmethod
+    def _enqueue(queue: asyncio.Queue, message: dict):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+live_session_feed = LiveSessionFeed(Config.LIVE_FEED_QUEUE_SIZE)
@@ -0,0 +1,156 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from itertools import groupby
+from typing import List, Optional
+
+from pydantic import UUID4
+
+from app.config.settings import Config
+from app.models.schemas.schema import SportSessionLocationCreate
+from app.services.utils import to_utc_naive
+
+
+class LocationWriteBuffer:
+    """Append-only local buffer of incoming locations, backed by a SQLite file in WAL mode.
+
+    A fix is acknowledged once its insert is synced to disk, the flusher later writes pending fixes to the database in bulk.
+    Flushed rows are kept for a retention window so retries of the same fix, keyed by session and client timestamp, stay
+    no-ops. Fixes without a client timestamp can't be told apart from retries and are never deduplicated, they are stamped
+    with their arrival time, one microsecond apart, so the fixes of one request don't collide on the location key.
+    Workers may share the file: SQLite serializes their writes, and a fix flushed by two workers at once is inserted once.
+    """
+
+    def __init__(self, path: str, retention_seconds: float = Config.LOCATION_BUFFER_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buffered_locations (
+                buffer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                user_id TEXT,
+                created_at TEXT NOT NULL,
+                client_created_at TEXT,
+                received_at TEXT NOT NULL,
+                location TEXT NOT NULL,
+                flushed_at TEXT,
+                UNIQUE (session_id, client_created_at)
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_buffered_locations_pending ON buffered_locations (flushed_at, buffer_id)")
+
+    def append(self, sport_session_id: UUID4, locations: List[SportSessionLocationCreate], user_id: Optional[UUID4] = None):
+        received_at = datetime.datetime.now()
+        rows = []
+        for index, location in enumerate(locations):
+            client_created_at = to_utc_naive(location.created_at).isoformat() if location.created_at else None
+            created_at = client_created_at or (received_at + datetime.timedelta(microseconds=index)).isoformat()
+            payload = location.model_dump(mode="json", exclude={"created_at"})
+            rows.append((str(sport_session_id), str(user_id) if user_id else None, created_at, client_created_at, received_at.isoformat(), json.dumps(payload)))
+
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO buffered_locations (session_id, user_id, created_at, client_created_at, received_at, location) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            buffered = self._connection.total_changes - before
+
+        return {
+            "session_id": str(sport_session_id),
+            "locations_buffered": buffered,
+            "duplicates_ignored": len(rows) - buffered,
+        }
+
+    def get_pending(self, limit: int):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT buffer_id, session_id, user_id, created_at, received_at, location FROM buffered_locations WHERE flushed_at IS NULL ORDER BY buffer_id LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_pending(row) for row in rows]
+
+    def get_pending_for_session(self, sport_session_id: UUID4):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT buffer_id, session_id, user_id, created_at, received_at, location FROM buffered_locations WHERE flushed_at IS NULL AND session_id = ? ORDER BY buffer_id",
+                (str(sport_session_id),),
+            ).fetchall()
+        return [self._to_pending(row) for row in rows]
+
+    def mark_flushed(self, buffer_ids: List[int]):
+        flushed_at = datetime.datetime.now()
+        with self._lock:
+            self._connection.executemany("UPDATE buffered_locations SET flushed_at = ? WHERE buffer_id = ?", [(flushed_at.isoformat(), buffer_id) for buffer_id in buffer_ids])
+            self._connection.execute("DELETE FROM buffered_locations WHERE flushed_at < ?", ((flushed_at - datetime.timedelta(seconds=self.retention_seconds)).isoformat(),))
+
+    def count_pending(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM buffered_locations WHERE flushed_at IS NULL").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _to_pending(row):
+        buffer_id, session_id, user_id, created_at, received_at, location = row
+        return {
+            "buffer_id": buffer_id,
+            "session_id": uuid.UUID(session_id),
+            "user_id": user_id,
+            "received_at": datetime.datetime.fromisoformat(received_at),
+            "location": SportSessionLocationCreate(**json.loads(location), created_at=datetime.datetime.fromisoformat(created_at)),
+        }
+
+    @staticmethod
+    def group_by_session(pending: List[dict]):
+        # Fixes of one session and owner are written with a single batch insert
+        key = lambda buffered: (str(buffered["session_id"]), buffered["user_id"] or "")
+        return [(group[0]["session_id"], group[0]["user_id"], group) for group in (list(group) for _, group in groupby(sorted(pending, key=key), key=key))]
+
+
+class SportSessionStateCache:
+    """Owner and active state of recently checked sport sessions, so buffered fixes are acknowledged without a query.
+
+    Entries expire after ttl_seconds. A session finished by another worker may still be seen active for that long, the
+    flusher writes fixes acknowledged within that window after the finish.
+    """
+
+    def __init__(self, ttl_seconds: float = Config.SESSION_STATE_CACHE_SECONDS, max_size: int = Config.SESSION_STATE_CACHE_SIZE, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._states = OrderedDict()
+
+    def get(self, sport_session_id: UUID4) -> Optional[dict]:
+        with self._lock:
+            cached = self._states.get(str(sport_session_id))
+            if cached is None or self.clock() - cached[0] > self.ttl_seconds:
+                return None
+            return cached[1]
+
+    def set(self, sport_session_id: UUID4, state: dict):
+        with self._lock:
+            self._states[str(sport_session_id)] = (self.clock(), state)
+            self._states.move_to_end(str(sport_session_id))
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+
+    def mark_finished(self, sport_session_id: UUID4):
+        with self._lock:
+            cached = self._states.get(str(sport_session_id))
+            if cached is not None:
+                self._states[str(sport_session_id)] = (cached[0], {**cached[1], "is_active": False})
+
+
+sport_session_state_cache = SportSessionStateCache()
+location_write_buffer = LocationWriteBuffer(Config.LOCATION_BUFFER_PATH) if Config.LOCATION_BUFFER_PATH else None
@@ -0,0 +1,46 @@
+import datetime
+import time
+from typing import Callable, List, Optional
+
+from app.config.settings import Config
+from app.models.schemas.schema import SportSessionLocationCreate
+
+
+class LocationStreamBuffer:
+    def __init__(self, flush_size: int, flush_seconds: float, max_pending: int = Config.LOCATION_STREAM_MAX_PENDING, clock: Callable[[], float] = time.monotonic):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.clock = clock
+        self.locations: List[SportSessionLocationCreate] = []
+        self.last_flush_at = clock()
+
+    def add(self, location: SportSessionLocationCreate):
+        # Fixes without a client timestamp are stamped on arrival, not when the buffer is flushed
+        if location.created_at is None:
+            location.created_at = datetime.datetime.now()
+        self.locations.append(location)
+
+    def has_room(self, count: int) -> bool:
+        # Fixes pile up while flushes keep failing, past the limit the stream is closed instead of growing without bound
+        return len(self.locations) + count <= self.max_pending
+
+    def should_flush(self) -> bool:
+        if not self.locations:
+            return False
+        return len(self.locations) >= self.flush_size or self.clock() - self.last_flush_at >= self.flush_seconds
+
+    def seconds_until_flush(self) -> Optional[float]:
+        if not self.locations:
+            return None
+        return max(self.flush_seconds - (self.clock() - self.last_flush_at), 0)
+
+    def restore(self, locations: List[SportSessionLocationCreate]):
+        # Fixes of a failed flush go back ahead of the ones received meanwhile, they are written with the next flush
+        self.locations = locations + self.locations
+
+    def drain(self) -> List[SportSessionLocationCreate]:
+        locations = self.locations
+        self.locations = []
+        self.last_flush_at = self.clock()
+        return locations
@@ -0,0 +1,88 @@
+import datetime
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.model import Location
+
+LOCATIONS_TABLE = Location.__tablename__
+DEFAULT_PARTITION = f"{LOCATIONS_TABLE}_default"
+PARTITION_NAME_PATTERN = re.compile(rf"^{LOCATIONS_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def get_month_start(day: datetime.date, months: int = 0) -> datetime.date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partition_name(month_start: datetime.date) -> str:
+    return f"{LOCATIONS_TABLE}_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def is_locations_table_partitioned(db: Session) -> bool:
+    # SQLite and tables created before partitioning keep a plain table, partition maintenance is then a no-op
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table_name)"), {"table_name": LOCATIONS_TABLE}).first() is not None
+
+
+def ensure_location_partitions(db: Session, today: datetime.date, months_ahead: int) -> List[str]:
+    if not is_locations_table_partitioned(db):
+        return []
+
+    partitions = []
+    for months in range(months_ahead + 1):
+        month_start = get_month_start(today, months)
+        partition_name = get_partition_name(month_start)
+        if not _table_exists(db, partition_name):
+            _create_location_partition(db, partition_name, month_start, get_month_start(month_start, 1))
+            db.commit()
+        partitions.append(partition_name)
+
+    # Backfilled fixes older than every monthly partition still have somewhere to go
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {LOCATIONS_TABLE} DEFAULT"))
+    db.commit()
+    return partitions
+
+
+def _table_exists(db: Session, table_name: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:table_name) IS NOT NULL"), {"table_name": table_name}).scalar()
+
+
+def _create_location_partition(db: Session, partition_name: str, month_start: datetime.date, month_end: datetime.date):
+    bounds = f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{month_end.isoformat()}')"
+    month_rows = f"created_at >= '{month_start.isoformat()}' AND created_at < '{month_end.isoformat()}'"
+    has_default_rows = _table_exists(db, DEFAULT_PARTITION) and db.execute(text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {month_rows} LIMIT 1")).first() is not None
+    if not has_default_rows:
+        db.execute(text(f"CREATE TABLE {partition_name} PARTITION OF {LOCATIONS_TABLE} {bounds}"))
+        return
+
+    # PostgreSQL refuses a partition whose range overlaps rows of the DEFAULT partition, they are moved into the new table before it is attached
+    db.execute(text(f"CREATE TABLE {partition_name} (LIKE {LOCATIONS_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(text(f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {month_rows} RETURNING *) INSERT INTO {partition_name} SELECT * FROM moved"))
+    db.execute(text(f"ALTER TABLE {LOCATIONS_TABLE} ATTACH PARTITION {partition_name} {bounds}"))
+
+
+def drop_empty_location_partitions(db: Session, before: datetime.date) -> List[str]:
+    if not is_locations_table_partitioned(db):
+        return []
+
+    partition_names = db.execute(
+        text("SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid WHERE pg_inherits.inhparent = to_regclass(:table_name)"),
+        {"table_name": LOCATIONS_TABLE},
+    ).scalars()
+
+    dropped = []
+    for partition_name in sorted(partition_names):
+        match = PARTITION_NAME_PATTERN.match(partition_name)
+        if not match or get_month_start(datetime.date(int(match.group(1)), int(match.group(2)), 1), 1) > before:
+            continue
+        # Only partitions whose fixes were all archived are dropped, a whole table drop needs no vacuum
+        if db.execute(text(f"SELECT 1 FROM {partition_name} LIMIT 1")).first() is None:
+            db.execute(text(f"DROP TABLE {partition_name}"))
+            dropped.append(partition_name)
+
+    db.commit()
+    return dropped
@@ -1,14 +1,48 @@
 import datetime
+from typing import List, Optional
+
 from pydantic import UUID4
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, tuple_
 from sqlalchemy.orm import Session
 
-from app.models.model import SportSession, Location
-from app.exceptions.exceptions import NotFoundError, NotActiveError
-from app.models.schemas.schema import SportSessionFinish, SportSessionStart, SportSessionLocationCreate
-
-from app.services.utils import estimate_distance, estimate_calories_burned, estimate_speed
+from app.models.model import SportSession, Location, ActiveSportSessionPosition, SportSessionRoute, SportSessionSensorChunk, SportSessionSegments
+from app.exceptions.exceptions import NotFoundError, NotActiveError, NotOwnerError
+from app.models.schemas.schema import SportSessionFinish, SportSessionStart, SportSessionLocationCreate, SportSessionFilters, SportSessionSensorSample, ActiveSportSessionArea
+
+from app.services.geohash import encode_geohash, cover_bounding_box, is_point_in_polygon
+from app.services.live_feed import live_session_feed
+from app.services.location_buffer import LocationWriteBuffer, sport_session_state_cache
+from app.services.statistics import SportSessionStatisticsService
+from app.services.track_codec import TRACK_FIELDS, SENSOR_FIELDS, encode_track, decode_track
+from app.services.track_metrics import compute_track_metrics, compute_track_segments
+from app.services.track_simplify import simplify_track
+from app.services.utils import (
+    estimate_distance,
+    estimate_calories_burned,
+    estimate_speed,
+    to_utc_naive,
+    check_location_timestamps,
+    update_track_aggregates,
+    correct_distance_for_late_locations,
+    update_sensor_aggregates,
+    encode_sport_session_cursor,
+    decode_sport_session_cursor,
+    bucket_route_parameters,
+)
 from app.config.settings import Config
+from app.utils.utils import dialect_insert
+
+SPORT_SESSION_SUMMARY_COLUMNS = (
+    SportSession.session_id,
+    SportSession.sport_id,
+    SportSession.started_at,
+    SportSession.duration,
+    SportSession.distance,
+    SportSession.calories,
+    SportSession.is_active,
+)
+
+SEGMENTS_COLUMNS = ("split_distance", "duration", "moving_time", "paused_time", "moving_speed", "splits", "pauses")
 
 
 class SportSessionService:
@@ -37,7 +71,15 @@ class SportSessionService:
         }
 
     def start_sport_session(self, sport_session_input: SportSessionStart):
-        sport_session = SportSession(sport_id=sport_session_input.sport_id, user_id=sport_session_input.user_id, started_at=sport_session_input.started_at, is_active=True)
+        check_location_timestamps([sport_session_input.initial_location], to_utc_naive(sport_session_input.started_at))
+        sport_session = SportSession(
+            sport_id=sport_session_input.sport_id,
+            user_id=sport_session_input.user_id,
+            # The columns are timezone naive UTC, asyncpg refuses aware datetimes for them
+            started_at=to_utc_naive(sport_session_input.started_at),
+            is_active=True,
+            location_count=0,
+        )
         self.db.add(sport_session)
         self.db.commit()
         self.db.refresh(sport_session)
@@ -51,7 +93,10 @@ class SportSessionService:
             altitude_accuracy=sport_session_input.initial_location.altitude_accuracy,
             heading=sport_session_input.initial_location.heading,
             speed=sport_session_input.initial_location.speed,
+            created_at=to_utc_naive(sport_session_input.initial_location.created_at or sport_session_input.started_at),
         )
+        update_track_aggregates(sport_session, initial_location.latitude, initial_location.longitude, initial_location.speed, initial_location.created_at)
+        self._update_active_position(sport_session, initial_location.latitude, initial_location.longitude, initial_location.created_at)
 
         self.db.add(initial_location)
         self.db.commit()
@@ -60,36 +105,19 @@ class SportSessionService:
             "session_id": str(sport_session.session_id),
             "sport_id": str(sport_session.sport_id),
             "user_id": str(sport_session.user_id),
-            "started_at": sport_session.started_at.isoformat(),
-        }
-
-    def add_location_to_sport_session(self, sport_session_id: UUID4, location: SportSessionLocationCreate):
-        sport_session: SportSession = self.db.query(SportSession).filter(SportSession.session_id == sport_session_id).first()
-
-        if not sport_session:
-            raise NotFoundError(Config.NOT_FOUND_MESSAGE)
-
-        if not sport_session.is_active:
-            raise NotActiveError("Sport session is already finished")
-
-        location_payload = {
-            "session_id": sport_session_id,
-            "latitude": location.latitude,
-            "longitude": location.longitude,
-            "accuracy": location.accuracy,
-            "altitude": location.altitude,
-            "altitude_accuracy": location.altitude_accuracy,
-            "heading": location.heading,
-            "speed": location.speed,
-            "created_at": datetime.datetime.now(),
+            "started_at": sport_session.started_at.replace(tzinfo=datetime.UTC).isoformat(),
         }
 
-        new_location = Location(**location_payload)
+    def add_location_to_sport_session(self, sport_session_id: UUID4, location: SportSessionLocationCreate, user_id: Optional[UUID4] = None):
+        sport_session = self._get_active_sport_session(sport_session_id, user_id)
+        check_location_timestamps([location], sport_session.started_at)
 
-        self.db.add(new_location)
-        self.db.commit()
+        location_payload = self._build_location_payload(sport_session_id, location, datetime.datetime.now())
+        # A retried fix is a no-op, it is answered like the original one
+        self._insert_locations(sport_session, [location_payload])
 
-        return {
+        # Built before the commit expires the instances, reading them afterwards would reload both rows
+        location_response = {
             "session_id": str(sport_session.session_id),
             "latitude": float(location.latitude),
             "longitude": float(location.longitude),
@@ -98,41 +126,101 @@ class SportSessionService:
             "altitude_accuracy": float(location.altitude_accuracy),
             "heading": float(location.heading),
             "speed": float(location.speed),
-            "created_at": new_location.created_at.isoformat(),
+            "created_at": location_payload["created_at"].isoformat(),
         }
+        live_state = self._serialize_live_state(sport_session) if live_session_feed.has_subscribers(sport_session_id) else None
+        self.db.commit()
 
-    def finish_sport_session(self, sport_session_id: UUID4, sport_session_input: SportSessionFinish):
-        sport_session: SportSession = self.db.query(SportSession).filter(SportSession.session_id == sport_session_id).first()
+        if live_state:
+            live_session_feed.publish(sport_session_id, "update", live_state)
+        return location_response
 
-        if not sport_session:
-            raise NotFoundError(Config.NOT_FOUND_MESSAGE)
+    def add_location_batch_to_sport_session(self, sport_session_id: UUID4, locations: List[SportSessionLocationCreate], user_id: Optional[UUID4] = None):
+        return self._add_location_batch(self._get_active_sport_session(sport_session_id, user_id), locations)
 
-        elif not sport_session.is_active:
-            raise NotActiveError("Sport session is already finished")
+    def add_buffered_locations_to_sport_session(self, sport_session_id: UUID4, buffered_locations: List[dict], user_id: Optional[UUID4] = None):
+        sport_session = self._get_sport_session(sport_session_id, for_update=True)
+
+        if user_id and str(sport_session.user_id) != str(user_id):
+            raise NotOwnerError(Config.NO_OWNER_MESSAGE)
+
+        # The finish writes the pending fixes itself, the ones acknowledged while a stale state cache still saw the session active are kept too
+        if not sport_session.is_active:
+            acknowledged_until = sport_session.finished_at + datetime.timedelta(seconds=Config.SESSION_STATE_CACHE_SECONDS) if sport_session.finished_at else None
+            buffered_locations = [buffered for buffered in buffered_locations if acknowledged_until and buffered["received_at"] <= acknowledged_until]
+            if not buffered_locations:
+                raise NotActiveError("Sport session is already finished")
+
+        return self._add_location_batch(sport_session, [buffered["location"] for buffered in buffered_locations])
+
+    def _add_location_batch(self, sport_session: SportSession, locations: List[SportSessionLocationCreate]):
+        sport_session_id = sport_session.session_id
+        check_location_timestamps(locations, sport_session.started_at)
+        received_at = datetime.datetime.now()
+        # Fixes without a client timestamp keep their batch order and don't collide on the (session_id, created_at) key
+        locations_payload = [
+            self._build_location_payload(sport_session_id, location, received_at + datetime.timedelta(microseconds=index)) for index, location in enumerate(locations)
+        ]
+        locations_payload.sort(key=lambda location_payload: location_payload["created_at"])
+        inserted_locations = self._insert_locations(sport_session, locations_payload)
+        live_state = self._serialize_live_state(sport_session) if sport_session.is_active and live_session_feed.has_subscribers(sport_session_id) else None
+        self.db.commit()
+
+        if live_state:
+            live_session_feed.publish(sport_session_id, "update", live_state)
+
+        return {
+            "session_id": str(sport_session_id),
+            "locations_added": len(inserted_locations),
+            "duplicates_ignored": len(locations_payload) - len(inserted_locations),
+            "first_location_at": locations_payload[0]["created_at"].isoformat(),
+            "last_location_at": locations_payload[-1]["created_at"].isoformat(),
+        }
+
+    def finish_sport_session(
+        self, sport_session_id: UUID4, sport_session_input: SportSessionFinish, user_id: Optional[UUID4] = None, location_buffer: Optional[LocationWriteBuffer] = None
+    ):
+        sport_session = self._get_active_sport_session(sport_session_id, user_id)
+        # Fixes already acknowledged by the buffer are part of the track the summary is computed from
+        buffered_ids = self._insert_buffered_locations(sport_session, location_buffer) if location_buffer else []
+
+        # Only sessions started before track aggregates were kept need to load their locations
+        legacy_locations = sport_session.locations if sport_session.location_count is None else []
 
         if sport_session_input.distance is None:
-            sport_session_input.distance = estimate_distance(sport_session_input.steps, sport_session.locations)
+            tracked_distance = sport_session.tracked_distance if sport_session.location_count else None
+            sport_session_input.distance = estimate_distance(sport_session_input.steps, legacy_locations, tracked_distance=tracked_distance)
 
         if sport_session_input.calories is None:
             sport_session_input.calories = estimate_calories_burned(sport_session_input.steps)
 
         if sport_session_input.average_speed is None:
-            sport_session_input.average_speed = estimate_speed(sport_session_input.distance, sport_session_input.duration, sport_session.locations)
+            sport_session_input.average_speed = estimate_speed(
+                sport_session_input.distance,
+                sport_session_input.duration,
+                legacy_locations,
+                speed_sum=sport_session.speed_sum,
+                speed_count=sport_session.speed_count,
+            )
 
         sport_session.duration = sport_session_input.duration
         sport_session.steps = sport_session_input.steps
         sport_session.distance = sport_session_input.distance
         sport_session.calories = sport_session_input.calories
         sport_session.average_speed = sport_session_input.average_speed
-        sport_session.min_heartrate = sport_session_input.min_heartrate
-        sport_session.max_heartrate = sport_session_input.max_heartrate
-        sport_session.avg_heartrate = sport_session_input.avg_heartrate
+        # Heart rate summaries computed from ingested sensor samples are kept unless the client sends its own
+        if sport_session_input.min_heartrate is not None or not sport_session.heartrate_count:
+            sport_session.min_heartrate = sport_session_input.min_heartrate
+        if sport_session_input.max_heartrate is not None or not sport_session.heartrate_count:
+            sport_session.max_heartrate = sport_session_input.max_heartrate
+        if sport_session_input.avg_heartrate is not None or not sport_session.heartrate_count:
+            sport_session.avg_heartrate = sport_session_input.avg_heartrate
         sport_session.is_active = False
+        sport_session.finished_at = datetime.datetime.now()
+        self.db.query(ActiveSportSessionPosition).filter(ActiveSportSessionPosition.session_id == sport_session_id).delete(synchronize_session=False)
+        SportSessionStatisticsService(self.db).record_finished_sport_session(sport_session)
 
-        self.db.commit()
-        self.db.refresh(sport_session)
-
-        return {
+        sport_session_response = {
             "session_id": str(sport_session.session_id),
             "sport_id": str(sport_session.sport_id),
             "user_id": str(sport_session.user_id),
@@ -146,50 +234,545 @@ class SportSessionService:
             "max_heartrate": float(sport_session.max_heartrate) if sport_session.max_heartrate else None,
             "avg_heartrate": float(sport_session.avg_heartrate) if sport_session.avg_heartrate else None,
         }
+        self.db.commit()
+
+        if buffered_ids:
+            location_buffer.mark_flushed(buffered_ids)
+        sport_session_state_cache.mark_finished(sport_session_id)
+        live_session_feed.publish(sport_session_id, "finished", sport_session_response)
+        return sport_session_response
+
+    def add_sensor_samples_to_sport_session(self, sport_session_id: UUID4, samples: List[SportSessionSensorSample], user_id: Optional[UUID4] = None):
+        sport_session = self._get_active_sport_session(sport_session_id, user_id)
+
+        received_at = datetime.datetime.now()
+        samples_payload = [
+            {"heartrate": sample.heartrate, "cadence": sample.cadence, "power": sample.power, "created_at": to_utc_naive(sample.created_at or received_at)} for sample in samples
+        ]
+        samples_payload.sort(key=lambda sample_payload: sample_payload["created_at"])
+        update_sensor_aggregates(sport_session, samples_payload)
+
+        # A whole batch is stored as one packed chunk instead of a row per sample
+        self.db.add(
+            SportSessionSensorChunk(
+                session_id=sport_session_id,
+                first_sample_at=samples_payload[0]["created_at"],
+                last_sample_at=samples_payload[-1]["created_at"],
+                sample_count=len(samples_payload),
+                samples=encode_track(samples_payload, Config.TRACK_ARCHIVE_COMPRESSION_LEVEL, SENSOR_FIELDS),
+            )
+        )
+
+        samples_response = {
+            "session_id": str(sport_session_id),
+            "samples_added": len(samples_payload),
+            "first_sample_at": samples_payload[0]["created_at"].isoformat(),
+            "last_sample_at": samples_payload[-1]["created_at"].isoformat(),
+            **self._serialize_sensor_summary(sport_session),
+        }
+        live_state = self._serialize_live_state(sport_session) if live_session_feed.has_subscribers(sport_session_id) else None
+        self.db.commit()
+
+        if live_state:
+            live_session_feed.publish(sport_session_id, "update", live_state)
+
+        return samples_response
+
+    def get_sport_session_state(self, sport_session_id: UUID4):
+        # Only the columns the checks need are read, buffered writes are acknowledged before the session row is loaded
+        sport_session = self.db.query(SportSession.user_id, SportSession.is_active, SportSession.started_at).filter(SportSession.session_id == sport_session_id).first()
+
+        if not sport_session:
+            raise NotFoundError(Config.NOT_FOUND_MESSAGE)
+
+        return {"user_id": str(sport_session.user_id), "is_active": sport_session.is_active, "started_at": sport_session.started_at}
+
+    def check_active_sport_session(self, sport_session_id: UUID4, user_id: Optional[UUID4] = None, locations: Optional[List[SportSessionLocationCreate]] = None):
+        self.check_sport_session_state(self.get_sport_session_state(sport_session_id), user_id, locations)
+
+    @staticmethod
+    def check_sport_session_state(state: dict, user_id: Optional[UUID4] = None, locations: Optional[List[SportSessionLocationCreate]] = None):
+        if user_id and state["user_id"] != str(user_id):
+            raise NotOwnerError(Config.NO_OWNER_MESSAGE)
+
+        if not state["is_active"]:
+            raise NotActiveError("Sport session is already finished")
+
+        check_location_timestamps(locations or [], state["started_at"])
+
+    def get_live_sport_session(self, sport_session_id: UUID4):
+        return self._serialize_live_state(self._get_active_sport_session(sport_session_id, for_update=False))
+
+    def get_live_sport_session_event(self, sport_session_id: UUID4):
+        # Read by the live feed when nothing was published in this process, e.g. the session is written by another worker
+        sport_session = self._get_sport_session(sport_session_id)
+        if sport_session.is_active:
+            return {"event": "update", "data": self._serialize_live_state(sport_session)}
+        return {"event": "finished", "data": self.get_sport_session(sport_session_id)}
+
+    def get_sport_session_sensor_summary(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            **self._serialize_sensor_summary(sport_session),
+        }
+
+    def get_sport_session_sensor_samples(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+
+        chunks = (
+            self.db.query(SportSessionSensorChunk.samples).filter(SportSessionSensorChunk.session_id == sport_session_id).order_by(SportSessionSensorChunk.first_sample_at).all()
+        )
+        # Late batches can overlap earlier chunks, the stable sort keeps arrival order for equal timestamps
+        samples = sorted((sample for chunk in chunks for sample in decode_track(chunk.samples, SENSOR_FIELDS)), key=lambda sample: sample["created_at"])
+
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            "samples": [{**sample, "created_at": sample["created_at"].isoformat()} for sample in samples],
+        }
+
+    def get_sport_session_track(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            "locations": [{**location, "created_at": location["created_at"].isoformat()} for location in self._get_track(sport_session)],
+        }
+
+    def get_sport_session_metrics(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+        track = self._get_track(sport_session)
+
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            **compute_track_metrics(
+                [location["latitude"] for location in track],
+                [location["longitude"] for location in track],
+                [location["created_at"] for location in track],
+                altitudes=[location["altitude"] for location in track],
+                speeds=[location["speed"] for location in track],
+            ),
+        }
+
+    def get_sport_session_segments(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+
+        stored_segments = self.db.query(SportSessionSegments).filter(SportSessionSegments.session_id == sport_session_id).first()
+        if stored_segments:
+            segments = {column: getattr(stored_segments, column) for column in SEGMENTS_COLUMNS}
+        else:
+            # Finished sessions are normally computed by the background pool, this covers the ones it has not reached yet
+            segments = self._compute_segments(sport_session, compute_track_segments)
+            if not sport_session.is_active:
+                self._store_segments(sport_session_id, segments)
+
+        return {"session_id": str(sport_session.session_id), "user_id": str(sport_session.user_id), **segments}
+
+    def store_sport_session_segments(self, sport_session_id: UUID4, compute=compute_track_segments):
+        sport_session = self._get_sport_session(sport_session_id)
+        if sport_session.is_active:
+            return None
+
+        segments = self._compute_segments(sport_session, compute)
+        self._store_segments(sport_session_id, segments)
+        return segments
+
+    def get_sport_session_route(self, sport_session_id: UUID4, tolerance: float = Config.ROUTE_TOLERANCE, max_points: int = Config.ROUTE_MAX_POINTS):
+        tolerance, max_points = bucket_route_parameters(tolerance, max_points)
+        sport_session = self._get_sport_session(sport_session_id)
+
+        # Finished tracks no longer change, so their simplified routes are computed once per parameters
+        cached_route = None
+        if not sport_session.is_active:
+            cached_route = (
+                self.db.query(SportSessionRoute)
+                .filter(SportSessionRoute.session_id == sport_session_id, SportSessionRoute.tolerance == tolerance, SportSessionRoute.max_points == max_points)
+                .first()
+            )
+
+        if cached_route:
+            original_point_count = cached_route.original_point_count
+            points = decode_track(cached_route.track)
+        else:
+            track = self._get_track(sport_session)
+            original_point_count = len(track)
+            kept_indices = simplify_track([location["latitude"] for location in track], [location["longitude"] for location in track], tolerance, max_points)
+            points = [track[index] for index in kept_indices]
+
+            if not sport_session.is_active and points:
+                self._cache_sport_session_route(sport_session_id, tolerance, max_points, original_point_count, points)
+
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            "tolerance": tolerance,
+            "max_points": max_points,
+            "original_point_count": original_point_count,
+            "points": [
+                {"latitude": point["latitude"], "longitude": point["longitude"], "altitude": point["altitude"], "created_at": point["created_at"].isoformat()} for point in points
+            ],
+        }
 
-    def get_sport_sessions(self, user_id):
-        sport_sessions = self.db.query(SportSession).filter(SportSession.user_id == user_id).all()
+    def archive_sport_session_track(self, sport_session_id: UUID4):
+        sport_session = self._get_sport_session(sport_session_id)
+
+        if sport_session.is_active or sport_session.track_archived_at:
+            return False
+
+        sport_session.track_archive = encode_track(self._get_track(sport_session), Config.TRACK_ARCHIVE_COMPRESSION_LEVEL)
+        sport_session.track_archived_at = datetime.datetime.now()
+        self.db.query(Location).filter(Location.session_id == sport_session_id).delete(synchronize_session=False)
+        self.db.commit()
+
+        return True
+
+    def archive_expired_sport_session_tracks(self, started_before: datetime.datetime, limit: int = Config.LOCATION_RETENTION_BATCH_SIZE):
+        # Finished sessions already hold their aggregates and statistics, only the raw fixes are moved into the archive
+        expired_sport_sessions = (
+            self.db.query(SportSession.session_id)
+            .filter(SportSession.is_active == False, SportSession.track_archived_at.is_(None), SportSession.started_at < started_before)
+            .order_by(SportSession.started_at)
+            .limit(limit)
+            .all()
+        )
+        return sum(self.archive_sport_session_track(sport_session.session_id) for sport_session in expired_sport_sessions)
+
+    def get_sport_sessions(
+        self,
+        user_id,
+        filters: Optional[SportSessionFilters] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        summary: bool = False,
+    ):
+        query = self.db.query(*SPORT_SESSION_SUMMARY_COLUMNS) if summary else self.db.query(SportSession)
+        query = self._filter_sport_sessions(query.filter(SportSession.user_id == user_id), filters or SportSessionFilters())
+
+        if cursor:
+            cursor_started_at, cursor_session_id = decode_sport_session_cursor(cursor)
+            query = query.filter(tuple_(SportSession.started_at, SportSession.session_id) < tuple_(cursor_started_at, cursor_session_id))
+
+        query = query.order_by(SportSession.started_at.desc(), SportSession.session_id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+
+        serialize = self._serialize_sport_session_summary if summary else self._serialize_sport_session
+        return [serialize(sport_session) for sport_session in query.all()]
+
+    def get_sport_sessions_page(
+        self, user_id, filters: Optional[SportSessionFilters] = None, limit: int = Config.SPORT_SESSIONS_PAGE_SIZE, cursor: Optional[str] = None, summary: bool = False
+    ):
+        # One extra row tells whether there is a next page without a COUNT query
+        sport_sessions = self.get_sport_sessions(user_id, filters, limit + 1, cursor, summary)
+        if len(sport_sessions) <= limit:
+            return sport_sessions, None
+
+        sport_sessions = sport_sessions[:limit]
+        last_sport_session = sport_sessions[-1]
+        next_cursor = encode_sport_session_cursor(datetime.datetime.fromisoformat(last_sport_session["started_at"]).replace(tzinfo=None), last_sport_session["session_id"])
+        return sport_sessions, next_cursor
+
+    def get_active_sport_sessions(self, area: Optional[ActiveSportSessionArea] = None):
+        query = self.db.query(ActiveSportSessionPosition.user_id, ActiveSportSessionPosition.latitude, ActiveSportSessionPosition.longitude)
+
+        if area:
+            bbox = area.get_bounding_box()
+            cells = cover_bounding_box(bbox.min_latitude, bbox.min_longitude, bbox.max_latitude, bbox.max_longitude, Config.GEOHASH_PRECISION, Config.MAX_AREA_QUERY_CELLS)
+            # Cell prefixes narrow the rows through the index, the exact bounds drop the cell margins
+            query = query.filter(
+                or_(*[ActiveSportSessionPosition.geohash.startswith(cell, autoescape=True) for cell in cells]),
+                ActiveSportSessionPosition.latitude.between(bbox.min_latitude, bbox.max_latitude),
+                ActiveSportSessionPosition.longitude.between(bbox.min_longitude, bbox.max_longitude),
+            )
+
+        positions = query.all()
+        if area and area.polygon:
+            polygon = [(point.latitude, point.longitude) for point in area.polygon]
+            positions = [position for position in positions if is_point_in_polygon(position.latitude, position.longitude, polygon)]
 
         return [
             {
-                "session_id": str(sport_session.session_id),
-                "sport_id": str(sport_session.sport_id),
-                "user_id": str(sport_session.user_id),
-                "started_at": sport_session.started_at.replace(tzinfo=datetime.UTC).isoformat(),
-                "duration": int(sport_session.duration) if sport_session.duration else None,
-                "steps": int(sport_session.steps) if sport_session.steps else None,
-                "distance": float(sport_session.distance) if sport_session.distance else None,
-                "calories": float(sport_session.calories) if sport_session.calories else None,
-                "average_speed": float(sport_session.average_speed) if sport_session.average_speed else None,
-                "min_heartrate": float(sport_session.min_heartrate) if sport_session.min_heartrate else None,
-                "max_heartrate": float(sport_session.max_heartrate) if sport_session.max_heartrate else None,
-                "avg_heartrate": float(sport_session.avg_heartrate) if sport_session.avg_heartrate else None,
+                "user_id": str(position.user_id),
+                "latitude": float(position.latitude),
+                "longitude": float(position.longitude),
             }
-            for sport_session in sport_sessions
+            for position in positions
         ]
 
-    def get_active_sport_sessions(self):
-        latest_sessions_subquery = (
-            self.db.query(SportSession.user_id, func.max(Location.created_at).label("latest_created_at"))
-            .join(Location, SportSession.session_id == Location.session_id)
+    def rebuild_active_sport_session_positions(self):
+        latest_locations_subquery = (
+            self.db.query(Location.session_id, func.max(Location.created_at).label("latest_created_at"))
+            .join(SportSession, SportSession.session_id == Location.session_id)
             .filter(SportSession.is_active == True)
-            .group_by(SportSession.user_id)
+            .group_by(Location.session_id)
             .subquery()
         )
 
-        locations = (
-            self.db.query(SportSession.user_id, Location.latitude, Location.longitude)
+        latest_locations = (
+            self.db.query(SportSession.session_id, SportSession.user_id, Location.latitude, Location.longitude, Location.created_at)
             .join(Location, SportSession.session_id == Location.session_id)
-            .join(latest_sessions_subquery, SportSession.user_id == latest_sessions_subquery.c.user_id)
-            .filter(Location.created_at == latest_sessions_subquery.c.latest_created_at)
+            .join(
+                latest_locations_subquery,
+                and_(Location.session_id == latest_locations_subquery.c.session_id, Location.created_at == latest_locations_subquery.c.latest_created_at),
+            )
             .all()
         )
 
-        return [
-            {
-                "user_id": str(location.user_id),
-                "latitude": float(location.latitude),
-                "longitude": float(location.longitude),
-            }
-            for location in locations
+        positions_by_session = {
+            location.session_id: ActiveSportSessionPosition(
+                session_id=location.session_id,
+                user_id=location.user_id,
+                latitude=location.latitude,
+                longitude=location.longitude,
+                geohash=encode_geohash(location.latitude, location.longitude, Config.GEOHASH_PRECISION),
+                updated_at=location.created_at,
+            )
+            for location in latest_locations
+        }
+
+        self.db.query(ActiveSportSessionPosition).delete(synchronize_session=False)
+        self.db.add_all(positions_by_session.values())
+        self.db.commit()
+
+        return len(positions_by_session)
+
+    @staticmethod
+    def _filter_sport_sessions(query, filters: SportSessionFilters):
+        if filters.sport_id:
+            query = query.filter(SportSession.sport_id == filters.sport_id)
+        if filters.started_from:
+            query = query.filter(SportSession.started_at >= to_utc_naive(filters.started_from))
+        if filters.started_to:
+            query = query.filter(SportSession.started_at < to_utc_naive(filters.started_to))
+        if filters.is_active is not None:
+            query = query.filter(SportSession.is_active == filters.is_active)
+        return query
+
+    @staticmethod
+    def _serialize_sport_session(sport_session: SportSession):
+        return {
+            "session_id": str(sport_session.session_id),
+            "sport_id": str(sport_session.sport_id),
+            "user_id": str(sport_session.user_id),
+            "started_at": sport_session.started_at.replace(tzinfo=datetime.UTC).isoformat(),
+            "duration": int(sport_session.duration) if sport_session.duration else None,
+            "steps": int(sport_session.steps) if sport_session.steps else None,
+            "distance": float(sport_session.distance) if sport_session.distance else None,
+            "calories": float(sport_session.calories) if sport_session.calories else None,
+            "average_speed": float(sport_session.average_speed) if sport_session.average_speed else None,
+            "min_heartrate": float(sport_session.min_heartrate) if sport_session.min_heartrate else None,
+            "max_heartrate": float(sport_session.max_heartrate) if sport_session.max_heartrate else None,
+            "avg_heartrate": float(sport_session.avg_heartrate) if sport_session.avg_heartrate else None,
+        }
+
+    @staticmethod
+    def _serialize_sport_session_summary(sport_session):
+        return {
+            "session_id": str(sport_session.session_id),
+            "sport_id": str(sport_session.sport_id),
+            "started_at": sport_session.started_at.replace(tzinfo=datetime.UTC).isoformat(),
+            "duration": int(sport_session.duration) if sport_session.duration else None,
+            "distance": float(sport_session.distance) if sport_session.distance else None,
+            "calories": float(sport_session.calories) if sport_session.calories else None,
+            "is_active": sport_session.is_active,
+        }
+
+    @staticmethod
+    def _serialize_sensor_summary(sport_session: SportSession):
+        zones = Config.HEARTRATE_ZONES
+        zone_seconds = sport_session.heartrate_zone_seconds or [0.0] * len(zones)
+
+        return {
+            "sample_count": sport_session.sensor_sample_count or 0,
+            "min_heartrate": float(sport_session.min_heartrate) if sport_session.min_heartrate else None,
+            "max_heartrate": float(sport_session.max_heartrate) if sport_session.max_heartrate else None,
+            "avg_heartrate": float(sport_session.avg_heartrate) if sport_session.avg_heartrate else None,
+            "avg_cadence": sport_session.cadence_sum / sport_session.cadence_count if sport_session.cadence_count else None,
+            "avg_power": sport_session.power_sum / sport_session.power_count if sport_session.power_count else None,
+            "max_power": sport_session.max_power,
+            "heartrate_zones": [
+                {"zone": index + 1, "min_heartrate": zones[index], "max_heartrate": zones[index + 1] if index + 1 < len(zones) else None, "seconds": seconds}
+                for index, seconds in enumerate(zone_seconds)
+            ],
+        }
+
+    @staticmethod
+    def _serialize_live_state(sport_session: SportSession):
+        return {
+            "session_id": str(sport_session.session_id),
+            "user_id": str(sport_session.user_id),
+            "latitude": float(sport_session.last_latitude) if sport_session.last_latitude is not None else None,
+            "longitude": float(sport_session.last_longitude) if sport_session.last_longitude is not None else None,
+            "last_location_at": sport_session.last_location_at.isoformat() if sport_session.last_location_at else None,
+            "location_count": sport_session.location_count or 0,
+            "distance": float(sport_session.tracked_distance or 0),
+            "average_speed": sport_session.speed_sum / sport_session.speed_count if sport_session.speed_count else None,
+            "heartrate": sport_session.last_heartrate,
+            "avg_heartrate": sport_session.heartrate_sum / sport_session.heartrate_count if sport_session.heartrate_count else None,
+        }
+
+    def _get_sport_session(self, sport_session_id: UUID4, for_update: bool = False) -> SportSession:
+        query = self.db.query(SportSession).filter(SportSession.session_id == sport_session_id)
+        sport_session: SportSession = (query.with_for_update() if for_update else query).first()
+
+        if not sport_session:
+            raise NotFoundError(Config.NOT_FOUND_MESSAGE)
+
+        return sport_session
+
+    def _get_active_sport_session(self, sport_session_id: UUID4, user_id: Optional[UUID4] = None, for_update: bool = True) -> SportSession:
+        # Ownership and state are checked on the row the mutation works on, so writes only read the session once.
+        # The row stays locked until the commit: the aggregates are read-modify-write, and a write waiting on a finish
+        # sees the session inactive instead of restoring its active position
+        sport_session = self._get_sport_session(sport_session_id, for_update)
+
+        if user_id and str(sport_session.user_id) != str(user_id):
+            raise NotOwnerError(Config.NO_OWNER_MESSAGE)
+
+        if not sport_session.is_active:
+            raise NotActiveError("Sport session is already finished")
+
+        return sport_session
+
+    @staticmethod
+    def _build_location_payload(sport_session_id: UUID4, location: SportSessionLocationCreate, received_at: datetime.datetime):
+        return {
+            "session_id": sport_session_id,
+            "latitude": location.latitude,
+            "longitude": location.longitude,
+            "accuracy": location.accuracy,
+            "altitude": location.altitude,
+            "altitude_accuracy": location.altitude_accuracy,
+            "heading": location.heading,
+            "speed": location.speed,
+            "created_at": to_utc_naive(location.created_at) if location.created_at else received_at,
+        }
+
+    def _insert_buffered_locations(self, sport_session: SportSession, location_buffer: LocationWriteBuffer):
+        # Fixes buffered for another user are left to the flusher, which drops them
+        buffered_locations = [
+            buffered for buffered in location_buffer.get_pending_for_session(sport_session.session_id) if buffered["user_id"] in (None, str(sport_session.user_id))
         ]
+        locations_payload = [self._build_location_payload(sport_session.session_id, buffered["location"], buffered["received_at"]) for buffered in buffered_locations]
+        if locations_payload:
+            locations_payload.sort(key=lambda location_payload: location_payload["created_at"])
+            self._insert_locations(sport_session, locations_payload)
+        return [buffered["buffer_id"] for buffered in buffered_locations]
+
+    def _get_track(self, sport_session: SportSession):
+        # Archived tracks are only decoded when a track is actually requested
+        if sport_session.track_archived_at:
+            return decode_track(sport_session.track_archive)
+
+        return self._get_stored_locations(sport_session)
+
+    def _get_stored_locations(self, sport_session: SportSession):
+        locations = (
+            self.db.query(*[getattr(Location, field) for field in TRACK_FIELDS], Location.created_at)
+            .filter(Location.session_id == sport_session.session_id)
+            .order_by(Location.created_at)
+            .all()
+        )
+        return [{**{field: getattr(location, field) for field in TRACK_FIELDS}, "created_at": location.created_at} for location in locations]
+
+    def _merge_locations_into_archive(self, sport_session: SportSession):
+        track = {location["created_at"]: location for location in decode_track(sport_session.track_archive) + self._get_stored_locations(sport_session)}
+        sport_session.track_archive = encode_track(sorted(track.values(), key=lambda location: location["created_at"]), Config.TRACK_ARCHIVE_COMPRESSION_LEVEL)
+        self.db.query(Location).filter(Location.session_id == sport_session.session_id).delete(synchronize_session=False)
+
+    def _insert_locations(self, sport_session: SportSession, locations_payload: List[dict]):
+        # Payloads are sorted by created_at, only the first fix of a timestamp is kept
+        unique_payload = {}
+        for location_payload in locations_payload:
+            unique_payload.setdefault(location_payload["created_at"], location_payload)
+
+        insert_statement = dialect_insert(self.db, Location).on_conflict_do_nothing(index_elements=[Location.session_id, Location.created_at]).returning(Location.created_at)
+        inserted_at = {row.created_at for row in self.db.execute(insert_statement, list(unique_payload.values()))}
+        inserted_locations = [location_payload for location_payload in unique_payload.values() if location_payload["created_at"] in inserted_at]
+        if not inserted_locations:
+            return inserted_locations
+
+        last_location_at = sport_session.last_location_at
+        for location_payload in inserted_locations:
+            update_track_aggregates(sport_session, location_payload["latitude"], location_payload["longitude"], location_payload["speed"], location_payload["created_at"])
+
+        late_locations = [location_payload for location_payload in inserted_locations if last_location_at and location_payload["created_at"] < last_location_at]
+        if late_locations and sport_session.location_count is not None:
+            self._correct_distance_for_late_locations(sport_session, late_locations)
+
+        # Fixes flushed after the finish must not bring the session back among the active ones, nor be left out of its archive
+        if sport_session.is_active:
+            last_location = inserted_locations[-1]
+            self._update_active_position(sport_session, last_location["latitude"], last_location["longitude"], last_location["created_at"])
+        elif sport_session.track_archived_at:
+            self._merge_locations_into_archive(sport_session)
+        return inserted_locations
+
+    def _correct_distance_for_late_locations(self, sport_session: SportSession, late_locations: List[dict]):
+        first_late_at, last_late_at = late_locations[0]["created_at"], late_locations[-1]["created_at"]
+        session_locations = self.db.query(Location).filter(Location.session_id == sport_session.session_id)
+
+        previous_at = session_locations.filter(Location.created_at < first_late_at).with_entities(func.max(Location.created_at)).scalar()
+        next_at = session_locations.filter(Location.created_at > last_late_at).with_entities(func.min(Location.created_at)).scalar()
+        window = (
+            session_locations.filter(Location.created_at >= (previous_at or first_late_at), Location.created_at <= (next_at or last_late_at))
+            .with_entities(Location.latitude, Location.longitude, Location.created_at)
+            .order_by(Location.created_at)
+            .all()
+        )
+        correct_distance_for_late_locations(sport_session, window, {location_payload["created_at"] for location_payload in late_locations})
+
+    def _compute_segments(self, sport_session: SportSession, compute):
+        track = self._get_track(sport_session)
+        return compute(
+            [location["latitude"] for location in track],
+            [location["longitude"] for location in track],
+            [location["created_at"] for location in track],
+            [location["speed"] for location in track],
+        )
+
+    def _store_segments(self, sport_session_id: UUID4, segments: dict):
+        insert_statement = dialect_insert(self.db, SportSessionSegments).values(session_id=sport_session_id, computed_at=datetime.datetime.now(), **segments)
+        self.db.execute(insert_statement.on_conflict_do_nothing(index_elements=[SportSessionSegments.session_id]))
+        self.db.commit()
+
+    def _cache_sport_session_route(self, sport_session_id: UUID4, tolerance: float, max_points: int, original_point_count: int, points: List[dict]):
+        # Past the limit further parameters are simplified on every request instead of adding rows
+        cached_routes = self.db.query(func.count()).select_from(SportSessionRoute).filter(SportSessionRoute.session_id == sport_session_id).scalar()
+        if cached_routes >= Config.MAX_CACHED_ROUTES_PER_SESSION:
+            return
+
+        insert_statement = dialect_insert(self.db, SportSessionRoute).values(
+            session_id=sport_session_id,
+            tolerance=tolerance,
+            max_points=max_points,
+            original_point_count=original_point_count,
+            track=encode_track(points, Config.TRACK_ARCHIVE_COMPRESSION_LEVEL),
+            created_at=datetime.datetime.now(),
+        )
+        # Concurrent first requests compute the same route, whichever commits first wins
+        self.db.execute(insert_statement.on_conflict_do_nothing(index_elements=[SportSessionRoute.session_id, SportSessionRoute.tolerance, SportSessionRoute.max_points]))
+        self.db.commit()
+
+    def _update_active_position(self, sport_session: SportSession, latitude: float, longitude: float, created_at: datetime.datetime):
+        geohash = encode_geohash(latitude, longitude, Config.GEOHASH_PRECISION)
+        upsert_statement = dialect_insert(self.db, ActiveSportSessionPosition).values(
+            session_id=sport_session.session_id,
+            user_id=sport_session.user_id,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geohash,
+            updated_at=created_at,
+        )
+        # Late fixes must not move the athlete back to an older position
+        upsert_statement = upsert_statement.on_conflict_do_update(
+            index_elements=[ActiveSportSessionPosition.session_id],
+            set_={"latitude": latitude, "longitude": longitude, "geohash": geohash, "updated_at": created_at},
+            where=ActiveSportSessionPosition.updated_at <= created_at,
+        )
+        self.db.execute(upsert_statement)
@@ -0,0 +1,117 @@
+import datetime
+from typing import Optional
+
+from pydantic import UUID4
+from sqlalchemy.orm import Session
+
+from app.models.model import SportSession, SportSessionStatistic
+from app.utils.utils import dialect_insert
+
+STATISTICS_PERIODS = ("week", "month")
+STATISTICS_COUNTERS = ("session_count", "total_distance", "total_duration", "total_calories", "total_steps", "heartrate_sum", "heartrate_count")
+
+
+def get_period_start(date: datetime.datetime, period: str) -> datetime.date:
+    if period == "week":
+        return date.date() - datetime.timedelta(days=date.weekday())
+    return date.date().replace(day=1)
+
+
+def get_stored_integer(value) -> int:
+    # Integer columns round what they're given (half to even on PostgreSQL, like round). The finish still holds the client's
+    # unrounded values, so they're counted the way a rebuild reads them back
+    return round(value or 0)
+
+
+def get_statistic_counters(sport_session: SportSession):
+    avg_heartrate = get_stored_integer(sport_session.avg_heartrate)
+    return {
+        "session_count": 1,
+        "total_distance": float(get_stored_integer(sport_session.distance)),
+        "total_duration": get_stored_integer(sport_session.duration),
+        "total_calories": float(get_stored_integer(sport_session.calories)),
+        "total_steps": get_stored_integer(sport_session.steps),
+        "heartrate_sum": float(avg_heartrate),
+        "heartrate_count": 1 if avg_heartrate else 0,
+    }
+
+
+class SportSessionStatisticsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_finished_sport_session(self, sport_session: SportSession):
+        # Runs inside the finish transaction, the caller commits
+        counters = get_statistic_counters(sport_session)
+
+        for period in STATISTICS_PERIODS:
+            upsert_statement = dialect_insert(self.db, SportSessionStatistic).values(
+                user_id=sport_session.user_id,
+                sport_id=sport_session.sport_id,
+                period=period,
+                period_start=get_period_start(sport_session.started_at, period),
+                **counters,
+            )
+            upsert_statement = upsert_statement.on_conflict_do_update(
+                index_elements=[SportSessionStatistic.user_id, SportSessionStatistic.sport_id, SportSessionStatistic.period, SportSessionStatistic.period_start],
+                set_={counter: getattr(SportSessionStatistic, counter) + upsert_statement.excluded[counter] for counter in STATISTICS_COUNTERS},
+            )
+            self.db.execute(upsert_statement)
+
+    def get_statistics(
+        self,
+        user_id: UUID4,
+        period: str,
+        sport_id: Optional[UUID4] = None,
+        started_from: Optional[datetime.date] = None,
+        started_to: Optional[datetime.date] = None,
+    ):
+        query = self.db.query(SportSessionStatistic).filter(SportSessionStatistic.user_id == user_id, SportSessionStatistic.period == period)
+        if sport_id:
+            query = query.filter(SportSessionStatistic.sport_id == sport_id)
+        if started_from:
+            query = query.filter(SportSessionStatistic.period_start >= started_from)
+        if started_to:
+            query = query.filter(SportSessionStatistic.period_start < started_to)
+
+        statistics = query.order_by(SportSessionStatistic.period_start.desc(), SportSessionStatistic.sport_id).all()
+
+        return [
+            {
+                "sport_id": str(statistic.sport_id),
+                "period": statistic.period,
+                "period_start": statistic.period_start.isoformat(),
+                "session_count": statistic.session_count,
+                "total_distance": statistic.total_distance,
+                "total_duration": statistic.total_duration,
+                "total_calories": statistic.total_calories,
+                "total_steps": statistic.total_steps,
+                "average_distance": statistic.total_distance / statistic.session_count,
+                "average_duration": statistic.total_duration / statistic.session_count,
+                "average_calories": statistic.total_calories / statistic.session_count,
+                "average_steps": statistic.total_steps / statistic.session_count,
+                "average_heartrate": statistic.heartrate_sum / statistic.heartrate_count if statistic.heartrate_count else None,
+            }
+            for statistic in statistics
+        ]
+
+    def rebuild_statistics(self):
+        rollups = {}
+        finished_sport_sessions = self.db.query(SportSession).filter(SportSession.is_active == False).yield_per(1000)
+
+        for sport_session in finished_sport_sessions:
+            counters = get_statistic_counters(sport_session)
+            for period in STATISTICS_PERIODS:
+                key = (sport_session.user_id, sport_session.sport_id, period, get_period_start(sport_session.started_at, period))
+                rollup = rollups.setdefault(key, dict.fromkeys(STATISTICS_COUNTERS, 0))
+                for counter in STATISTICS_COUNTERS:
+                    rollup[counter] += counters[counter]
+
+        self.db.query(SportSessionStatistic).delete(synchronize_session=False)
+        self.db.add_all(
+            SportSessionStatistic(user_id=user_id, sport_id=sport_id, period=period, period_start=period_start, **rollup)
+            for (user_id, sport_id, period, period_start), rollup in rollups.items()
+        )
+        self.db.commit()
+
+        return len(rollups)
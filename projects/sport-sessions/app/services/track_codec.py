@@ -0,0 +1,119 @@
+import datetime
+import struct
+import zlib
+from typing import List
+
+import numpy as np
+
+MAGIC = b"SPTK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBIq")  # magic, version, compression level, fix count, first fix epoch in milliseconds
+EPOCH = datetime.datetime(1970, 1, 1)
+
+FLAG_HAS_NULLS = 1
+FLAG_WIDE = 2
+
+# Location fields packed into an archive, with the scale used to store them as integers
+TRACK_FIELDS = {
+    "latitude": 10_000_000,
+    "longitude": 10_000_000,
+    "accuracy": 100,
+    "altitude": 100,
+    "altitude_accuracy": 100,
+    "heading": 100,
+    "speed": 100,
+}
+
+# Heart rate, cadence and power samples reuse the same layout with their own columns
+SENSOR_FIELDS = {
+    "heartrate": 1,
+    "cadence": 10,
+    "power": 10,
+}
+
+
+def _pack_column(values: np.ndarray) -> bytes:
+    nulls = np.isnan(values)
+    flags = 0
+    filled = values
+    if nulls.any():
+        flags |= FLAG_HAS_NULLS
+        # Nulls repeat the last known value so they cost a zero delta, the bitmap restores them on decode
+        last_known = np.maximum.accumulate(np.where(~nulls, np.arange(values.size), 0))
+        filled = np.nan_to_num(values[last_known], nan=0.0)
+
+    deltas = np.diff(filled.astype(np.int64), prepend=np.int64(0))
+    if deltas.size and (deltas.min() < np.iinfo(np.int32).min or deltas.max() > np.iinfo(np.int32).max):
+        flags |= FLAG_WIDE
+        width = 8
+    else:
+        width = 4
+    deltas = deltas.astype(f"<i{width}")
+
+    # Grouping the n-th byte of every delta together lets zlib find the long zero runs
+    shuffled = deltas.view(np.uint8).reshape(-1, width).T.tobytes()
+    bitmap = np.packbits(nulls).tobytes() if flags & FLAG_HAS_NULLS else b""
+    return bytes([flags]) + bitmap + shuffled
+
+
+def _unpack_column(payload: memoryview, offset: int, count: int):
+    flags = payload[offset]
+    offset += 1
+
+    nulls = np.zeros(count, dtype=bool)
+    if flags & FLAG_HAS_NULLS:
+        bitmap_size = (count + 7) // 8
+        nulls = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=bitmap_size, offset=offset), count=count).astype(bool)
+        offset += bitmap_size
+
+    width = 8 if flags & FLAG_WIDE else 4
+    shuffled = np.frombuffer(payload, dtype=np.uint8, count=count * width, offset=offset)
+    deltas = shuffled.reshape(width, count).T.copy().view(f"<i{width}").reshape(count)
+    offset += count * width
+
+    values = np.cumsum(deltas.astype(np.int64)).astype(np.float64)
+    values[nulls] = np.nan
+    return values, offset
+
+
+def encode_track(locations: List[dict], compression_level: int = 6, fields: dict = TRACK_FIELDS) -> bytes:
+    count = len(locations)
+    milliseconds = np.fromiter(((location["created_at"] - EPOCH) // datetime.timedelta(milliseconds=1) for location in locations), dtype=np.int64, count=count)
+    first_fix_at = int(milliseconds[0]) if count else 0
+
+    columns = [_pack_column((milliseconds - first_fix_at).astype(np.float64))]
+    for field, scale in fields.items():
+        values = np.array([location[field] for location in locations], dtype=np.float64)
+        columns.append(_pack_column(np.round(values * scale)))
+
+    payload = b"".join(columns)
+    if compression_level:
+        payload = zlib.compress(payload, compression_level)
+
+    return HEADER.pack(MAGIC, VERSION, compression_level, count, first_fix_at) + payload
+
+
+def decode_track(blob: bytes, fields: dict = TRACK_FIELDS) -> List[dict]:
+    magic, version, compression_level, count, first_fix_at = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported track archive format")
+
+    payload = blob[HEADER.size :]
+    if compression_level:
+        payload = zlib.decompress(payload)
+    payload = memoryview(payload)
+
+    milliseconds, offset = _unpack_column(payload, 0, count)
+    columns = {}
+    for field, scale in fields.items():
+        values, offset = _unpack_column(payload, offset, count)
+        columns[field] = values / scale
+
+    first_fix = EPOCH + datetime.timedelta(milliseconds=first_fix_at)
+    return [
+        {
+            **{field: None if np.isnan(columns[field][index]) else float(columns[field][index]) for field in fields},
+            "created_at": first_fix + datetime.timedelta(milliseconds=int(milliseconds[index])),
+        }
+        for index in range(count)
+    ]
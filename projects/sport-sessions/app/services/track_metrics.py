@@ -0,0 +1,140 @@
+import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.config.settings import Config
+
+EARTH_RADIUS = 6371  # radius of Earth in kilometers
+
+
+def haversine_distances(latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lambdas = np.radians(np.asarray(longitudes, dtype=np.float64))
+    if phi.size < 2:
+        return np.zeros(0)
+
+    delta_phi = np.diff(phi)
+    delta_lambda = np.diff(lambdas)
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(delta_lambda / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def elapsed_seconds(timestamps: Sequence[datetime.datetime]) -> np.ndarray:
+    if not len(timestamps):
+        return np.zeros(0)
+    started_at = timestamps[0]
+    return np.fromiter(((timestamp - started_at).total_seconds() for timestamp in timestamps), dtype=np.float64, count=len(timestamps))
+
+
+def elevation_gain(altitudes: Sequence[Optional[float]]) -> float:
+    # None altitudes become NaN and are dropped before diffing
+    heights = np.asarray(altitudes, dtype=np.float64)
+    heights = heights[~np.isnan(heights)]
+    if heights.size < 2:
+        return 0.0
+    climbs = np.diff(heights)
+    return float(climbs[climbs > 0].sum())
+
+
+def split_times(cumulative_distances: np.ndarray, seconds: np.ndarray, split_distance: float) -> List[dict]:
+    if cumulative_distances.size < 2 or cumulative_distances[-1] < split_distance:
+        return []
+
+    marks = np.arange(split_distance, cumulative_distances[-1] + 1e-9, split_distance)
+    mark_seconds = np.interp(marks, cumulative_distances, seconds)
+    durations = np.diff(np.concatenate(([0.0], mark_seconds)))
+    return [
+        {"split": index + 1, "distance": float(mark), "duration": float(duration), "pace": float(duration / split_distance)}
+        for index, (mark, duration) in enumerate(zip(marks, durations))
+    ]
+
+
+def compute_track_metrics(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    timestamps: Sequence[datetime.datetime],
+    altitudes: Optional[Sequence[Optional[float]]] = None,
+    speeds: Optional[Sequence[Optional[float]]] = None,
+    moving_speed_threshold: float = Config.MOVING_SPEED_THRESHOLD,
+    split_distance: float = Config.SPLIT_DISTANCE,
+):
+    segment_distances = haversine_distances(latitudes, longitudes)
+    seconds = elapsed_seconds(timestamps)
+    segment_seconds = np.diff(seconds)
+    cumulative_distances = np.concatenate(([0.0], np.cumsum(segment_distances))) if seconds.size else np.zeros(0)
+
+    # Segment speeds are in m/s like Location.speed, distances are kept in kilometers
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_speeds = np.where(segment_seconds > 0, segment_distances * 1000 / segment_seconds, 0.0)
+    moving = segment_speeds >= moving_speed_threshold
+
+    distance = float(segment_distances.sum())
+    duration = float(seconds[-1]) if seconds.size else 0.0
+    moving_time = float(segment_seconds[moving].sum())
+
+    reported_speeds = np.asarray(speeds or [], dtype=np.float64)
+    reported_speeds = reported_speeds[~np.isnan(reported_speeds)]
+
+    return {
+        "distance": distance,
+        "duration": duration,
+        "moving_time": moving_time,
+        "average_speed": float(reported_speeds.mean()) if reported_speeds.size else (distance * 1000 / duration if duration else None),
+        "moving_speed": float(segment_distances[moving].sum() * 1000 / moving_time) if moving_time else None,
+        "elevation_gain": elevation_gain(altitudes or []),
+        "splits": split_times(cumulative_distances, seconds, split_distance),
+    }
+
+
+def detect_pauses(seconds: np.ndarray, stationary: np.ndarray, min_pause_seconds: float) -> List[tuple]:
+    # Runs of stationary segments become pauses once they last long enough, shorter stops count as moving
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], stationary.astype(np.int8), [0]))))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2]) if seconds[end] - seconds[start] >= min_pause_seconds]
+
+
+def compute_track_segments(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    timestamps: Sequence[datetime.datetime],
+    speeds: Optional[Sequence[Optional[float]]] = None,
+    moving_speed_threshold: float = Config.MOVING_SPEED_THRESHOLD,
+    split_distance: float = Config.SPLIT_DISTANCE,
+    min_pause_seconds: float = Config.AUTO_PAUSE_MIN_SECONDS,
+):
+    """Splits a track into distance splits timed on moving time, with stationary stretches detected as pauses.
+
+    A segment is stationary when the device reported speed at its end is under the threshold, or when the speed derived
+    from the fixes is, for fixes without one.
+    """
+    segment_distances = haversine_distances(latitudes, longitudes)
+    seconds = elapsed_seconds(timestamps)
+    segment_seconds = np.diff(seconds)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_speeds = np.where(segment_seconds > 0, segment_distances * 1000 / segment_seconds, 0.0)
+    reported_speeds = np.asarray([np.nan if speed is None else speed for speed in (speeds or [None] * len(seconds))], dtype=np.float64)[1:]
+    segment_speeds = np.where(np.isnan(reported_speeds), segment_speeds, reported_speeds)
+
+    paused = np.zeros(segment_seconds.size, dtype=bool)
+    pauses = detect_pauses(seconds, segment_speeds < moving_speed_threshold, min_pause_seconds)
+    for start, end in pauses:
+        paused[start:end] = True
+
+    moving_seconds = np.where(paused, 0.0, segment_seconds)
+    cumulative_distances = np.concatenate(([0.0], np.cumsum(segment_distances))) if seconds.size else np.zeros(0)
+    cumulative_moving_seconds = np.concatenate(([0.0], np.cumsum(moving_seconds))) if seconds.size else np.zeros(0)
+    moving_time = float(moving_seconds.sum())
+    duration = float(seconds[-1]) if seconds.size else 0.0
+
+    return {
+        "split_distance": split_distance,
+        "duration": duration,
+        "moving_time": moving_time,
+        "paused_time": duration - moving_time,
+        "moving_speed": float(segment_distances[~paused].sum() * 1000 / moving_time) if moving_time else None,
+        "pauses": [
+            {"started_at": timestamps[start].isoformat(), "ended_at": timestamps[end].isoformat(), "duration": float(seconds[end] - seconds[start])} for start, end in pauses
+        ],
+        "splits": split_times(cumulative_distances, cumulative_moving_seconds, split_distance),
+    }
@@ -0,0 +1,58 @@
+import heapq
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.track_metrics import EARTH_RADIUS
+
+
+def _project(latitudes: Sequence[float], longitudes: Sequence[float]):
+    # An equirectangular projection around the track is accurate enough at route scale and keeps distances in meters
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lambdas = np.radians(np.asarray(longitudes, dtype=np.float64))
+    radius = EARTH_RADIUS * 1000
+    return radius * (lambdas - lambdas[0]) * np.cos(phi.mean()), radius * (phi - phi[0])
+
+
+def _farthest_point(x: np.ndarray, y: np.ndarray, start: int, end: int):
+    if end - start < 2:
+        return None
+
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    px, py = x[start + 1 : end] - x[start], y[start + 1 : end] - y[start]
+    length = np.hypot(dx, dy)
+    distances = np.hypot(px, py) if length == 0 else np.abs(dx * py - dy * px) / length
+
+    index = int(np.argmax(distances))
+    return float(distances[index]), start + 1 + index
+
+
+def simplify_track(latitudes: Sequence[float], longitudes: Sequence[float], tolerance: float = 0.0, max_points: Optional[int] = None) -> np.ndarray:
+    """Douglas-Peucker simplification, returns the sorted indices of the fixes to keep.
+
+    Segments are split in order of their largest deviation, so the result stops either when every dropped fix
+    is within ``tolerance`` meters of the simplified route or when ``max_points`` fixes are kept.
+    """
+    count = len(latitudes)
+    if count <= 2:
+        return np.arange(count)
+
+    x, y = _project(latitudes, longitudes)
+    kept = [0, count - 1]
+    segments = []
+
+    def push_segment(start: int, end: int):
+        farthest = _farthest_point(x, y, start, end)
+        if farthest:
+            heapq.heappush(segments, (-farthest[0], farthest[1], start, end))
+
+    push_segment(0, count - 1)
+    while segments and (max_points is None or len(kept) < max_points):
+        negative_distance, index, start, end = heapq.heappop(segments)
+        if -negative_distance <= tolerance:
+            break
+        kept.append(index)
+        push_segment(start, index)
+        push_segment(index, end)
+
+    return np.sort(np.asarray(kept))
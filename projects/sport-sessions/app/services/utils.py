@@ -1,8 +1,15 @@
+import base64
+import bisect
+import datetime
 import math
-from typing import List
+import uuid
+from typing import List, Optional
 
 from app.config.settings import Config
-from app.models.model import Location
+from app.exceptions.exceptions import InvalidCursorError, InvalidLocationError
+from app.models.model import Location, SportSession
+from app.models.schemas.schema import SportSessionLocationCreate
+from app.services.track_metrics import haversine_distances
 
 
 def _haversine(lat1, lon1, lat2, lon2):
@@ -17,16 +24,16 @@ def _haversine(lat1, lon1, lat2, lon2):
 
 
 def _calculate_total_distance_coordinates(locations):
-    total_distance = 0
-    for i in range(1, len(locations)):
-        lat1, lon1 = locations[i - 1]
-        lat2, lon2 = locations[i]
-        total_distance += _haversine(lat1, lon1, lat2, lon2)
-    return total_distance
+    if len(locations) < 2:
+        return 0
+    latitudes, longitudes = zip(*locations)
+    return float(haversine_distances(latitudes, longitudes).sum())
 
 
-def estimate_distance(steps: int, locations: List[Location] = []):
-    if not locations:
+def estimate_distance(steps: int, locations: List[Location] = [], tracked_distance: Optional[float] = None):
+    if tracked_distance is not None:
+        return tracked_distance
+    elif not locations:
         return steps * Config.AVG_STEP_LENGTH
     else:
         locations = [(location.latitude, location.longitude) for location in locations]
@@ -38,14 +45,147 @@ def estimate_calories_burned(steps: int):
     return steps * Config.AVG_CALORIES_PER_STEP
 
 
-def estimate_speed(distance=0, duration=0, locations: List[Location] = []):
-    if locations:
-        speed_accumulator = 0
-        for location in locations:
-            speed_accumulator += location.speed
+def estimate_speed(distance=0, duration=0, locations: List[Location] = [], speed_sum: float = 0, speed_count: int = 0):
+    if speed_count:
+        return speed_sum / speed_count
 
-        return speed_accumulator / len(locations)
+    elif locations:
+        moving_speeds = [location.speed for location in locations if location.speed is not None and location.speed >= Config.MOVING_SPEED_THRESHOLD]
+        return sum(moving_speeds) / len(moving_speeds) if moving_speeds else None
 
     elif distance and duration:
         return distance / duration
     return None
+
+
+def to_utc_naive(date: datetime.datetime):
+    if date.tzinfo is None:
+        return date
+    return date.astimezone(datetime.UTC).replace(tzinfo=None)
+
+
+def check_location_timestamps(locations: List[SportSessionLocationCreate], started_at: Optional[datetime.datetime], now: Optional[datetime.datetime] = None):
+    # A fix dated ahead of every later one would be the last position forever, and would land outside the location partitions
+    latest_allowed = (now or datetime.datetime.now(datetime.UTC).replace(tzinfo=None)) + datetime.timedelta(seconds=Config.MAX_LOCATION_CLOCK_SKEW_SECONDS)
+    for location in locations:
+        if location.created_at is None:
+            continue
+        created_at = to_utc_naive(location.created_at)
+        if started_at and created_at < to_utc_naive(started_at):
+            raise InvalidLocationError(f"Location created at {created_at.isoformat()} is before the sport session started")
+        if created_at > latest_allowed:
+            raise InvalidLocationError(f"Location created at {created_at.isoformat()} is in the future")
+
+
+def update_track_aggregates(sport_session: SportSession, latitude: float, longitude: float, speed: Optional[float], created_at: datetime.datetime):
+    # Sessions started before aggregates were tracked are recomputed from their locations at finish
+    if sport_session.location_count is None:
+        return
+
+    if sport_session.location_count and sport_session.last_location_at and created_at < sport_session.last_location_at:
+        # Late fixes only widen the bounds here, the service corrects the distance once it knows their neighbours
+        _update_track_bounds(sport_session, latitude, longitude, speed)
+        sport_session.location_count += 1
+        return
+
+    if sport_session.location_count:
+        sport_session.tracked_distance += _haversine(sport_session.last_latitude, sport_session.last_longitude, latitude, longitude)
+    else:
+        sport_session.tracked_distance = 0
+        sport_session.min_latitude = sport_session.max_latitude = latitude
+        sport_session.min_longitude = sport_session.max_longitude = longitude
+
+    _update_track_bounds(sport_session, latitude, longitude, speed)
+    sport_session.location_count += 1
+    sport_session.last_latitude = latitude
+    sport_session.last_longitude = longitude
+    sport_session.last_location_at = created_at
+
+
+def _update_track_bounds(sport_session: SportSession, latitude: float, longitude: float, speed: Optional[float]):
+    sport_session.min_latitude = min(sport_session.min_latitude, latitude)
+    sport_session.max_latitude = max(sport_session.max_latitude, latitude)
+    sport_session.min_longitude = min(sport_session.min_longitude, longitude)
+    sport_session.max_longitude = max(sport_session.max_longitude, longitude)
+
+    # Stationary fixes are left out so the average speed is a moving speed, not diluted by pauses
+    if speed is not None and speed >= Config.MOVING_SPEED_THRESHOLD:
+        sport_session.speed_sum = (sport_session.speed_sum or 0) + speed
+        sport_session.speed_count = (sport_session.speed_count or 0) + 1
+
+
+def correct_distance_for_late_locations(sport_session: SportSession, window: List, late_times: set):
+    """Replaces the distance between the fixes surrounding late arrivals with the path through them.
+
+    The window holds (latitude, longitude, created_at) of every stored fix between the last fix before the earliest late
+    arrival and the first fix after the latest one, late arrivals included.
+    """
+    path = [(latitude, longitude) for latitude, longitude, _ in window]
+    counted_path = [(latitude, longitude) for latitude, longitude, created_at in window if created_at not in late_times]
+    sport_session.tracked_distance += _calculate_total_distance_coordinates(path) - _calculate_total_distance_coordinates(counted_path)
+
+
+def heartrate_zone(heartrate: float, zones: List[int]) -> int:
+    return max(bisect.bisect_right(zones, heartrate) - 1, 0)
+
+
+def update_sensor_aggregates(sport_session: SportSession, samples: List[dict]):
+    """Folds a batch of sensor samples, sorted by created_at, into the running aggregates of the session.
+
+    Each heart rate reading holds until the next one, capped at SENSOR_MAX_SAMPLE_GAP seconds so dropouts do not
+    inflate the time spent in a zone. Late readings still count for the min/max/average but not for the zones.
+    """
+    zones = Config.HEARTRATE_ZONES
+    zone_seconds = list(sport_session.heartrate_zone_seconds or [0.0] * len(zones))
+
+    for sample in samples:
+        heartrate, cadence, power = sample["heartrate"], sample["cadence"], sample["power"]
+
+        if heartrate is not None:
+            sport_session.heartrate_sum = (sport_session.heartrate_sum or 0) + heartrate
+            sport_session.heartrate_count = (sport_session.heartrate_count or 0) + 1
+            sport_session.min_heartrate = heartrate if sport_session.min_heartrate is None else min(sport_session.min_heartrate, heartrate)
+            sport_session.max_heartrate = heartrate if sport_session.max_heartrate is None else max(sport_session.max_heartrate, heartrate)
+
+            last_heartrate_at = sport_session.last_heartrate_at
+            if last_heartrate_at is None or sample["created_at"] >= last_heartrate_at:
+                if last_heartrate_at is not None:
+                    elapsed = min((sample["created_at"] - last_heartrate_at).total_seconds(), Config.SENSOR_MAX_SAMPLE_GAP)
+                    zone_seconds[heartrate_zone(sport_session.last_heartrate, zones)] += elapsed
+                sport_session.last_heartrate = heartrate
+                sport_session.last_heartrate_at = sample["created_at"]
+
+        if cadence is not None:
+            sport_session.cadence_sum = (sport_session.cadence_sum or 0) + cadence
+            sport_session.cadence_count = (sport_session.cadence_count or 0) + 1
+
+        if power is not None:
+            sport_session.power_sum = (sport_session.power_sum or 0) + power
+            sport_session.power_count = (sport_session.power_count or 0) + 1
+            sport_session.max_power = power if sport_session.max_power is None else max(sport_session.max_power, power)
+
+    sport_session.sensor_sample_count = (sport_session.sensor_sample_count or 0) + len(samples)
+    if sport_session.heartrate_count:
+        sport_session.avg_heartrate = sport_session.heartrate_sum / sport_session.heartrate_count
+    sport_session.heartrate_zone_seconds = zone_seconds
+
+
+def bucket_route_parameters(tolerance: float, max_points: int):
+    # Tolerances are rounded to the nearest step, point limits down to a step so a route never has more points than asked for
+    tolerance = round(round(tolerance / Config.ROUTE_TOLERANCE_STEP) * Config.ROUTE_TOLERANCE_STEP, 6)
+    if max_points >= Config.ROUTE_MAX_POINTS_STEP:
+        max_points -= max_points % Config.ROUTE_MAX_POINTS_STEP
+    return tolerance, max_points
+
+
+def encode_sport_session_cursor(started_at: datetime.datetime, session_id) -> str:
+    raw_cursor = f"{started_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw_cursor.encode()).decode()
+
+
+def decode_sport_session_cursor(cursor: str):
+    try:
+        started_at, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return to_utc_naive(datetime.datetime.fromisoformat(started_at)), uuid.UUID(session_id)
+    except ValueError:
+        raise InvalidCursorError()
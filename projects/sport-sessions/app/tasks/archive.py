@@ -0,0 +1,13 @@
+from app.config.db import session_local
+from app.services.sport_sessions import SportSessionService
+
+
+def archive_sport_session_track(sport_session_id):
+    db = session_local()
+    try:
+        SportSessionService(db).archive_sport_session_track(sport_session_id)
+    except Exception as e:
+        print(f"Error archiving track of sport session {sport_session_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
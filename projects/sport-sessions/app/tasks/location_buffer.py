@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.exceptions.exceptions import NotFoundError, NotActiveError, NotOwnerError, InvalidLocationError
+from app.services.location_buffer import LocationWriteBuffer
+from app.services.sport_sessions import SportSessionService
+
+# The shutdown flush must not overlap a run the cancelled flusher left in its thread
+_flush_lock = threading.Lock()
+
+
+def flush_location_buffer(location_buffer: LocationWriteBuffer, batch_size: int = Config.LOCATION_BUFFER_FLUSH_SIZE):
+    flushed = 0
+    with _flush_lock:
+        db = session_local()
+        try:
+            while pending := location_buffer.get_pending(batch_size):
+                for session_id, user_id, buffered_locations in location_buffer.group_by_session(pending):
+                    try:
+                        SportSessionService(db).add_buffered_locations_to_sport_session(session_id, buffered_locations, user_id)
+                    except (NotFoundError, NotActiveError, NotOwnerError, InvalidLocationError) as e:
+                        # These fixes would be rejected on every retry, so they are dropped instead of blocking the buffer
+                        print(f"Dropping {len(buffered_locations)} buffered locations of sport session {session_id}: {e}")
+                        db.rollback()
+                    location_buffer.mark_flushed([buffered["buffer_id"] for buffered in buffered_locations])
+                    flushed += len(buffered_locations)
+        except Exception as e:
+            # Whatever was not flushed stays pending and is retried on the next run
+            print(f"Error flushing location buffer: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    return flushed
+
+
+async def run_location_buffer_flusher(location_buffer: LocationWriteBuffer, interval: float = Config.LOCATION_BUFFER_FLUSH_SECONDS):
+    # The first run replays whatever a previous process left in the buffer
+    while True:
+        await asyncio.to_thread(flush_location_buffer, location_buffer)
+        await asyncio.sleep(interval)
@@ -0,0 +1,46 @@
+import asyncio
+import datetime
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.services.partitions import ensure_location_partitions, drop_empty_location_partitions
+from app.services.sport_sessions import SportSessionService
+
+
+def create_location_partitions():
+    # Runs on startup, a failed maintenance run must not keep the service from booting, the retention task tries again
+    db = session_local()
+    try:
+        ensure_location_partitions(db, datetime.date.today(), Config.LOCATION_PARTITION_MONTHS_AHEAD)
+    except Exception as e:
+        print(f"Error creating location partitions: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def apply_location_retention(retention_days: int = Config.LOCATION_RETENTION_DAYS, batch_size: int = Config.LOCATION_RETENTION_BATCH_SIZE):
+    archived = 0
+    dropped = []
+    db = session_local()
+    try:
+        ensure_location_partitions(db, datetime.date.today(), Config.LOCATION_PARTITION_MONTHS_AHEAD)
+        if retention_days > 0:
+            started_before = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+            while archived_batch := SportSessionService(db).archive_expired_sport_session_tracks(started_before, batch_size):
+                archived += archived_batch
+            dropped = drop_empty_location_partitions(db, started_before.date())
+    except Exception as e:
+        print(f"Error applying location retention: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    return archived, dropped
+
+
+async def run_location_retention(interval: float = Config.LOCATION_RETENTION_INTERVAL_SECONDS):
+    # Partitions for the coming months are created on every run, so month rollovers never hit a missing partition
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(apply_location_retention)
@@ -0,0 +1,39 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.services.sport_sessions import SportSessionService
+from app.services.track_metrics import compute_track_segments
+
+_segments_pool = None
+
+
+def _get_segments_pool():
+    # Created on first use, spawned workers only import the NumPy track code and never touch the database
+    global _segments_pool
+    if _segments_pool is None:
+        _segments_pool = ProcessPoolExecutor(max_workers=Config.SEGMENTS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _segments_pool
+
+
+def _compute_in_pool(*track_series):
+    if Config.SEGMENTS_WORKERS <= 0:
+        return compute_track_segments(*track_series)
+    return _get_segments_pool().submit(compute_track_segments, *track_series).result()
+
+
+def compute_sport_session_segments(sport_session_id):
+    db = session_local()
+    try:
+        SportSessionService(db).store_sport_session_segments(sport_session_id, _compute_in_pool)
+    except Exception as e:
+        print(f"Error computing segments of sport session {sport_session_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def shutdown_segments_pool():
+    if _segments_pool is not None:
+        _segments_pool.shutdown(cancel_futures=True)
@@ -1,10 +1,31 @@
+from typing import Callable, TypeVar
+
 from fastapi import Header
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from app.config.settings import Config
 from app.exceptions.exceptions import InvalidApiKeyError
 
+T = TypeVar("T")
+
 
 def validate_api_key(x_api_key: str = Header(None)):
     if x_api_key is None or x_api_key != Config.SPORT_SESSIONS_API_KEY:
         raise InvalidApiKeyError("Invalid API key")
     return x_api_key
+
+
+def dialect_insert(db: Session, model):
+    # ON CONFLICT clauses are dialect specific, SQLite is only used by the test mode
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+async def run_with_session(db: Session | AsyncSession, operation: Callable[[Session], T]) -> T:
+    # Sync service code runs on the async session through run_sync, its queries then await asyncpg instead of blocking the loop
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(operation)
+    return operation(db)
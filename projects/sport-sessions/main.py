@@ -1,10 +1,20 @@
+import asyncio
+import contextlib
+
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 
 from app.routes import sport_sessions
-from app.exceptions.exceptions import NotFoundError, NotActiveError, InvalidApiKeyError
+from app.exceptions.exceptions import NotFoundError, NotActiveError, NotOwnerError, InvalidApiKeyError, InvalidCursorError, InvalidLocationError
 from app.models.model import base
-from app.config.db import engine
+from app.config.db import engine, session_local, async_engine
+from app.config.settings import Config
+from app.services.location_buffer import location_write_buffer
+from app.services.sport_sessions import SportSessionService
+from app.services.statistics import SportSessionStatisticsService
+from app.tasks.location_buffer import flush_location_buffer, run_location_buffer_flusher
+from app.tasks.retention import create_location_partitions, run_location_retention
+from app.tasks.segments import shutdown_segments_pool
 
 app = FastAPI()
 
@@ -13,6 +23,41 @@ base.metadata.create_all(bind=engine)
 app.include_router(sport_sessions.router)
 
 
+@app.on_event("startup")
+async def startup_event():
+    await asyncio.to_thread(create_location_partitions)
+    app.state.location_retention = asyncio.create_task(run_location_retention())
+
+    if location_write_buffer:
+        app.state.location_buffer_flusher = asyncio.create_task(run_location_buffer_flusher(location_write_buffer))
+
+    if not Config.REBUILD_ACTIVE_POSITIONS_ON_STARTUP and not Config.REBUILD_STATISTICS_ON_STARTUP:
+        return
+
+    db = session_local()
+    try:
+        if Config.REBUILD_ACTIVE_POSITIONS_ON_STARTUP:
+            SportSessionService(db).rebuild_active_sport_session_positions()
+        if Config.REBUILD_STATISTICS_ON_STARTUP:
+            SportSessionStatisticsService(db).rebuild_statistics()
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.location_retention.cancel()
+    shutdown_segments_pool()
+    if location_write_buffer:
+        app.state.location_buffer_flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await app.state.location_buffer_flusher
+        await asyncio.to_thread(flush_location_buffer, location_write_buffer)
+
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 @app.exception_handler(NotFoundError)
 async def not_found_error_handler(request, exc):
     return JSONResponse(status_code=404, content={"message": str(exc)})
@@ -23,11 +68,26 @@ async def not_active_error_handler(request, exc):
     return JSONResponse(status_code=423, content={"message": str(exc)})
 
 
+@app.exception_handler(NotOwnerError)
+async def not_owner_error_handler(request, exc):
+    return JSONResponse(status_code=403, content={"error": str(exc)})
+
+
+@app.exception_handler(InvalidLocationError)
+async def invalid_location_error_handler(request, exc):
+    return JSONResponse(status_code=422, content={"message": str(exc)})
+
+
 @app.exception_handler(InvalidApiKeyError)
 async def invalid_api_key_error_handler(request, exc):
     return JSONResponse(status_code=403, content={"message": str(exc)})
 
 
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_error_handler(request, exc):
+    return JSONResponse(status_code=400, content={"message": str(exc)})
+
+
 @app.get("/ping")
 async def root():
     return {"message": "Sport Sessions Service"}
@@ -0,0 +1,189 @@
+"""
+Simulates concurrent athletes against the sport sessions API: each one starts a session, streams locations at a fixed
+rate and finishes it. Reports throughput, latency percentiles and, when served in process, DB queries per operation.
+
+Run from projects/sport-sessions with: python -m tests.benchmarks.load_generator --athletes 50 --locations 60 --rate 5
+Without --base-url the app runs in process on the SQLite test mode, with it any deployed instance can be targeted.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+from tests.benchmarks.stats import percentile
+
+SPORT_SESSIONS_BASE_URL = "/sport-session"
+
+_current_operation = contextvars.ContextVar("current_operation", default=None)
+
+
+class LoadReport:
+    def __init__(self, count_queries: bool):
+        self.count_queries = count_queries
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.queries = Counter()
+
+    def record(self, operation: str, seconds: float, success: bool):
+        self.latencies[operation].append(seconds)
+        if not success:
+            self.errors[operation] += 1
+
+    def record_query(self, *_):
+        # Queries run inside the request, so the operation of the athlete that sent it is still set
+        operation = _current_operation.get()
+        if operation:
+            self.queries[operation] += 1
+
+    def summary(self, elapsed: float):
+        rows = []
+        for operation, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            rows.append(
+                {
+                    "operation": operation,
+                    "requests": len(latencies),
+                    "errors": self.errors[operation],
+                    "throughput": len(latencies) / elapsed,
+                    "p50_ms": percentile(latencies, 0.5) * 1000,
+                    "p95_ms": percentile(latencies, 0.95) * 1000,
+                    "p99_ms": percentile(latencies, 0.99) * 1000,
+                    "max_ms": latencies[-1] * 1000,
+                    "queries_per_request": self.queries[operation] / len(latencies) if self.count_queries else None,
+                }
+            )
+        return rows
+
+
+async def timed_request(client: httpx.AsyncClient, report: LoadReport, operation: str, method: str, url: str, **kwargs):
+    token = _current_operation.set(operation)
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        report.record(operation, time.perf_counter() - started, False)
+        return None
+    finally:
+        _current_operation.reset(token)
+
+    report.record(operation, time.perf_counter() - started, response.is_success)
+    return response
+
+
+def random_fix(latitude: float, longitude: float, created_at: datetime.datetime, generator: random.Random):
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "accuracy": generator.uniform(3, 15),
+        "altitude": generator.uniform(990, 1010),
+        "altitude_accuracy": generator.uniform(3, 10),
+        "heading": generator.uniform(0, 360),
+        "speed": generator.uniform(2, 4),
+        "created_at": created_at.isoformat(),
+    }
+
+
+async def simulate_athlete(client: httpx.AsyncClient, report: LoadReport, locations: int, rate: float, batch_size: int, ramp_up: float, seed: int):
+    generator = random.Random(seed)
+    await asyncio.sleep(generator.uniform(0, ramp_up))
+
+    headers = {"user-id": str(uuid.uuid4())}
+    latitude, longitude = 3.4516 + generator.uniform(-0.05, 0.05), -76.5320 + generator.uniform(-0.05, 0.05)
+    started_at = datetime.datetime.now(datetime.UTC)
+    start_payload = {
+        "user_id": headers["user-id"],
+        "sport_id": str(uuid.uuid4()),
+        "started_at": started_at.isoformat(),
+        "initial_location": random_fix(latitude, longitude, started_at, generator),
+    }
+    response = await timed_request(client, report, "start", "POST", f"{SPORT_SESSIONS_BASE_URL}/", json=start_payload, headers=headers)
+    if response is None or not response.is_success:
+        return
+    sport_session_id = response.json()["session_id"]
+
+    for first_fix in range(1, locations + 1, batch_size):
+        fixes = []
+        for fix in range(first_fix, min(first_fix + batch_size, locations + 1)):
+            latitude, longitude = latitude + generator.gauss(0, 0.0001), longitude + generator.gauss(0, 0.0001)
+            fixes.append(random_fix(latitude, longitude, started_at + datetime.timedelta(seconds=fix / rate), generator))
+
+        if batch_size == 1:
+            await timed_request(client, report, "location", "PUT", f"{SPORT_SESSIONS_BASE_URL}/{sport_session_id}/location", json=fixes[0], headers=headers)
+        else:
+            await timed_request(client, report, "locations", "PUT", f"{SPORT_SESSIONS_BASE_URL}/{sport_session_id}/locations", json=fixes, headers=headers)
+        await asyncio.sleep(len(fixes) / rate)
+
+    finish_payload = {"duration": max(int(locations / rate), 1), "steps": locations * 2}
+    await timed_request(client, report, "finish", "PATCH", f"{SPORT_SESSIONS_BASE_URL}/{sport_session_id}", json=finish_payload, headers=headers)
+
+
+@contextlib.contextmanager
+def create_client(base_url: str | None, report: LoadReport):
+    if base_url:
+        yield httpx.AsyncClient(base_url=base_url, timeout=30)
+        return
+
+    # The app is only imported here, so the test mode is picked before the engine is created
+    os.environ.setdefault("DB_DRIVER", "test")
+    from sqlalchemy import event
+
+    from app.config.db import engine
+    from app.config.settings import Config
+    from main import app
+
+    # The SQLite test mode shares one connection, finish tasks running in threads would interleave with requests on it
+    finish_tasks = Config.ARCHIVE_TRACKS_ON_FINISH, Config.COMPUTE_SEGMENTS_ON_FINISH
+    Config.ARCHIVE_TRACKS_ON_FINISH = Config.COMPUTE_SEGMENTS_ON_FINISH = False
+    event.listen(engine, "before_cursor_execute", report.record_query)
+    try:
+        yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://sport-sessions")
+    finally:
+        event.remove(engine, "before_cursor_execute", report.record_query)
+        Config.ARCHIVE_TRACKS_ON_FINISH, Config.COMPUTE_SEGMENTS_ON_FINISH = finish_tasks
+
+
+async def run_load(athletes: int, locations: int, rate: float, batch_size: int = 1, ramp_up: float = 1.0, base_url: str | None = None, seed: int = 42):
+    report = LoadReport(count_queries=base_url is None)
+    with create_client(base_url, report) as client:
+        async with client:
+            started = time.perf_counter()
+            await asyncio.gather(*(simulate_athlete(client, report, locations, rate, batch_size, ramp_up, seed + athlete) for athlete in range(athletes)))
+            elapsed = time.perf_counter() - started
+
+    return report.summary(elapsed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--athletes", type=int, default=20)
+    parser.add_argument("--locations", type=int, default=30, help="locations streamed by each athlete")
+    parser.add_argument("--rate", type=float, default=2, help="locations per second per athlete")
+    parser.add_argument("--batch-size", type=int, default=1, help="locations per request, above 1 uses the batch endpoint")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which athletes start")
+    parser.add_argument("--base-url", default=None, help="target a running instance instead of the in process app")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows, elapsed = asyncio.run(run_load(args.athletes, args.locations, args.rate, args.batch_size, args.ramp_up, args.base_url, args.seed))
+
+    print(f"{args.athletes} athletes, {args.locations} locations each at {args.rate}/s in {elapsed:.1f} s")
+    print(f"  {'operation':<10}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'queries':>9}")
+    for row in rows:
+        queries = f"{row['queries_per_request']:9.1f}" if row["queries_per_request"] is not None else f"{'n/a':>9}"
+        print(
+            f"  {row['operation']:<10}{row['requests']:>9}{row['errors']:>8}{row['throughput']:>9.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}{queries}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import math
+
+
+def percentile(sorted_values, fraction: float):
+    # Nearest rank, so the value reported is one that was measured
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(math.ceil(fraction * len(sorted_values)) - 1, 0))]
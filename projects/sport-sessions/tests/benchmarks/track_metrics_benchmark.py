@@ -0,0 +1,62 @@
+"""
+Compares the scalar haversine loop against the NumPy track metrics engine.
+
+Run from projects/sport-sessions with: python -m tests.benchmarks.track_metrics_benchmark
+"""
+
+import argparse
+import datetime
+import os
+import timeit
+
+import numpy as np
+
+os.environ.setdefault("DB_DRIVER", "test")
+
+from app.services.track_metrics import compute_track_metrics, haversine_distances
+from app.services.utils import _haversine
+
+
+def scalar_total_distance(locations):
+    total_distance = 0
+    for i in range(1, len(locations)):
+        lat1, lon1 = locations[i - 1]
+        lat2, lon2 = locations[i]
+        total_distance += _haversine(lat1, lon1, lat2, lon2)
+    return total_distance
+
+
+def random_track(points: int, seed: int = 42):
+    generator = np.random.default_rng(seed)
+    latitudes = 3.4516 + np.cumsum(generator.normal(0, 0.0001, points))
+    longitudes = -76.5320 + np.cumsum(generator.normal(0, 0.0001, points))
+    started_at = datetime.datetime(2024, 1, 1, 6, 0, 0)
+    timestamps = [started_at + datetime.timedelta(seconds=2 * second) for second in range(points)]
+    altitudes = (1000 + np.cumsum(generator.normal(0, 0.5, points))).tolist()
+    speeds = np.abs(generator.normal(3, 1, points)).tolist()
+    return latitudes.tolist(), longitudes.tolist(), timestamps, altitudes, speeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    latitudes, longitudes, timestamps, altitudes, speeds = random_track(args.points)
+    locations = list(zip(latitudes, longitudes))
+
+    scalar = min(timeit.repeat(lambda: scalar_total_distance(locations), number=1, repeat=args.repeat))
+    vectorized = min(timeit.repeat(lambda: haversine_distances(latitudes, longitudes).sum(), number=1, repeat=args.repeat))
+    full_metrics = min(timeit.repeat(lambda: compute_track_metrics(latitudes, longitudes, timestamps, altitudes, speeds), number=1, repeat=args.repeat))
+
+    assert abs(scalar_total_distance(locations) - haversine_distances(latitudes, longitudes).sum()) < 1e-6
+
+    print(f"Track of {args.points} points, best of {args.repeat} runs")
+    print(f"  scalar haversine loop:   {scalar * 1000:8.2f} ms")
+    print(f"  numpy haversine:         {vectorized * 1000:8.2f} ms ({scalar / vectorized:.1f}x)")
+    print(f"  numpy full track metrics:{full_metrics * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,15 @@ from pytest import fixture
 from os import environ
 
 
+class LockingAlchemyMagicMock(UnifiedAlchemyMagicMock):
+    # Mutations lock the sport session row they read
+    unify = {**UnifiedAlchemyMagicMock.unify, "with_for_update": None}
+
+
 # For unit test let's use a mocked db
 @fixture(autouse=True)
 def mocked_db_session() -> UnifiedAlchemyMagicMock:
-    session = UnifiedAlchemyMagicMock()
+    session = LockingAlchemyMagicMock()
     return session
 
 
@@ -0,0 +1,19 @@
+from tests.benchmarks.load_generator import run_load
+from tests.benchmarks.stats import percentile
+
+
+class TestLoadGenerator:
+    async def test_run_load_should_report_every_operation(self):
+        rows, elapsed = await run_load(athletes=3, locations=4, rate=100, batch_size=2, ramp_up=0)
+        rows_by_operation = {row["operation"]: row for row in rows}
+
+        assert elapsed > 0
+        assert set(rows_by_operation) == {"start", "locations", "finish"}
+        assert rows_by_operation["locations"]["requests"] == 6
+        assert all(row["errors"] == 0 for row in rows)
+        assert all(row["queries_per_request"] > 0 for row in rows)
+
+    def test_percentile(self):
+        assert percentile([1, 2, 3, 4], 0.5) == 2
+        assert percentile([1, 2, 3, 4], 0.99) == 4
+        assert percentile([], 0.5) is None
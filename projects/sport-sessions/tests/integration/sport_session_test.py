@@ -1,14 +1,25 @@
+import json
 import datetime
 import uuid
 
-from pytest import fixture
+from unittest.mock import patch
+
+from pytest import fixture, raises, approx
+from sqlalchemy import event
 
 from main import app
-from app.models.model import SportSession, Location
-from app.config.db import session_local
+from app.models.model import SportSession, Location, ActiveSportSessionPosition, SportSessionStatistic, SportSessionRoute, SportSessionSensorChunk, SportSessionSegments
+from app.models.schemas.schema import SportSessionLocationCreate
+from app.services.location_buffer import LocationWriteBuffer
+from app.services.sport_sessions import SportSessionService
+from app.tasks.location_buffer import flush_location_buffer
+from app.tasks.retention import apply_location_retention
+from app.config.db import session_local, engine
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 
 SPORT_SESSIONS_BASE_URL = "/sport-session"
+LOCATION_DETAILS = ("accuracy", "altitude", "altitude_accuracy", "heading", "speed")
 
 
 class TestSportSessions:
@@ -28,7 +39,7 @@ class TestSportSessions:
             max_heartrate=100,
             avg_heartrate=100,
             is_active=True,
-            started_at=datetime.datetime.now(),
+            started_at=datetime.datetime(2024, 4, 10, 17, 0, 0),
         )
 
         finished_session = SportSession(
@@ -58,8 +69,13 @@ class TestSportSessions:
         yield
 
         session = session_local()
-        session.query(SportSession).delete()
+        session.query(ActiveSportSessionPosition).delete()
+        session.query(SportSessionStatistic).delete()
+        session.query(SportSessionRoute).delete()
+        session.query(SportSessionSegments).delete()
+        session.query(SportSessionSensorChunk).delete()
         session.query(Location).delete()
+        session.query(SportSession).delete()
         session.commit()
 
     def test_should_create_sport_session(self):
@@ -158,6 +174,171 @@ class TestSportSessions:
         assert res.status_code == 404
         assert "message" in json_response
 
+    def test_should_add_location_batch_to_sport_session(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        res = client.put(
+            f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/locations",
+            json=[
+                {"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"},
+                {"latitude": 0.001, "longitude": 0.001, "speed": 1.0, "created_at": "2024-04-10T17:55:45Z"},
+            ],
+        )
+        json_response = res.json()
+
+        session = session_local()
+        stored_locations = session.query(Location).filter(Location.session_id == self.active_session_id).all()
+
+        assert res.status_code == 200
+        assert json_response["locations_added"] == 2
+        assert json_response["last_location_at"] == "2024-04-10T17:55:45"
+        assert len(stored_locations) == 2
+
+    def test_add_location_batch_to_sport_session_should_fail_if_already_finished(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{self.finished_session_id}/locations", json=[{"latitude": 0.0, "longitude": 0.0}])
+
+        assert res.status_code == 423
+
+    def test_add_location_batch_to_sport_session_should_fail_if_empty(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/locations", json=[])
+
+        assert res.status_code == 422
+
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_FLUSH_SIZE", 2)
+    def test_should_stream_locations_to_sport_session(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+            websocket.send_json({"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"})
+            websocket.send_json([{"latitude": 0.001, "longitude": 0.001, "speed": 1.0, "created_at": "2024-04-10T17:55:45Z"}])
+            flushed_response = websocket.receive_json()
+
+            websocket.send_json({"latitude": "not-a-number"})
+            error_response = websocket.receive_json()
+
+            websocket.send_json({"latitude": 0.002, "longitude": 0.002, "speed": 1.0, "created_at": "2024-04-10T17:55:50Z"})
+
+        session = session_local()
+        stored_locations = session.query(Location).filter(Location.session_id == self.active_session_id).all()
+
+        assert flushed_response["status"] == "flushed"
+        assert flushed_response["locations_added"] == 2
+        assert error_response["status"] == "error"
+        assert len(stored_locations) == 3
+
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_FLUSH_SIZE", 1)
+    def test_stream_locations_should_answer_binary_frames_with_an_error(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+            websocket.send_bytes(b"\x00\x01")
+            error_response = websocket.receive_json()
+            websocket.send_json({"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"})
+            flushed_response = websocket.receive_json()
+
+        assert error_response["status"] == "error"
+        assert flushed_response["status"] == "flushed"
+
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_FLUSH_SIZE", 1)
+    def test_stream_locations_should_retry_failed_flushes(self, seed_sport_sessions):
+        client = TestClient(app)
+        add_location_batch = SportSessionService.add_location_batch_to_sport_session
+        calls = []
+
+        def fail_first_flush(service, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise Exception("Database error")
+            return add_location_batch(service, *args)
+
+        with patch("app.services.sport_sessions.SportSessionService.add_location_batch_to_sport_session", fail_first_flush):
+            with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+                websocket.send_json({"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"})
+                error_response = websocket.receive_json()
+                websocket.send_json({"latitude": 0.001, "longitude": 0.001, "speed": 1.0, "created_at": "2024-04-10T17:55:45Z"})
+                flushed_response = websocket.receive_json()
+
+        session = session_local()
+        assert (error_response["status"], error_response["locations_pending"]) == ("error", 1)
+        assert (flushed_response["status"], flushed_response["locations_added"]) == ("flushed", 2)
+        assert session.query(Location).filter(Location.session_id == self.active_session_id).count() == 2
+
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_FLUSH_SIZE", 1)
+    @patch("app.routes.sport_sessions.Config.MAX_LOCATIONS_PER_BATCH", 1)
+    def test_stream_locations_should_flush_restored_locations_in_batches(self, seed_sport_sessions):
+        client = TestClient(app)
+        add_location_batch = SportSessionService.add_location_batch_to_sport_session
+        batch_sizes = []
+
+        def fail_first_flush(service, sport_session_id, locations, user_id):
+            batch_sizes.append(len(locations))
+            if len(batch_sizes) == 1:
+                raise Exception("Database error")
+            return add_location_batch(service, sport_session_id, locations, user_id)
+
+        with patch("app.services.sport_sessions.SportSessionService.add_location_batch_to_sport_session", fail_first_flush):
+            with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+                websocket.send_json({"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"})
+                error_response = websocket.receive_json()
+                websocket.send_json({"latitude": 0.001, "longitude": 0.001, "speed": 1.0, "created_at": "2024-04-10T17:55:45Z"})
+                flushed_responses = [websocket.receive_json(), websocket.receive_json()]
+
+        assert error_response["status"] == "error"
+        assert [(response["status"], response["locations_added"]) for response in flushed_responses] == [("flushed", 1), ("flushed", 1)]
+        assert batch_sizes == [1, 1, 1]
+
+    @patch("app.routes.sport_sessions.Config.MAX_LOCATIONS_PER_BATCH", 2)
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_MAX_FRAME_SIZE", 200)
+    def test_stream_locations_should_reject_oversized_frames(self, seed_sport_sessions):
+        client = TestClient(app)
+        location = {"latitude": 0.0, "longitude": 0.0, "created_at": "2024-04-10T17:55:40Z"}
+
+        with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+            websocket.send_json([location] * 3)
+            too_many_response = websocket.receive_json()
+            websocket.send_text(json.dumps(location) + " " * 200)
+            too_large_response = websocket.receive_json()
+
+        assert (too_many_response["status"], too_large_response["status"]) == ("error", "error")
+
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_FLUSH_SIZE", 1)
+    @patch("app.routes.sport_sessions.Config.LOCATION_STREAM_MAX_PENDING", 1)
+    def test_stream_locations_should_close_when_too_many_locations_are_pending(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        with patch("app.services.sport_sessions.SportSessionService.add_location_batch_to_sport_session", side_effect=Exception("Database error")):
+            with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream") as websocket:
+                websocket.send_json({"latitude": 0.0, "longitude": 0.0, "speed": 1.0, "created_at": "2024-04-10T17:55:40Z"})
+                error_response = websocket.receive_json()
+                websocket.send_json({"latitude": 0.001, "longitude": 0.001, "speed": 1.0, "created_at": "2024-04-10T17:55:45Z"})
+                with raises(WebSocketDisconnect) as disconnect:
+                    websocket.receive_json()
+
+        assert error_response["locations_pending"] == 1
+        assert disconnect.value.code == 1013
+
+    def test_stream_locations_should_fail_if_not_the_owner(self, seed_sport_sessions):
+        client = TestClient(app)
+
+        with raises(WebSocketDisconnect) as disconnect:
+            with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{self.active_session_id}/location/stream", headers={"user-id": str(uuid.uuid4())}):
+                pass
+
+        assert disconnect.value.code == 4403
+
+    def test_stream_locations_should_fail_if_not_found(self):
+        client = TestClient(app)
+
+        with raises(WebSocketDisconnect) as disconnect:
+            with client.websocket_connect(f"{SPORT_SESSIONS_BASE_URL}/{uuid.uuid4()}/location/stream"):
+                pass
+
+        assert disconnect.value.code == 4404
+
     def test_should_finish_sport_session(self, seed_sport_sessions):
         client = TestClient(app)
 
@@ -181,6 +362,49 @@ class TestSportSessions:
         assert "max_heartrate" in json_response
         assert "avg_heartrate" in json_response
 
+    def test_should_finish_sport_session_with_track_aggregates(self):
+        client = TestClient(app)
+
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={
+                "user_id": str(uuid.uuid4()),
+                "sport_id": str(uuid.uuid4()),
+                "started_at": "2024-04-10T17:55:40Z",
+                "initial_location": {"latitude": 0.0, "longitude": 0.0, "speed": 2.0},
+            },
+        )
+        session_id = start_res.json()["session_id"]
+
+        client.put(
+            f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations",
+            json=[
+                {"latitude": 0.0, "longitude": 0.01, "speed": 4.0, "created_at": "2024-04-10T17:56:40Z"},
+                {"latitude": 0.01, "longitude": 0.01, "speed": 6.0, "created_at": "2024-04-10T17:57:40Z"},
+            ],
+        )
+
+        res = client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 120, "steps": 100})
+        json_response = res.json()
+
+        session = session_local()
+        sport_session = session.query(SportSession).filter(SportSession.session_id == uuid.UUID(session_id)).first()
+
+        assert res.status_code == 200
+        assert json_response["distance"] == approx(2.2239, abs=0.001)
+        assert json_response["average_speed"] == 4.0
+        assert sport_session.location_count == 3
+        assert (sport_session.min_latitude, sport_session.max_latitude, sport_session.min_longitude, sport_session.max_longitude) == (0.0, 0.01, 0.0, 0.01)
+
+        track_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/track")
+        remaining_locations = session.query(Location).filter(Location.session_id == uuid.UUID(session_id)).count()
+
+        assert sport_session.track_archived_at is not None
+        assert remaining_locations == 0
+        assert track_res.status_code == 200
+        assert [location["latitude"] for location in track_res.json()["locations"]] == [0.0, 0.0, 0.01]
+        assert track_res.json()["locations"][-1]["created_at"] == "2024-04-10T17:57:40"
+
     def test_finish_sport_session_should_fail_if_not_the_owner(self, seed_sport_sessions):
         client = TestClient(app)
 
@@ -464,15 +688,518 @@ class TestSportSessions:
         session.add(location_2_session_2)
         session.commit()
 
+        # Locations were written straight to the table, so the position index is rebuilt from them
+        SportSessionService(session).rebuild_active_sport_session_positions()
+
         res = client.get(f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions", headers={"x-api-key": "secret"})
         json_response = res.json()
+        positions_by_user = {position["user_id"]: position for position in json_response}
 
-        print(json_response)
         assert res.status_code == 200
         assert len(json_response) == 2
-        assert json_response[0]["user_id"] == str(session_1.user_id)
-        assert json_response[0]["latitude"] == location_2_session_1.latitude
-        assert json_response[0]["longitude"] == location_2_session_1.longitude
-        assert json_response[1]["user_id"] == str(session_2.user_id)
-        assert json_response[1]["latitude"] == location_1_session_2.latitude
-        assert json_response[1]["longitude"] == location_1_session_2.longitude
+        assert positions_by_user[str(session_1.user_id)]["latitude"] == location_2_session_1.latitude
+        assert positions_by_user[str(session_1.user_id)]["longitude"] == location_2_session_1.longitude
+        assert positions_by_user[str(session_2.user_id)]["latitude"] == location_1_session_2.latitude
+        assert positions_by_user[str(session_2.user_id)]["longitude"] == location_1_session_2.longitude
+
+    def test_active_sport_sessions_should_follow_location_writes(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = start_res.json()["session_id"]
+
+        client.put(
+            f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations",
+            json=[{"latitude": 2.0, "longitude": 2.0, "created_at": "2024-04-10T17:56:40Z"}, {"latitude": 3.0, "longitude": 3.0, "created_at": "2024-04-10T17:57:40Z"}],
+        )
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[{"latitude": 9.0, "longitude": 9.0, "created_at": "2024-04-10T17:56:50Z"}])
+        active_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions", headers={"x-api-key": "secret"})
+
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 120, "steps": 100})
+        finished_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions", headers={"x-api-key": "secret"})
+
+        assert [position for position in active_res.json() if position["user_id"] == user_id] == [{"user_id": user_id, "latitude": 3.0, "longitude": 3.0}]
+        assert [position for position in finished_res.json() if position["user_id"] == user_id] == []
+
+    def test_add_locations_should_reject_timestamps_out_of_the_session(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = start_res.json()["session_id"]
+
+        future_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[{"latitude": 0.001, "longitude": 0.0, "created_at": "2099-01-01T00:00:00Z"}])
+        early_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[{"latitude": 0.001, "longitude": 0.0, "created_at": "2024-04-10T17:55:00Z"}])
+        for second in range(3):
+            client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[{"latitude": 2.0 + second, "longitude": 2.0, "created_at": f"2024-04-10T17:56:0{second}Z"}])
+        active_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions", headers={"x-api-key": "secret"})
+
+        assert (future_res.status_code, early_res.status_code) == (422, 422)
+        assert [position for position in active_res.json() if position["user_id"] == user_id] == [{"user_id": user_id, "latitude": 4.0, "longitude": 2.0}]
+
+    def test_add_locations_should_be_idempotent_and_order_independent(self):
+        client = TestClient(app)
+        start_json = {"user_id": str(uuid.uuid4()), "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}}
+        fixes = [
+            {"latitude": 1.0 + index / 1000, "longitude": 1.0 + (index % 2) / 1000, "created_at": f"2024-04-10T17:56:{index:02d}Z", **dict.fromkeys(LOCATION_DETAILS, 0.0)}
+            for index in range(1, 7)
+        ]
+        in_order_id = client.post(f"{SPORT_SESSIONS_BASE_URL}/", json=start_json).json()["session_id"]
+        shuffled_id = client.post(f"{SPORT_SESSIONS_BASE_URL}/", json=start_json).json()["session_id"]
+
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{in_order_id}/locations", json=fixes)
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{shuffled_id}/locations", json=fixes[3:])
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{shuffled_id}/locations", json=fixes[:1])
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{shuffled_id}/location", json=fixes[2])
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{shuffled_id}/location", json=fixes[1])
+        retry_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{shuffled_id}/locations", json=fixes)
+
+        session = session_local()
+        in_order, shuffled = (session.query(SportSession).filter(SportSession.session_id == uuid.UUID(session_id)).first() for session_id in (in_order_id, shuffled_id))
+        assert retry_res.json()["locations_added"] == 0
+        assert retry_res.json()["duplicates_ignored"] == 6
+        assert session.query(Location).filter(Location.session_id == shuffled.session_id).count() == 7
+        assert shuffled.location_count == in_order.location_count == 7
+        assert shuffled.tracked_distance == approx(in_order.tracked_distance)
+        assert (shuffled.last_latitude, shuffled.last_location_at) == (in_order.last_latitude, in_order.last_location_at)
+
+    def test_finish_should_store_segments(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T18:00:00Z", "initial_location": {"latitude": 0.0, "longitude": 0.0, "speed": 3.7}},
+        )
+        session_id = start_res.json()["session_id"]
+        moving = [{"latitude": 0.0, "longitude": index * 0.001, "speed": 3.7, "created_at": f"2024-04-10T18:{index // 2:02d}:{index % 2 * 30:02d}Z"} for index in range(1, 6)]
+        stopped = [{"latitude": 0.0, "longitude": 0.005, "speed": 0.0, "created_at": f"2024-04-10T18:0{minute}:00Z"} for minute in (3, 4)]
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=moving + stopped)
+
+        finish_res = client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 240, "steps": 100}, headers={"user-id": user_id})
+        stored_segments = session_local().query(SportSessionSegments).filter(SportSessionSegments.session_id == uuid.UUID(session_id)).first()
+        segments_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/segments", headers={"user-id": user_id})
+        other_user_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/segments", headers={"user-id": str(uuid.uuid4())})
+
+        assert finish_res.json()["average_speed"] == approx(3.7)
+        assert stored_segments is not None
+        assert segments_res.status_code == 200
+        assert segments_res.json()["pauses"] == [{"started_at": "2024-04-10T18:02:30", "ended_at": "2024-04-10T18:04:00", "duration": 90.0}]
+        assert (segments_res.json()["moving_time"], segments_res.json()["paused_time"]) == (150.0, 90.0)
+        assert other_user_res.status_code == 403
+
+    def test_location_retention_should_archive_expired_tracks(self):
+        session = session_local()
+        started_at = datetime.datetime.now() - datetime.timedelta(days=40)
+        expired, recent = (
+            SportSession(session_id=uuid.uuid4(), user_id=uuid.uuid4(), sport_id=uuid.uuid4(), is_active=False, duration=60, started_at=session_started_at)
+            for session_started_at in (started_at, datetime.datetime.now())
+        )
+        session.add_all([expired, recent])
+        session.add_all(
+            Location(session_id=sport_session.session_id, latitude=1.0, longitude=1.0 + second / 1000, created_at=sport_session.started_at + datetime.timedelta(seconds=second))
+            for sport_session in (expired, recent)
+            for second in range(3)
+        )
+        session.commit()
+
+        archived, dropped = apply_location_retention(retention_days=30, batch_size=1)
+
+        session.expire_all()
+        assert archived >= 1
+        assert dropped == []
+        assert session.query(Location).filter(Location.session_id == expired.session_id).count() == 0
+        assert session.query(Location).filter(Location.session_id == recent.session_id).count() == 3
+        assert session.query(SportSession).filter(SportSession.session_id == expired.session_id).first().track_archived_at is not None
+
+        client = TestClient(app)
+        track_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{expired.session_id}/track")
+        assert len(track_res.json()["locations"]) == 3
+
+    def test_buffered_locations_should_be_flushed_once(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = uuid.UUID(start_res.json()["session_id"])
+        location_buffer = LocationWriteBuffer(":memory:")
+        locations = [SportSessionLocationCreate(latitude=1.0 + second / 1000, longitude=1.0, created_at=datetime.datetime(2024, 4, 10, 17, 56, second)) for second in range(3)]
+
+        location_buffer.append(session_id, locations, user_id)
+        location_buffer.append(session_id, locations[1:], user_id)
+        location_buffer.append(uuid.uuid4(), locations[:1], user_id)
+        flushed = flush_location_buffer(location_buffer)
+
+        session = session_local()
+        assert flushed == 4
+        assert location_buffer.count_pending() == 0
+        assert session.query(Location).filter(Location.session_id == session_id).count() == 4
+        assert session.query(SportSession).filter(SportSession.session_id == session_id).first().location_count == 4
+
+    def test_buffered_locations_without_client_timestamp_should_all_be_flushed(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = uuid.UUID(start_res.json()["session_id"])
+        location_buffer = LocationWriteBuffer(":memory:")
+
+        location_buffer.append(session_id, [SportSessionLocationCreate(latitude=1.0 + second / 1000, longitude=1.0) for second in range(3)], user_id)
+        flushed = flush_location_buffer(location_buffer)
+
+        session = session_local()
+        assert flushed == 3
+        assert session.query(Location).filter(Location.session_id == session_id).count() == 4
+        assert session.query(SportSession).filter(SportSession.session_id == session_id).first().location_count == 4
+
+    def test_buffered_locations_should_be_refused_for_finished_sessions(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = start_res.json()["session_id"]
+        location = {"latitude": 1.0, "longitude": 1.0}
+
+        with patch("app.routes.sport_sessions.location_write_buffer", LocationWriteBuffer(":memory:")) as location_buffer:
+            not_owner_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/location", json=location, headers={"user-id": str(uuid.uuid4())})
+            not_found_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{uuid.uuid4()}/location", json=location)
+            client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 60, "steps": 100}, headers={"user-id": user_id})
+            finished_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[location], headers={"user-id": user_id})
+
+            assert (not_owner_res.status_code, not_found_res.status_code, finished_res.status_code) == (403, 404, 423)
+            assert location_buffer.count_pending() == 0
+
+    def test_finish_should_write_acknowledged_buffered_locations(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = start_res.json()["session_id"]
+
+        with patch("app.routes.sport_sessions.location_write_buffer", LocationWriteBuffer(":memory:")) as location_buffer:
+            buffered_res = [
+                client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/location", json={"latitude": 1.0 + second / 1000, "longitude": 1.0}, headers={"user-id": user_id})
+                for second in range(3)
+            ]
+            finish_res = client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 60, "steps": 100}, headers={"user-id": user_id})
+
+            assert [res.status_code for res in buffered_res] == [202, 202, 202]
+            assert finish_res.status_code == 200
+            assert location_buffer.count_pending() == 0
+
+        track_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/track")
+        assert len(track_res.json()["locations"]) == 4
+
+    def test_flush_should_keep_locations_acknowledged_until_the_finish_was_seen(self):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 1.0, "longitude": 1.0}},
+        )
+        session_id = uuid.UUID(start_res.json()["session_id"])
+        # Another worker finishes the session while this one still has it cached as active
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 60, "steps": 100}, headers={"user-id": user_id})
+        location_buffer = LocationWriteBuffer(":memory:")
+
+        location_buffer.append(session_id, [SportSessionLocationCreate(latitude=1.001, longitude=1.0)], user_id)
+        flushed = flush_location_buffer(location_buffer)
+        with patch("app.services.sport_sessions.Config.SESSION_STATE_CACHE_SECONDS", -1):
+            location_buffer.append(session_id, [SportSessionLocationCreate(latitude=1.002, longitude=1.0)], user_id)
+            dropped = flush_location_buffer(location_buffer)
+
+        session = session_local()
+        track_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/track")
+        assert (flushed, dropped) == (1, 1)
+        assert [location["latitude"] for location in track_res.json()["locations"]] == [1.0, 1.001]
+        assert session.query(ActiveSportSessionPosition).filter(ActiveSportSessionPosition.session_id == session_id).count() == 0
+
+    def test_search_active_sport_sessions_by_area(self):
+        client = TestClient(app)
+        user_ids = [str(uuid.uuid4()) for _ in range(3)]
+
+        for user_id, (latitude, longitude) in zip(user_ids, [(4.61, -74.08), (4.69, -74.04), (6.24, -75.58)]):
+            client.post(
+                f"{SPORT_SESSIONS_BASE_URL}/",
+                json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": latitude, "longitude": longitude}},
+            )
+
+        bbox_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions/search",
+            json={"bbox": {"min_latitude": 4.5, "min_longitude": -74.2, "max_latitude": 4.8, "max_longitude": -74.0}},
+            headers={"x-api-key": "secret"},
+        )
+        polygon_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions/search",
+            json={
+                "polygon": [
+                    {"latitude": 4.5, "longitude": -74.2},
+                    {"latitude": 4.65, "longitude": -74.2},
+                    {"latitude": 4.65, "longitude": -74.0},
+                    {"latitude": 4.5, "longitude": -74.0},
+                ]
+            },
+            headers={"x-api-key": "secret"},
+        )
+        invalid_res = client.post(f"{SPORT_SESSIONS_BASE_URL}/active-sport-sessions/search", json={}, headers={"x-api-key": "secret"})
+
+        assert sorted(position["user_id"] for position in bbox_res.json() if position["user_id"] in user_ids) == sorted(user_ids[:2])
+        assert [position["user_id"] for position in polygon_res.json() if position["user_id"] in user_ids] == [user_ids[0]]
+        assert invalid_res.status_code == 422
+
+    def test_get_sport_sessions_should_paginate_with_cursor_and_filters(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = uuid.uuid4()
+        running_id = uuid.uuid4()
+        session = session_local()
+        sessions = [
+            SportSession(
+                session_id=uuid.uuid4(),
+                user_id=user_id,
+                sport_id=running_id if day % 2 else uuid.uuid4(),
+                is_active=day == 5,
+                duration=60 * day,
+                started_at=datetime.datetime(2024, 4, day, 8, 0, 0),
+            )
+            for day in range(1, 6)
+        ]
+        session.add_all(sessions)
+        session.commit()
+
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            res = client.get(f"{SPORT_SESSIONS_BASE_URL}/", params=params, headers={"user-id": str(user_id)})
+            pages.append(res.json())
+            cursor = res.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+        filtered_res = client.get(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            params={"sport_id": str(running_id), "is_active": "false", "started_from": "2024-04-01T00:00:00Z", "view": "summary"},
+            headers={"user-id": str(user_id)},
+        )
+        invalid_cursor_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/", params={"cursor": "invalid"}, headers={"user-id": str(user_id)})
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert [sport_session["started_at"][:10] for page in pages for sport_session in page] == [f"2024-04-0{day}" for day in range(5, 0, -1)]
+        assert [sport_session["started_at"][:10] for sport_session in filtered_res.json()] == ["2024-04-03", "2024-04-01"]
+        assert set(filtered_res.json()[0]) == {"session_id", "sport_id", "started_at", "duration", "distance", "calories", "is_active"}
+        assert invalid_cursor_res.status_code == 400
+
+    def test_finish_sport_session_should_roll_up_statistics(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        sport_id = str(uuid.uuid4())
+
+        for started_at, duration, avg_heartrate in (("2024-04-08T07:00:00Z", 1800, 140), ("2024-04-11T07:00:00Z", 3600, 150), ("2024-04-15T07:00:00Z", 600, None)):
+            start_res = client.post(
+                f"{SPORT_SESSIONS_BASE_URL}/",
+                json={"user_id": user_id, "sport_id": sport_id, "started_at": started_at, "initial_location": {"latitude": 0.0, "longitude": 0.0}},
+            )
+            client.patch(
+                f"{SPORT_SESSIONS_BASE_URL}/{start_res.json()['session_id']}",
+                json={"duration": duration, "steps": 1000, "distance": 5, "calories": 100, **({"avg_heartrate": avg_heartrate} if avg_heartrate else {})},
+            )
+
+        weekly_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/statistics", params={"period": "week"}, headers={"user-id": user_id})
+        monthly_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/statistics", params={"period": "month", "sport_id": sport_id}, headers={"user-id": user_id})
+
+        weekly_statistics = {statistic["period_start"]: statistic for statistic in weekly_res.json()}
+        assert weekly_res.status_code == 200
+        assert weekly_statistics["2024-04-08"]["session_count"] == 2
+        assert weekly_statistics["2024-04-08"]["total_duration"] == 5400
+        assert weekly_statistics["2024-04-08"]["average_heartrate"] == 145
+        assert weekly_statistics["2024-04-15"]["average_heartrate"] is None
+        assert monthly_res.json() == [
+            {
+                "sport_id": sport_id,
+                "period": "month",
+                "period_start": "2024-04-01",
+                "session_count": 3,
+                "total_distance": 15.0,
+                "total_duration": 6000,
+                "total_calories": 300.0,
+                "total_steps": 3000,
+                "average_distance": 5.0,
+                "average_duration": 2000.0,
+                "average_calories": 100.0,
+                "average_steps": 1000.0,
+                "average_heartrate": 145.0,
+            }
+        ]
+
+    def test_get_sport_session_route_should_simplify_and_cache_finished_tracks(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 0.0, "longitude": 0.0}},
+        )
+        session_id = start_res.json()["session_id"]
+        # Straight north for 100 fixes, then straight east for 100 fixes
+        locations = [{"latitude": 0.0001 * step, "longitude": 0.0, "created_at": f"2024-04-10T17:{56 + step // 60:02d}:{step % 60:02d}Z"} for step in range(1, 101)]
+        locations += [{"latitude": 0.01, "longitude": 0.0001 * step, "created_at": f"2024-04-10T17:{58 + step // 60:02d}:{step % 60:02d}Z"} for step in range(1, 101)]
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=locations)
+
+        active_route_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/route", params={"tolerance": 2}, headers={"user-id": user_id})
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 300, "steps": 100})
+        finished_route_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/route", params={"tolerance": 2}, headers={"user-id": user_id})
+        cached_route_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/route", params={"tolerance": 2}, headers={"user-id": user_id})
+        not_owner_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/route", headers={"user-id": str(uuid.uuid4())})
+
+        session = session_local()
+        cached_routes = session.query(SportSessionRoute).filter(SportSessionRoute.session_id == uuid.UUID(session_id), SportSessionRoute.tolerance == 2).count()
+        session.close()
+
+        assert active_route_res.status_code == 200
+        assert active_route_res.json()["original_point_count"] == 201
+        assert [(point["latitude"], point["longitude"]) for point in active_route_res.json()["points"]] == [(0.0, 0.0), (0.01, 0.0), (0.01, 0.01)]
+        assert finished_route_res.json()["points"] == active_route_res.json()["points"]
+        assert cached_route_res.json() == finished_route_res.json()
+        assert cached_routes == 1
+        assert not_owner_res.status_code == 403
+
+    def test_get_sport_session_route_should_reuse_one_row_for_near_identical_parameters(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 0.0, "longitude": 0.0}},
+        )
+        session_id = start_res.json()["session_id"]
+        locations = [{"latitude": 0.0001 * step, "longitude": 0.0001 * (step % 2), "created_at": f"2024-04-10T17:56:{step:02d}Z"} for step in range(1, 50)]
+        client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=locations)
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 300, "steps": 100})
+
+        route_responses = [
+            client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/route", params={"tolerance": tolerance, "max_points": max_points}, headers={"user-id": user_id})
+            for tolerance, max_points in [(2.1, 510), (1.9, 520), (2.0000001, 549)]
+        ]
+
+        session = session_local()
+        cached_routes = session.query(SportSessionRoute).filter(SportSessionRoute.session_id == uuid.UUID(session_id)).all()
+        session.close()
+
+        assert [(response.json()["tolerance"], response.json()["max_points"]) for response in route_responses] == [(2.0, 500)] * 3
+        assert [(cached_route.tolerance, cached_route.max_points) for cached_route in cached_routes] == [(2.0, 500)]
+
+    def test_export_sport_sessions_should_stream_sessions_and_tracks(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+
+        session_ids = []
+        for started_at in ("2024-04-10T17:55:40Z", "2024-04-11T17:55:40Z"):
+            start_res = client.post(
+                f"{SPORT_SESSIONS_BASE_URL}/",
+                json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": started_at, "initial_location": {"latitude": 1.0, "longitude": 2.0, "altitude": 3.0}},
+            )
+            session_ids.append(start_res.json()["session_id"])
+            client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_ids[-1]}/locations", json=[{"latitude": 1.5, "longitude": 2.5, "created_at": started_at.replace("55:40", "56:40")}])
+        # The first session is finished and archived, so its fixes come from the archive blob
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_ids[0]}", json={"duration": 60, "steps": 100})
+
+        ndjson_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/export", params={"format": "ndjson"}, headers={"user-id": user_id})
+        csv_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/export", params={"format": "csv"}, headers={"user-id": user_id})
+        gpx_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/export", params={"format": "gpx"}, headers={"user-id": user_id})
+        missing_user_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/export")
+
+        documents = [json.loads(line) for line in ndjson_res.text.splitlines()]
+        assert ndjson_res.status_code == 200
+        assert ndjson_res.headers["content-type"] == "application/x-ndjson"
+        assert [document["type"] for document in documents] == ["session", "location", "location", "session", "location", "location"]
+        assert [document["session_id"] for document in documents if document["type"] == "session"] == session_ids
+        assert documents[0]["is_active"] is False
+        assert len(csv_res.text.strip().splitlines()) == 5
+        assert csv_res.headers["content-type"].startswith("text/csv")
+        assert gpx_res.text.count("<trkpt") == 4
+        assert missing_user_res.status_code == 422
+
+    def test_session_writes_should_read_the_session_once(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 0.0, "longitude": 0.0}},
+        )
+        session_id = start_res.json()["session_id"]
+        location = {"latitude": 1.0, "longitude": 1.0, "accuracy": 1.0, "altitude": 1.0, "altitude_accuracy": 1.0, "heading": 1.0, "speed": 1.0}
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0])
+
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            writes = {
+                "location": lambda: client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/location", json=location, headers={"user-id": user_id}),
+                "locations": lambda: client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/locations", json=[location, location], headers={"user-id": user_id}),
+                "finish": lambda: client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 60, "steps": 100}, headers={"user-id": user_id}),
+            }
+            selects = {}
+            with patch("app.routes.sport_sessions.Config.ARCHIVE_TRACKS_ON_FINISH", False), patch("app.routes.sport_sessions.Config.COMPUTE_SEGMENTS_ON_FINISH", False):
+                for write, request in writes.items():
+                    statements.clear()
+                    assert request().status_code == 200
+                    selects[write] = statements.count("SELECT")
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        # Before the fast path these took 4, 3 and 3 SELECTs respectively
+        assert selects == {"location": 1, "locations": 1, "finish": 1}
+
+    def test_sensor_samples_should_be_aggregated_while_recording(self, seed_sport_sessions):
+        client = TestClient(app)
+        user_id = str(uuid.uuid4())
+        start_res = client.post(
+            f"{SPORT_SESSIONS_BASE_URL}/",
+            json={"user_id": user_id, "sport_id": str(uuid.uuid4()), "started_at": "2024-04-10T17:55:40Z", "initial_location": {"latitude": 0.0, "longitude": 0.0}},
+        )
+        session_id = start_res.json()["session_id"]
+
+        first_batch = [{"heartrate": 100 + second, "power": 200, "created_at": f"2024-04-10T17:56:{second:02d}Z"} for second in range(0, 30)]
+        second_batch = [{"heartrate": 160, "cadence": 88, "created_at": f"2024-04-10T17:56:{second:02d}Z"} for second in range(30, 60)]
+        first_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/sensors", json=first_batch, headers={"user-id": user_id})
+        second_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/sensors", json=second_batch, headers={"user-id": user_id})
+        not_owner_res = client.put(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/sensors", json=second_batch, headers={"user-id": str(uuid.uuid4())})
+        samples_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/sensors", headers={"user-id": user_id})
+        client.patch(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", json={"duration": 60, "steps": 100})
+        summary_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}/sensors/summary", headers={"user-id": user_id})
+        session_res = client.get(f"{SPORT_SESSIONS_BASE_URL}/{session_id}", headers={"user-id": user_id})
+
+        session = session_local()
+        chunks = session.query(SportSessionSensorChunk).filter(SportSessionSensorChunk.session_id == uuid.UUID(session_id)).count()
+        session.close()
+
+        summary = summary_res.json()
+        assert first_res.status_code == 200
+        assert first_res.json()["samples_added"] == 30
+        assert second_res.json()["sample_count"] == 60
+        assert not_owner_res.status_code == 403
+        assert chunks == 2
+        assert len(samples_res.json()["samples"]) == 60
+        assert summary["min_heartrate"] == 100
+        assert summary["max_heartrate"] == 160
+        assert summary["avg_power"] == 200
+        assert summary["avg_cadence"] == 88
+        assert sum(zone["seconds"] for zone in summary["heartrate_zones"]) == 59
+        assert session_res.json()["max_heartrate"] == 160
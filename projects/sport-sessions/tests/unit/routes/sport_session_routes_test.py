@@ -3,18 +3,36 @@ import uuid
 from unittest.mock import patch, MagicMock
 
 import faker
+import pytest
+from fastapi import BackgroundTasks
 from sqlalchemy.orm import Session
 
 from app.routes.sport_sessions import (
     start_sport_session,
     add_locations_to_sport_session,
+    add_location_batch_to_sport_session,
     finish_sport_session,
     get_sport_session,
     get_all_sport_sessions,
     get_active_sport_sessions,
+    get_sport_session_metrics,
+    get_sport_session_track,
+    get_sport_session_statistics,
+    get_sport_session_route,
+    export_sport_sessions,
+    add_sensor_samples_to_sport_session,
+    get_sport_session_sensor_samples,
+    get_sport_session_sensor_summary,
+    get_live_sport_session,
+    search_active_sport_sessions,
+    get_sport_session_segments,
 )
 
-from app.models.schemas.schema import SportSessionStart
+from app.config.settings import Config
+from app.exceptions.exceptions import NotOwnerError, NotActiveError
+from app.models.schemas.schema import SportSessionStart, ActiveSportSessionArea, BoundingBox, SportSessionLocationCreate
+from app.services.live_feed import live_session_feed
+from app.services.location_buffer import LocationWriteBuffer
 
 fake = faker.Faker()
 
@@ -41,27 +59,49 @@ class TestSportRoutes:
         assert json.loads(response.body) == {}
         assert response.status_code == 200
 
-    @patch("app.services.sport_sessions.SportSessionService.add_location_to_sport_session", return_value={})
-    @patch("app.services.sport_sessions.SportSessionService.get_sport_session")
-    async def test_add_locations_to_sport_session_should_fail_when_no_owner(self, mocked_db_session: Session, mocked_get_sport_session: MagicMock):
-        mocked_get_sport_session.return_value = {"user_id": uuid.uuid4()}
-        response = await add_locations_to_sport_session(sport_session_id=uuid.uuid4(), location={}, user_id=uuid.uuid4(), db=mocked_db_session)
-        assert "error" in json.loads(response.body)
-        assert response.status_code == 403
+    @patch("app.services.sport_sessions.SportSessionService.add_location_to_sport_session", side_effect=NotOwnerError("not owner"))
+    async def test_add_locations_to_sport_session_should_fail_when_no_owner(self, mocked_add_location_to_sport_session: MagicMock):
+        user_id = uuid.uuid4()
+        with pytest.raises(NotOwnerError):
+            await add_locations_to_sport_session(sport_session_id=uuid.uuid4(), location={}, user_id=user_id, db=MagicMock(spec=Session))
+        assert mocked_add_location_to_sport_session.call_args.args[2] == user_id
+
+    @patch("app.services.sport_sessions.SportSessionService.add_location_batch_to_sport_session", return_value={})
+    async def test_add_location_batch_to_sport_session(self, mocked_db_session: Session):
+        response = await add_location_batch_to_sport_session(sport_session_id=uuid.uuid4(), locations=[], db=mocked_db_session)
+        assert json.loads(response.body) == {}
+        assert response.status_code == 200
+
+    @patch("app.services.sport_sessions.SportSessionService.add_location_batch_to_sport_session", side_effect=NotOwnerError("not owner"))
+    async def test_add_location_batch_to_sport_session_should_fail_when_no_owner(self, mocked_add_location_batch_to_sport_session: MagicMock):
+        user_id = uuid.uuid4()
+        with pytest.raises(NotOwnerError):
+            await add_location_batch_to_sport_session(sport_session_id=uuid.uuid4(), locations=[], user_id=user_id, db=MagicMock(spec=Session))
+        assert mocked_add_location_batch_to_sport_session.call_args.args[2] == user_id
 
     @patch("app.services.sport_sessions.SportSessionService.finish_sport_session", return_value={})
     async def test_finish_sport_session(self, mocked_db_session: Session):
-        response = await finish_sport_session(sport_session_id=uuid.uuid4(), sport_session_input={}, db=mocked_db_session)
+        background_tasks = BackgroundTasks()
+        response = await finish_sport_session(sport_session_id=uuid.uuid4(), sport_session_input={}, background_tasks=background_tasks, db=mocked_db_session)
         assert json.loads(response.body) == {}
         assert response.status_code == 200
+        assert [task.func.__name__ for task in background_tasks.tasks] == ["compute_sport_session_segments", "archive_sport_session_track"]
 
+    @patch("app.routes.sport_sessions.Config.ARCHIVE_TRACKS_ON_FINISH", False)
+    @patch("app.routes.sport_sessions.Config.COMPUTE_SEGMENTS_ON_FINISH", False)
     @patch("app.services.sport_sessions.SportSessionService.finish_sport_session", return_value={})
-    @patch("app.services.sport_sessions.SportSessionService.get_sport_session")
-    async def test_finish_sport_session_should_fail_when_no_owner(self, mocked_db_session: Session, mocked_get_sport_session: MagicMock):
-        mocked_get_sport_session.return_value = {"user_id": uuid.uuid4()}
-        response = await finish_sport_session(sport_session_id=uuid.uuid4(), sport_session_input={}, user_id=uuid.uuid4(), db=mocked_db_session)
-        assert "error" in json.loads(response.body)
-        assert response.status_code == 403
+    async def test_finish_sport_session_should_not_archive_when_disabled(self, mocked_db_session: Session):
+        background_tasks = BackgroundTasks()
+        response = await finish_sport_session(sport_session_id=uuid.uuid4(), sport_session_input={}, background_tasks=background_tasks, db=mocked_db_session)
+        assert response.status_code == 200
+        assert len(background_tasks.tasks) == 0
+
+    @patch("app.services.sport_sessions.SportSessionService.finish_sport_session", side_effect=NotOwnerError("not owner"))
+    async def test_finish_sport_session_should_fail_when_no_owner(self, mocked_finish_sport_session: MagicMock):
+        background_tasks = BackgroundTasks()
+        with pytest.raises(NotOwnerError):
+            await finish_sport_session(sport_session_id=uuid.uuid4(), sport_session_input={}, background_tasks=background_tasks, user_id=uuid.uuid4(), db=MagicMock(spec=Session))
+        assert len(background_tasks.tasks) == 0
 
     @patch("app.services.sport_sessions.SportSessionService.get_sport_session", return_value={})
     async def test_get_sport_session(self, mocked_db_session: Session):
@@ -75,16 +115,51 @@ class TestSportRoutes:
         assert "error" in json.loads(response.body)
         assert response.status_code == 403
 
-    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions")
-    async def test_get_sport_sessions(self, mocked_get_sport_sessions):
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions_page")
+    async def test_get_sport_sessions(self, mocked_get_sport_sessions_page):
         mocked_db_session = MagicMock(spec=Session)
         data = [{"id": "1", "user_id": "1234", "locations": []}, {"id": "2", "user_id": "1234", "locations": []}]
-        mocked_get_sport_sessions.return_value = data
+        mocked_get_sport_sessions_page.return_value = (data, None)
         response = await get_all_sport_sessions(user_id=uuid.uuid4(), db=mocked_db_session)
         json_response = json.loads(response.body)
 
         assert response.status_code == 200
         assert len(json_response) == 2
+        assert "x-next-cursor" not in response.headers
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions_page", return_value=([{"id": "1"}], "next-cursor"))
+    async def test_get_sport_sessions_should_expose_next_cursor(self, mocked_get_sport_sessions_page):
+        response = await get_all_sport_sessions(user_id=uuid.uuid4(), limit=1, view="summary", db=MagicMock(spec=Session))
+
+        assert response.status_code == 200
+        assert response.headers["x-next-cursor"] == "next-cursor"
+        assert mocked_get_sport_sessions_page.call_args.kwargs["summary"] is True
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_state", return_value={"user_id": "1234", "is_active": True, "started_at": None})
+    @patch("app.services.sport_sessions.SportSessionService.add_location_to_sport_session")
+    async def test_add_location_should_be_acknowledged_once_buffered(self, mocked_add_location_to_sport_session, mocked_get_sport_session_state):
+        sport_session_id = uuid.uuid4()
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0)
+
+        with patch("app.routes.sport_sessions.location_write_buffer", LocationWriteBuffer(":memory:")) as location_buffer:
+            response = await add_locations_to_sport_session(sport_session_id=sport_session_id, location=location, db=MagicMock(spec=Session))
+            retry_response = await add_locations_to_sport_session(sport_session_id=sport_session_id, location=location, db=MagicMock(spec=Session))
+
+            assert response.status_code == 202
+            assert json.loads(response.body) == {"session_id": str(sport_session_id), "locations_buffered": 1, "duplicates_ignored": 0}
+            assert retry_response.status_code == 202
+            assert location_buffer.count_pending() == 2
+            mocked_add_location_to_sport_session.assert_not_called()
+            # The second acknowledgement is answered from the cached session state
+            mocked_get_sport_session_state.assert_called_once_with(sport_session_id)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_state", return_value={"user_id": "1234", "is_active": False, "started_at": None})
+    async def test_add_location_should_not_buffer_fixes_of_finished_sessions(self, mocked_get_sport_session_state):
+        with patch("app.routes.sport_sessions.location_write_buffer", LocationWriteBuffer(":memory:")) as location_buffer:
+            with pytest.raises(NotActiveError):
+                await add_locations_to_sport_session(sport_session_id=uuid.uuid4(), location=SportSessionLocationCreate(latitude=10.0, longitude=20.0), db=MagicMock(spec=Session))
+
+            assert location_buffer.count_pending() == 0
 
     @patch("app.services.sport_sessions.SportSessionService.get_active_sport_sessions")
     @patch("app.utils.utils.validate_api_key")
@@ -104,3 +179,181 @@ class TestSportRoutes:
 
         assert response.status_code == 200
         assert response_json == fake_users
+
+    @patch("app.services.sport_sessions.SportSessionService.get_active_sport_sessions", return_value=[])
+    @patch("app.utils.utils.validate_api_key")
+    async def test_search_active_sport_sessions(self, mocked_validate_api_key, mocked_get_active_sport_sessions):
+        area = ActiveSportSessionArea(bbox=BoundingBox(min_latitude=4.0, min_longitude=-75.0, max_latitude=5.0, max_longitude=-74.0))
+
+        response = await search_active_sport_sessions(area=area, db=MagicMock(spec=Session), x_api_key=fake.sha256())
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == []
+        assert mocked_get_active_sport_sessions.call_args.args[0] == area
+
+    def test_active_sport_session_area_should_require_a_single_area(self):
+        with pytest.raises(ValueError):
+            ActiveSportSessionArea()
+        with pytest.raises(ValueError):
+            BoundingBox(min_latitude=5.0, min_longitude=-75.0, max_latitude=4.0, max_longitude=-74.0)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_metrics", return_value={"user_id": "1234", "distance": 1.0})
+    async def test_get_sport_session_metrics(self, mocked_db_session: Session):
+        response = await get_sport_session_metrics(sport_session_id=uuid.uuid4(), db=mocked_db_session)
+        assert json.loads(response.body) == {"user_id": "1234", "distance": 1.0}
+        assert response.status_code == 200
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_metrics", return_value={"user_id": "1234", "distance": 1.0})
+    async def test_get_sport_session_metrics_should_fail_when_no_owner(self, mocked_db_session: Session):
+        response = await get_sport_session_metrics(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=mocked_db_session)
+        assert "error" in json.loads(response.body)
+        assert response.status_code == 403
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_track", return_value={"user_id": "1234", "locations": []})
+    async def test_get_sport_session_track(self, mocked_db_session: Session):
+        response = await get_sport_session_track(sport_session_id=uuid.uuid4(), db=mocked_db_session)
+        assert json.loads(response.body) == {"user_id": "1234", "locations": []}
+        assert response.status_code == 200
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_track", return_value={"user_id": "1234", "locations": []})
+    async def test_get_sport_session_track_should_fail_when_no_owner(self, mocked_db_session: Session):
+        response = await get_sport_session_track(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=mocked_db_session)
+        assert "error" in json.loads(response.body)
+        assert response.status_code == 403
+
+    @patch("app.services.statistics.SportSessionStatisticsService.get_statistics", return_value=[{"period": "week"}])
+    async def test_get_sport_session_statistics(self, mocked_get_statistics):
+        user_id = uuid.uuid4()
+
+        response = await get_sport_session_statistics(period="week", user_id=user_id, db=MagicMock(spec=Session))
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == [{"period": "week"}]
+        assert mocked_get_statistics.call_args.args[:2] == (user_id, "week")
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_route", return_value={"user_id": "1234", "points": []})
+    async def test_get_sport_session_route(self, mocked_get_sport_session_route):
+        response = await get_sport_session_route(sport_session_id=uuid.uuid4(), tolerance=10, max_points=100, db=MagicMock(spec=Session))
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == {"user_id": "1234", "points": []}
+        assert mocked_get_sport_session_route.call_args.args[1:] == (10, 100)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_route", return_value={"user_id": "1234", "points": []})
+    async def test_get_sport_session_route_should_fail_when_no_owner(self, mocked_get_sport_session_route):
+        response = await get_sport_session_route(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=MagicMock(spec=Session))
+
+        assert response.status_code == 403
+
+    @patch("app.routes.sport_sessions.stream_sport_sessions_export", return_value=iter(["a,b\n"]))
+    async def test_export_sport_sessions(self, mocked_stream_sport_sessions_export):
+        user_id = uuid.uuid4()
+
+        response = await export_sport_sessions(user_id=user_id, export_format="csv")
+
+        assert response.status_code == 200
+        assert response.media_type == "text/csv"
+        assert response.headers["content-disposition"] == f'attachment; filename="sport-sessions-{user_id}.csv"'
+        mocked_stream_sport_sessions_export.assert_called_once_with(user_id, "csv")
+
+    @patch("app.services.sport_sessions.SportSessionService.add_sensor_samples_to_sport_session", return_value={"samples_added": 1})
+    async def test_add_sensor_samples_to_sport_session(self, mocked_add_sensor_samples_to_sport_session):
+        user_id = uuid.uuid4()
+
+        response = await add_sensor_samples_to_sport_session(sport_session_id=uuid.uuid4(), samples=[], user_id=user_id, db=MagicMock(spec=Session))
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == {"samples_added": 1}
+        assert mocked_add_sensor_samples_to_sport_session.call_args.args[2] == user_id
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_sensor_samples", return_value={"user_id": "1234", "samples": []})
+    async def test_get_sport_session_sensor_samples_should_fail_when_no_owner(self, mocked_get_sport_session_sensor_samples):
+        response = await get_sport_session_sensor_samples(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=MagicMock(spec=Session))
+
+        assert response.status_code == 403
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_sensor_summary", return_value={"user_id": "1234", "sample_count": 0})
+    async def test_get_sport_session_sensor_summary(self, mocked_get_sport_session_sensor_summary):
+        response = await get_sport_session_sensor_summary(sport_session_id=uuid.uuid4(), db=MagicMock(spec=Session))
+
+        assert response.status_code == 200
+        assert json.loads(response.body) == {"user_id": "1234", "sample_count": 0}
+
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session_event", return_value={"event": "update", "data": {"user_id": "1234", "distance": 0.0}})
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session", return_value={"user_id": "1234", "distance": 0.0})
+    async def test_get_live_sport_session_should_stream_until_finished(self, mocked_get_live_sport_session, mocked_get_live_sport_session_event):
+        sport_session_id = uuid.uuid4()
+        response = await get_live_sport_session(sport_session_id=sport_session_id, user_id="1234", db=MagicMock(spec=Session))
+        events = response.body_iterator
+
+        snapshot = await anext(events)
+        live_session_feed.publish(sport_session_id, "update", {"distance": 10.0})
+        update = await anext(events)
+        live_session_feed.publish(sport_session_id, "finished", {"distance": 12.0})
+        finished = await anext(events)
+
+        assert (snapshot["event"], json.loads(snapshot["data"])) == ("snapshot", {"user_id": "1234", "distance": 0.0})
+        assert (update["event"], json.loads(update["data"])) == ("update", {"distance": 10.0})
+        assert finished["event"] == "finished"
+        with pytest.raises(StopAsyncIteration):
+            await anext(events)
+        assert not live_session_feed.has_subscribers(sport_session_id)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session_event", return_value={"event": "finished", "data": {"user_id": "1234", "distance": 12.0}})
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session", return_value={"user_id": "1234", "distance": 0.0})
+    async def test_get_live_sport_session_should_finish_when_finished_before_subscribing(self, mocked_get_live_sport_session, mocked_get_live_sport_session_event):
+        sport_session_id = uuid.uuid4()
+        response = await get_live_sport_session(sport_session_id=sport_session_id, user_id="1234", db=MagicMock(spec=Session))
+        events = response.body_iterator
+
+        finished = await anext(events)
+
+        assert (finished["event"], json.loads(finished["data"])) == ("finished", {"user_id": "1234", "distance": 12.0})
+        with pytest.raises(StopAsyncIteration):
+            await anext(events)
+        assert not live_session_feed.has_subscribers(sport_session_id)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session_event")
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session", return_value={"user_id": "1234", "distance": 0.0})
+    async def test_get_live_sport_session_should_read_updates_from_other_workers(self, mocked_get_live_sport_session, mocked_get_live_sport_session_event, monkeypatch):
+        monkeypatch.setattr(Config, "LIVE_FEED_POLL_SECONDS", 0.01)
+        mocked_get_live_sport_session_event.side_effect = [
+            {"event": "update", "data": {"user_id": "1234", "distance": 0.0}},
+            {"event": "update", "data": {"user_id": "1234", "distance": 0.0}},
+            {"event": "update", "data": {"user_id": "1234", "distance": 10.0}},
+            {"event": "finished", "data": {"user_id": "1234", "distance": 12.0}},
+        ]
+        response = await get_live_sport_session(sport_session_id=uuid.uuid4(), user_id="1234", db=MagicMock(spec=Session))
+
+        events = [event async for event in response.body_iterator]
+
+        assert [(event["event"], json.loads(event["data"])["distance"]) for event in events] == [("snapshot", 0.0), ("update", 10.0), ("finished", 12.0)]
+
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session", return_value={"user_id": "1234", "distance": 0.0})
+    async def test_get_live_sport_session_should_fail_when_no_owner(self, mocked_get_live_sport_session):
+        anonymous_response = await get_live_sport_session(sport_session_id=uuid.uuid4(), db=MagicMock(spec=Session))
+        other_user_response = await get_live_sport_session(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=MagicMock(spec=Session))
+
+        assert anonymous_response.status_code == 403
+        assert other_user_response.status_code == 403
+        mocked_get_live_sport_session.assert_called_once()
+
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session_event", return_value={"event": "update", "data": {"user_id": "1234", "distance": 0.0}})
+    @patch("app.services.sport_sessions.SportSessionService.get_live_sport_session", return_value={"user_id": "1234", "distance": 0.0})
+    @patch("app.utils.utils.validate_api_key")
+    async def test_get_live_sport_session_should_stream_to_api_key_callers(self, mocked_validate_api_key, mocked_get_live_sport_session, mocked_get_live_sport_session_event):
+        api_key = fake.sha256()
+
+        response = await get_live_sport_session(sport_session_id=uuid.uuid4(), x_api_key=api_key, db=MagicMock(spec=Session))
+
+        snapshot = await anext(response.body_iterator)
+        await response.body_iterator.aclose()
+
+        assert json.loads(snapshot["data"]) == {"user_id": "1234", "distance": 0.0}
+        mocked_validate_api_key.assert_called_once_with(api_key)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_session_segments", return_value={"user_id": "1234", "splits": [], "pauses": []})
+    async def test_get_sport_session_segments_should_fail_when_no_owner(self, mocked_get_sport_session_segments):
+        response = await get_sport_session_segments(sport_session_id=uuid.uuid4(), user_id=uuid.uuid4(), db=MagicMock(spec=Session))
+
+        assert response.status_code == 403
@@ -0,0 +1,95 @@
+import datetime
+import uuid
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import db as db_config
+from app.models.schemas.schema import SportSessionFinish
+from app.services.async_sport_sessions import AsyncSportSessionService, AsyncSportSessionStatisticsService
+
+
+def _async_session(sync_session):
+    async_session = MagicMock(spec=AsyncSession)
+    async_session.run_sync = AsyncMock(side_effect=lambda operation: operation(sync_session))
+    return async_session
+
+
+class TestAsyncSportSessionService:
+    @patch("app.services.sport_sessions.SportSessionService.finish_sport_session", return_value={"session_id": "1"})
+    async def test_should_run_service_through_run_sync_on_async_sessions(self, mocked_finish_sport_session):
+        # Given
+        sync_session = MagicMock(spec=Session)
+        async_session = _async_session(sync_session)
+        sport_session_id, user_id = uuid.uuid4(), uuid.uuid4()
+        sport_session_finish = SportSessionFinish(duration=10)
+
+        # When
+        sport_session = await AsyncSportSessionService(async_session).finish_sport_session(sport_session_id, sport_session_finish, user_id)
+
+        # Then
+        assert sport_session == {"session_id": "1"}
+        async_session.run_sync.assert_awaited_once()
+        mocked_finish_sport_session.assert_called_once_with(sport_session_id, sport_session_finish, user_id, None)
+
+    @patch("app.services.sport_sessions.SportSessionService.get_active_sport_sessions", return_value=[])
+    async def test_should_call_service_directly_on_sync_sessions(self, mocked_get_active_sport_sessions):
+        sport_sessions = await AsyncSportSessionService(MagicMock(spec=Session)).get_active_sport_sessions()
+
+        assert sport_sessions == []
+        mocked_get_active_sport_sessions.assert_called_once()
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions_page", return_value=([], None))
+    async def test_get_sport_sessions_page_should_forward_filters(self, mocked_get_sport_sessions_page):
+        user_id = uuid.uuid4()
+
+        page = await AsyncSportSessionService(_async_session(MagicMock(spec=Session))).get_sport_sessions_page(user_id, None, 10, "cursor", summary=True)
+
+        assert page == ([], None)
+        mocked_get_sport_sessions_page.assert_called_once_with(user_id, None, 10, "cursor", summary=True)
+
+    @patch("app.services.statistics.SportSessionStatisticsService.get_statistics", return_value=[])
+    async def test_get_statistics_should_run_through_run_sync(self, mocked_get_statistics):
+        user_id = uuid.uuid4()
+        async_session = _async_session(MagicMock(spec=Session))
+
+        statistics = await AsyncSportSessionStatisticsService(async_session).get_statistics(user_id, "month", started_from=datetime.date(2024, 1, 1))
+
+        assert statistics == []
+        async_session.run_sync.assert_awaited_once()
+        mocked_get_statistics.assert_called_once_with(user_id, "month", None, datetime.date(2024, 1, 1), None)
+
+
+class TestGetAsyncDb:
+    async def test_should_fall_back_to_sync_session_without_async_engine(self):
+        sync_session = MagicMock(spec=Session)
+
+        with patch.object(db_config, "async_session_local", None), patch.object(db_config, "session_local", return_value=sync_session):
+            sessions = [db async for db in db_config.get_async_db()]
+
+        assert sessions == [sync_session]
+        sync_session.close.assert_called_once()
+
+    async def test_should_yield_async_session_when_configured(self):
+        async_session = MagicMock(spec=AsyncSession)
+        async_session_local = MagicMock()
+        async_session_local.return_value.__aenter__.return_value = async_session
+
+        with patch.object(db_config, "async_session_local", async_session_local):
+            sessions = [db async for db in db_config.get_async_db()]
+
+        assert sessions == [async_session]
+        async_session_local.return_value.__aexit__.assert_awaited_once()
+
+    def test_create_async_engine_should_use_asyncpg_outside_test_mode(self):
+        with patch.dict(db_config.env, {"DB_DRIVER": "postgresql", "DB_HOST": "db", "DB_ASYNC": "true"}):
+            async_engine, async_session_local = db_config._create_async_engine()
+
+        assert async_engine.url.drivername == "postgresql+asyncpg"
+        assert async_engine.url.host == "db"
+        assert async_session_local is not None
+
+    def test_create_async_engine_should_be_disabled_in_test_mode(self):
+        with patch.dict(db_config.env, {"DB_DRIVER": "test"}):
+            assert db_config._create_async_engine() == (None, None)
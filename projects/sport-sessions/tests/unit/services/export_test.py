@@ -0,0 +1,129 @@
+import csv
+import datetime
+import io
+import json
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.orm import Session
+
+from app.services.export import SportSessionExportService, _chunked, stream_sport_sessions_export
+from app.services.track_codec import encode_track
+
+STARTED_AT = datetime.datetime(2024, 4, 10, 17, 55, 40)
+
+
+def _session_row(session_id, track_archived_at=None, latitude=None, location_created_at=None):
+    return SimpleNamespace(
+        session_id=session_id,
+        sport_id=uuid.UUID(int=1),
+        started_at=STARTED_AT,
+        is_active=False,
+        duration=60,
+        steps=100,
+        distance=1.5,
+        calories=10,
+        average_speed=2.5,
+        min_heartrate=None,
+        max_heartrate=None,
+        avg_heartrate=None,
+        track_archived_at=track_archived_at,
+        latitude=latitude,
+        longitude=0.0 if latitude is not None else None,
+        accuracy=None,
+        altitude=12.5 if latitude is not None else None,
+        altitude_accuracy=None,
+        heading=None,
+        speed=None,
+        location_created_at=location_created_at,
+    )
+
+
+def _location(latitude, seconds):
+    return {
+        "latitude": latitude,
+        "longitude": 0.0,
+        "accuracy": None,
+        "altitude": 12.5,
+        "altitude_accuracy": None,
+        "heading": None,
+        "speed": None,
+        "created_at": STARTED_AT + datetime.timedelta(seconds=seconds),
+    }
+
+
+class TestSportSessionExportService:
+    def test_iter_track_events_should_group_locations_by_session_and_decode_archives(self):
+        # Given
+        db_mock = MagicMock(spec=Session)
+        live_session_id, archived_session_id, empty_session_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        rows = [
+            _session_row(live_session_id, latitude=1.0, location_created_at=STARTED_AT),
+            _session_row(live_session_id, latitude=2.0, location_created_at=STARTED_AT + datetime.timedelta(seconds=1)),
+            _session_row(archived_session_id, track_archived_at=STARTED_AT),
+            _session_row(empty_session_id),
+        ]
+        rows_query_mock = MagicMock()
+        archive_query_mock = MagicMock()
+        db_mock.query.side_effect = [rows_query_mock, archive_query_mock]
+        rows_query_mock.outerjoin.return_value.filter.return_value.order_by.return_value.yield_per.return_value = rows
+        archive_query_mock.filter.return_value.scalar.return_value = encode_track([_location(3.0, 0)])
+
+        # When
+        events = list(SportSessionExportService(db_mock)._iter_track_events(uuid.uuid4()))
+
+        # Then
+        assert [event for event, _ in events] == ["session", "location", "location", "session", "location", "session"]
+        assert [item["latitude"] for event, item in events if event == "location"] == [1.0, 2.0, 3.0]
+        assert events[3][1]["session_id"] == archived_session_id
+
+    def test_to_ndjson_should_emit_one_json_document_per_line(self):
+        session_id = uuid.uuid4()
+        events = [("session", {"session_id": session_id, "started_at": STARTED_AT, "duration": 60}), ("location", _location(1.0, 0))]
+
+        lines = [json.loads(line) for line in SportSessionExportService._to_ndjson(events)]
+
+        assert lines[0] == {"type": "session", "session_id": str(session_id), "started_at": "2024-04-10T17:55:40+00:00", "duration": 60}
+        assert lines[1]["type"] == "location"
+        assert lines[1]["session_id"] == str(session_id)
+        assert lines[1]["latitude"] == 1.0
+
+    def test_to_csv_should_repeat_session_columns_and_keep_empty_sessions(self):
+        session_row = _session_row(uuid.uuid4())
+        session = {field: getattr(session_row, field) for field in ("session_id", "sport_id", "started_at", "is_active", "duration", "steps", "distance", "calories")}
+        session.update(average_speed=None, min_heartrate=None, max_heartrate=None, avg_heartrate=None)
+        events = [("session", session), ("location", _location(1.0, 0)), ("location", _location(2.0, 1)), ("session", session)]
+
+        rows = list(csv.DictReader(io.StringIO("".join(SportSessionExportService._to_csv(events)))))
+
+        assert len(rows) == 3
+        assert [row["latitude"] for row in rows] == ["1.0", "2.0", ""]
+        assert {row["session_id"] for row in rows} == {str(session["session_id"])}
+
+    def test_to_gpx_should_emit_one_track_per_session(self):
+        events = [
+            ("session", {"session_id": uuid.uuid4(), "sport_id": uuid.uuid4()}),
+            ("location", _location(1.0, 0)),
+            ("session", {"session_id": uuid.uuid4(), "sport_id": uuid.uuid4()}),
+        ]
+
+        gpx = "".join(SportSessionExportService._to_gpx(events))
+
+        assert gpx.count("<trk>") == 2
+        assert gpx.count("</trk>") == 2
+        assert '<trkpt lat="1.0" lon="0.0"><ele>12.5</ele><time>2024-04-10T17:55:40Z</time></trkpt>' in gpx
+        assert gpx.endswith("</gpx>\n")
+
+    def test_chunked_should_group_lines_up_to_chunk_size(self):
+        assert list(_chunked(["ab", "cd", "ef", "g"], 4)) == ["abcd", "efg"]
+
+    @patch("app.services.export.session_local")
+    def test_stream_sport_sessions_export_should_close_its_session(self, mocked_session_local):
+        db_mock = mocked_session_local.return_value
+        db_mock.query.return_value.outerjoin.return_value.filter.return_value.order_by.return_value.yield_per.return_value = []
+
+        chunks = list(stream_sport_sessions_export(uuid.uuid4(), "gpx"))
+
+        assert "".join(chunks).endswith("</gpx>\n")
+        db_mock.close.assert_called_once()
@@ -0,0 +1,36 @@
+import pytest
+
+from app.services.geohash import encode_geohash, get_cell_size, cover_bounding_box, is_point_in_polygon
+
+
+class TestGeohash:
+    def test_encode_geohash(self):
+        assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+        assert encode_geohash(42.6, -5.6, 5) == "ezs42"
+
+    def test_get_cell_size(self):
+        cell_height, cell_width = get_cell_size(5)
+
+        assert cell_height == pytest.approx(0.0439453125)
+        assert cell_width == pytest.approx(0.0439453125)
+
+    def test_cover_bounding_box_should_include_cells_of_inner_points(self):
+        cells = cover_bounding_box(4.60, -74.09, 4.62, -74.07, 6, 64)
+
+        assert len(cells) <= 64
+        for latitude, longitude in [(4.60, -74.09), (4.61, -74.08), (4.62, -74.07)]:
+            assert any(encode_geohash(latitude, longitude, 6).startswith(cell) for cell in cells)
+
+    def test_cover_bounding_box_should_use_coarser_cells_for_large_areas(self):
+        cells = cover_bounding_box(-10.0, -80.0, 10.0, -60.0, 7, 16)
+
+        assert len(cells) <= 16
+        assert len({len(cell) for cell in cells}) == 1
+        assert len(cells[0]) < 7
+
+    def test_is_point_in_polygon(self):
+        triangle = [(0.0, 0.0), (0.0, 10.0), (10.0, 0.0)]
+
+        assert is_point_in_polygon(2.0, 2.0, triangle)
+        assert not is_point_in_polygon(8.0, 8.0, triangle)
+        assert not is_point_in_polygon(-1.0, 5.0, triangle)
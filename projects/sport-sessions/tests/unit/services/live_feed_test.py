@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import uuid
+
+from app.services.live_feed import LiveSessionFeed
+
+
+class TestLiveSessionFeed:
+    async def test_publish_should_reach_session_subscribers(self):
+        live_feed = LiveSessionFeed(queue_size=10)
+        sport_session_id = uuid.uuid4()
+
+        with live_feed.subscribe(sport_session_id) as queue, live_feed.subscribe(uuid.uuid4()) as other_queue:
+            live_feed.publish(sport_session_id, "update", {"distance": 10.0})
+            message = await asyncio.wait_for(queue.get(), timeout=1)
+
+            assert message == {"event": "update", "data": {"distance": 10.0}}
+            assert other_queue.empty()
+
+    async def test_publish_should_be_thread_safe(self):
+        live_feed = LiveSessionFeed(queue_size=10)
+        sport_session_id = uuid.uuid4()
+
+        with live_feed.subscribe(sport_session_id) as queue:
+            publisher = threading.Thread(target=live_feed.publish, args=(sport_session_id, "finished", {}))
+            publisher.start()
+            publisher.join()
+
+            message = await asyncio.wait_for(queue.get(), timeout=1)
+            assert message["event"] == "finished"
+
+    async def test_slow_subscriber_should_drop_oldest_updates(self):
+        live_feed = LiveSessionFeed(queue_size=2)
+        sport_session_id = uuid.uuid4()
+
+        with live_feed.subscribe(sport_session_id) as queue:
+            for distance in range(4):
+                live_feed.publish(sport_session_id, "update", {"distance": distance})
+            await asyncio.sleep(0)
+
+            assert [queue.get_nowait()["data"]["distance"] for _ in range(queue.qsize())] == [2, 3]
+
+    async def test_unsubscribe_should_remove_session(self):
+        live_feed = LiveSessionFeed(queue_size=10)
+        sport_session_id = uuid.uuid4()
+
+        with live_feed.subscribe(sport_session_id):
+            assert live_feed.has_subscribers(sport_session_id)
+
+        assert not live_feed.has_subscribers(sport_session_id)
+        live_feed.publish(sport_session_id, "update", {})
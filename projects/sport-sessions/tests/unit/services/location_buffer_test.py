@@ -0,0 +1,110 @@
+import datetime
+import uuid
+
+from app.models.schemas.schema import SportSessionLocationCreate
+from app.services.location_buffer import LocationWriteBuffer, SportSessionStateCache
+
+
+class TestLocationWriteBuffer:
+    def test_append_should_ignore_retried_fixes(self):
+        location_buffer = LocationWriteBuffer(":memory:")
+        sport_session_id = uuid.uuid4()
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0, created_at=datetime.datetime(2024, 4, 10, 17, 55, 40))
+
+        first = location_buffer.append(sport_session_id, [location])
+        retry = location_buffer.append(sport_session_id, [location, location.model_copy(update={"created_at": datetime.datetime(2024, 4, 10, 17, 55, 41)})])
+
+        assert (first["locations_buffered"], first["duplicates_ignored"]) == (1, 0)
+        assert (retry["locations_buffered"], retry["duplicates_ignored"]) == (1, 1)
+        assert location_buffer.count_pending() == 2
+
+    def test_append_should_keep_fixes_without_client_timestamp(self):
+        location_buffer = LocationWriteBuffer(":memory:")
+
+        buffered = location_buffer.append(uuid.uuid4(), [SportSessionLocationCreate(latitude=10.0, longitude=20.0), SportSessionLocationCreate(latitude=10.1, longitude=20.1)])
+
+        assert buffered["locations_buffered"] == 2
+
+    def test_mark_flushed_should_keep_dedupe_window(self):
+        location_buffer = LocationWriteBuffer(":memory:", retention_seconds=3600)
+        sport_session_id = uuid.uuid4()
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0, speed=2.0, created_at=datetime.datetime(2024, 4, 10, 17, 55, 40))
+        location_buffer.append(sport_session_id, [location])
+
+        pending = location_buffer.get_pending(10)
+        location_buffer.mark_flushed([buffered["buffer_id"] for buffered in pending])
+
+        assert pending[0]["session_id"] == sport_session_id
+        assert pending[0]["location"] == location
+        assert location_buffer.count_pending() == 0
+        assert location_buffer.append(sport_session_id, [location])["locations_buffered"] == 0
+
+    def test_mark_flushed_should_purge_rows_past_retention(self):
+        location_buffer = LocationWriteBuffer(":memory:", retention_seconds=-1)
+        sport_session_id = uuid.uuid4()
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0, created_at=datetime.datetime(2024, 4, 10, 17, 55, 40))
+        location_buffer.append(sport_session_id, [location])
+
+        location_buffer.mark_flushed([buffered["buffer_id"] for buffered in location_buffer.get_pending(10)])
+
+        assert location_buffer.append(sport_session_id, [location])["locations_buffered"] == 1
+
+    def test_pending_locations_should_survive_a_restart(self, tmp_path):
+        path = str(tmp_path / "locations.db")
+        location_buffer = LocationWriteBuffer(path)
+        location_buffer.append(uuid.uuid4(), [SportSessionLocationCreate(latitude=10.0, longitude=20.0)])
+        location_buffer.close()
+
+        assert LocationWriteBuffer(path).count_pending() == 1
+
+    def test_group_by_session(self):
+        location_buffer = LocationWriteBuffer(":memory:")
+        sport_session_id, other_sport_session_id, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        location_buffer.append(sport_session_id, [SportSessionLocationCreate(latitude=10.0, longitude=20.0)], user_id)
+        location_buffer.append(other_sport_session_id, [SportSessionLocationCreate(latitude=10.0, longitude=20.0)])
+        location_buffer.append(sport_session_id, [SportSessionLocationCreate(latitude=10.1, longitude=20.1)], user_id)
+
+        groups = {session_id: (user_id, len(buffered)) for session_id, user_id, buffered in location_buffer.group_by_session(location_buffer.get_pending(10))}
+
+        assert groups == {sport_session_id: (str(user_id), 2), other_sport_session_id: (None, 1)}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSportSessionStateCache:
+    def test_get_should_expire_entries(self):
+        clock = FakeClock()
+        state_cache = SportSessionStateCache(ttl_seconds=5, max_size=10, clock=clock)
+        sport_session_id = uuid.uuid4()
+
+        state_cache.set(sport_session_id, {"user_id": "1234", "is_active": True})
+        cached_state = state_cache.get(sport_session_id)
+        clock.now = 6
+
+        assert cached_state == {"user_id": "1234", "is_active": True}
+        assert state_cache.get(sport_session_id) is None
+
+    def test_mark_finished_should_update_cached_state(self):
+        state_cache = SportSessionStateCache(ttl_seconds=5, max_size=10, clock=FakeClock())
+        sport_session_id = uuid.uuid4()
+        state_cache.set(sport_session_id, {"user_id": "1234", "is_active": True})
+
+        state_cache.mark_finished(sport_session_id)
+
+        assert state_cache.get(sport_session_id) == {"user_id": "1234", "is_active": False}
+
+    def test_set_should_evict_oldest_entries(self):
+        state_cache = SportSessionStateCache(ttl_seconds=5, max_size=2, clock=FakeClock())
+        sport_session_ids = [uuid.uuid4() for _ in range(3)]
+
+        for sport_session_id in sport_session_ids:
+            state_cache.set(sport_session_id, {"user_id": "1234", "is_active": True})
+
+        assert state_cache.get(sport_session_ids[0]) is None
+        assert state_cache.get(sport_session_ids[2]) is not None
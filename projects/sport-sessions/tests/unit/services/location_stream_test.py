@@ -0,0 +1,82 @@
+import datetime
+
+from app.models.schemas.schema import SportSessionLocationCreate
+from app.services.location_stream import LocationStreamBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLocationStreamBuffer:
+    def test_should_not_flush_when_empty(self):
+        location_buffer = LocationStreamBuffer(flush_size=2, flush_seconds=5, clock=FakeClock())
+
+        assert not location_buffer.should_flush()
+        assert location_buffer.seconds_until_flush() is None
+
+    def test_should_flush_when_size_is_reached(self):
+        location_buffer = LocationStreamBuffer(flush_size=2, flush_seconds=5, clock=FakeClock())
+
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+        assert not location_buffer.should_flush()
+
+        location_buffer.add(SportSessionLocationCreate(latitude=10.1, longitude=20.1))
+        assert location_buffer.should_flush()
+
+    def test_should_flush_when_interval_is_reached(self):
+        clock = FakeClock()
+        location_buffer = LocationStreamBuffer(flush_size=10, flush_seconds=5, clock=clock)
+
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+        clock.now = 3
+        assert not location_buffer.should_flush()
+        assert location_buffer.seconds_until_flush() == 2
+
+        clock.now = 5
+        assert location_buffer.should_flush()
+        assert location_buffer.seconds_until_flush() == 0
+
+    def test_drain_should_empty_buffer_and_reset_interval(self):
+        clock = FakeClock()
+        location_buffer = LocationStreamBuffer(flush_size=10, flush_seconds=5, clock=clock)
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+        clock.now = 7
+
+        locations = location_buffer.drain()
+
+        assert len(locations) == 1
+        assert location_buffer.locations == []
+        assert location_buffer.last_flush_at == 7
+
+    def test_restore_should_keep_failed_locations_first(self):
+        location_buffer = LocationStreamBuffer(flush_size=10, flush_seconds=5, clock=FakeClock())
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+        failed_locations = location_buffer.drain()
+        location_buffer.add(SportSessionLocationCreate(latitude=10.1, longitude=20.1))
+
+        location_buffer.restore(failed_locations)
+
+        assert [location.latitude for location in location_buffer.locations] == [10.0, 10.1]
+
+    def test_add_should_stamp_locations_without_client_timestamp(self):
+        location_buffer = LocationStreamBuffer(flush_size=10, flush_seconds=5, clock=FakeClock())
+        client_timestamp = datetime.datetime(2022, 1, 1, 0, 0, 0)
+
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0, created_at=client_timestamp))
+
+        assert location_buffer.locations[0].created_at is not None
+        assert location_buffer.locations[1].created_at == client_timestamp
+
+    def test_should_have_room_up_to_max_pending(self):
+        location_buffer = LocationStreamBuffer(flush_size=10, flush_seconds=5, max_pending=2, clock=FakeClock())
+
+        location_buffer.add(SportSessionLocationCreate(latitude=10.0, longitude=20.0))
+
+        assert location_buffer.has_room(1)
+        assert not location_buffer.has_room(2)
@@ -0,0 +1,94 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.orm import Session
+
+from app.services.partitions import get_month_start, get_partition_name, ensure_location_partitions, drop_empty_location_partitions
+from app.tasks.retention import create_location_partitions
+
+
+def _postgresql_session(existing_tables=(), default_rows=False):
+    db_mock = MagicMock(spec=Session)
+    db_mock.get_bind.return_value.dialect.name = "postgresql"
+
+    def execute(statement, params=None):
+        result = MagicMock()
+        if "to_regclass(:table_name) IS NOT NULL" in str(statement):
+            result.scalar.return_value = params["table_name"] in existing_tables
+        elif str(statement).startswith("SELECT 1 FROM sport_session_locations_default"):
+            result.first.return_value = (1,) if default_rows else None
+        return result
+
+    db_mock.execute.side_effect = execute
+    return db_mock
+
+
+def _executed_statements(db_mock):
+    return [str(call.args[0]) for call in db_mock.execute.call_args_list]
+
+
+class TestPartitions:
+    def test_get_month_start(self):
+        assert get_month_start(datetime.date(2024, 11, 17)) == datetime.date(2024, 11, 1)
+        assert get_month_start(datetime.date(2024, 11, 17), 2) == datetime.date(2025, 1, 1)
+        assert get_month_start(datetime.date(2024, 1, 31), -1) == datetime.date(2023, 12, 1)
+
+    def test_get_partition_name(self):
+        assert get_partition_name(datetime.date(2024, 4, 1)) == "sport_session_locations_y2024m04"
+
+    def test_ensure_location_partitions_should_skip_plain_tables(self):
+        db_mock = MagicMock(spec=Session)
+        db_mock.get_bind.return_value.dialect.name = "sqlite"
+
+        assert ensure_location_partitions(db_mock, datetime.date(2024, 12, 5), 2) == []
+        db_mock.execute.assert_not_called()
+
+    def test_ensure_location_partitions_should_create_upcoming_months(self):
+        db_mock = _postgresql_session(existing_tables=["sport_session_locations_y2024m12"])
+
+        partitions = ensure_location_partitions(db_mock, datetime.date(2024, 12, 5), 2)
+
+        statements = _executed_statements(db_mock)
+        assert partitions == ["sport_session_locations_y2024m12", "sport_session_locations_y2025m01", "sport_session_locations_y2025m02"]
+        assert not any("CREATE TABLE sport_session_locations_y2024m12" in statement for statement in statements)
+        assert "CREATE TABLE sport_session_locations_y2025m01 PARTITION OF sport_session_locations FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')" in statements
+        assert "CREATE TABLE sport_session_locations_y2025m02 PARTITION OF sport_session_locations FOR VALUES FROM ('2025-02-01') TO ('2025-03-01')" in statements
+        assert statements[-1].endswith("PARTITION OF sport_session_locations DEFAULT")
+
+    def test_ensure_location_partitions_should_move_default_rows_before_attaching(self):
+        db_mock = _postgresql_session(existing_tables=["sport_session_locations_default"], default_rows=True)
+
+        ensure_location_partitions(db_mock, datetime.date(2024, 12, 5), 0)
+
+        statements = _executed_statements(db_mock)
+        create_at = statements.index("CREATE TABLE sport_session_locations_y2024m12 (LIKE sport_session_locations INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        assert statements[create_at + 1].startswith("WITH moved AS (DELETE FROM sport_session_locations_default WHERE created_at >= '2024-12-01' AND created_at < '2025-01-01'")
+        assert statements[create_at + 2] == (
+            "ALTER TABLE sport_session_locations ATTACH PARTITION sport_session_locations_y2024m12 FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+        )
+
+    def test_drop_empty_location_partitions_should_only_drop_expired_empty_months(self):
+        db_mock = _postgresql_session()
+        partitioned, partition_names, empty, not_empty = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+        partition_names.scalars.return_value = [
+            "sport_session_locations_y2024m01",
+            "sport_session_locations_y2024m02",
+            "sport_session_locations_y2024m03",
+            "sport_session_locations_default",
+        ]
+        empty.first.return_value = None
+        not_empty.first.return_value = (1,)
+        db_mock.execute.side_effect = [partitioned, partition_names, empty, MagicMock(), not_empty]
+
+        dropped = drop_empty_location_partitions(db_mock, datetime.date(2024, 3, 15))
+
+        assert dropped == ["sport_session_locations_y2024m01"]
+        assert "DROP TABLE sport_session_locations_y2024m01" in _executed_statements(db_mock)
+
+    @patch("app.tasks.retention.session_local")
+    @patch("app.tasks.retention.ensure_location_partitions", side_effect=Exception("could not create partition"))
+    def test_create_location_partitions_should_not_fail_startup(self, mocked_ensure_location_partitions, mocked_session_local):
+        create_location_partitions()
+
+        mocked_session_local.return_value.rollback.assert_called_once()
+        mocked_session_local.return_value.close.assert_called_once()
@@ -1,15 +1,21 @@
 import datetime
 import uuid
+from types import SimpleNamespace
 
 import faker
 import pytest
 from unittest.mock import patch, MagicMock
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import asyncpg
 from sqlalchemy.orm import Session
 
-from app.exceptions.exceptions import NotFoundError, NotActiveError
-from app.models.model import SportSession
+from app.exceptions.exceptions import NotFoundError, NotActiveError, NotOwnerError, InvalidLocationError
+from app.models.model import SportSession, SportSessionRoute, SportSessionSensorChunk
 from app.services.sport_sessions import SportSessionService
-from app.services.sport_sessions import SportSessionStart, SportSessionLocationCreate, SportSessionFinish
+from app.services.track_codec import encode_track, decode_track, SENSOR_FIELDS
+from app.services.utils import encode_sport_session_cursor, decode_sport_session_cursor
+from app.services.sport_sessions import SportSessionStart, SportSessionLocationCreate, SportSessionFinish, SportSessionFilters, SportSessionSensorSample
+from app.models.schemas.schema import ActiveSportSessionArea, Coordinate
 
 fake = faker.Faker()
 
@@ -33,6 +39,29 @@ class TestSportSessionService:
         assert sport_session["user_id"] == str(sport_session_start.user_id)
         assert sport_session["started_at"] == sport_session_start.started_at.isoformat()
 
+    def test_start_sport_session_should_bind_naive_datetimes_for_asyncpg(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        db_mock.refresh.side_effect = lambda sport_session: setattr(sport_session, "session_id", uuid.uuid4())
+        sport_session_start = SportSessionStart(
+            sport_id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            started_at=datetime.datetime.fromisoformat("2022-01-01T05:00:00+05:00"),
+            initial_location={"latitude": 10.0, "longitude": 20.0, "created_at": "2022-01-01T05:00:01+05:00"},
+        )
+
+        # When
+        sport_session = SportSessionService(db_mock).start_sport_session(sport_session_start)
+
+        # Then
+        # asyncpg raises a TypeError for aware datetimes bound to timestamp without time zone columns
+        statements = [insert(type(row)).values({column.name: getattr(row, column.name) for column in row.__table__.columns}) for (row,), _ in db_mock.add.call_args_list]
+        statements += [statement for (statement, *_), _ in db_mock.execute.call_args_list]
+        params = [value for statement in statements for value in statement.compile(dialect=asyncpg.dialect()).params.values()]
+        assert datetime.datetime(2022, 1, 1, 0, 0, 1) in params
+        assert all(value.tzinfo is None for value in params if isinstance(value, datetime.datetime))
+        assert sport_session["started_at"] == "2022-01-01T00:00:00+00:00"
+
     def test_add_location_to_sport_session_should_create_location(self, mocked_db_session: Session) -> None:
         # Given
         sport_session_id = uuid.uuid4()
@@ -93,6 +122,89 @@ class TestSportSessionService:
         with pytest.raises(NotActiveError):
             sport_service.add_location_to_sport_session(sport_session_id, location)
 
+    def test_add_location_batch_to_sport_session_should_bulk_insert_locations(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(
+            SportSession(
+                session_id=sport_session_id,
+                sport_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                started_at=datetime.datetime.fromisoformat("2022-01-01T00:00:00+00:00"),
+                is_active=True,
+            ),
+        )
+
+        sport_service = SportSessionService(mocked_db_session)
+
+        locations = [
+            SportSessionLocationCreate(latitude=10.0, longitude=20.0, speed=10.0, created_at=datetime.datetime.fromisoformat("2022-01-01T00:00:10+00:00")),
+            SportSessionLocationCreate(latitude=10.1, longitude=20.1, speed=10.0, created_at=datetime.datetime.fromisoformat("2022-01-01T00:00:05+00:00")),
+            SportSessionLocationCreate(latitude=10.2, longitude=20.2, speed=10.0, created_at=datetime.datetime.fromisoformat("2022-01-01T00:00:15+00:00")),
+        ]
+
+        # When
+        with patch.object(mocked_db_session, "execute") as mocked_execute:
+            mocked_execute.return_value = [SimpleNamespace(created_at=location.created_at.replace(tzinfo=None)) for location in locations]
+            locations_batch = sport_service.add_location_batch_to_sport_session(sport_session_id, locations)
+
+        # Then
+        assert mocked_execute.call_count == 2
+        inserted_locations = mocked_execute.call_args_list[0].args[1]
+        assert [location["latitude"] for location in inserted_locations] == [10.1, 10.0, 10.2]
+        assert locations_batch["session_id"] == str(sport_session_id)
+        assert locations_batch["locations_added"] == 3
+        assert locations_batch["first_location_at"] == "2022-01-01T00:00:05"
+        assert locations_batch["last_location_at"] == "2022-01-01T00:00:15"
+
+    def test_add_location_batch_to_sport_session_should_ignore_retried_locations(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True, location_count=0, tracked_distance=0)
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        locations = [SportSessionLocationCreate(latitude=10.0 + second, longitude=20.0, created_at=started_at + datetime.timedelta(seconds=second)) for second in range(3)]
+        db_mock.execute.return_value = [SimpleNamespace(created_at=started_at + datetime.timedelta(seconds=2))]
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        locations_batch = sport_service.add_location_batch_to_sport_session(sport_session.session_id, locations + locations[:1])
+
+        # Then
+        assert len(db_mock.execute.call_args_list[0].args[1]) == 3
+        assert (locations_batch["locations_added"], locations_batch["duplicates_ignored"]) == (1, 3)
+        assert (sport_session.location_count, sport_session.last_latitude) == (1, 12.0)
+
+    def test_add_location_batch_to_sport_session_should_raise_not_found_error(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_service = SportSessionService(mocked_db_session)
+        locations = [SportSessionLocationCreate(latitude=10.0, longitude=20.0)]
+
+        # When
+        with pytest.raises(NotFoundError):
+            sport_service.add_location_batch_to_sport_session(uuid.uuid4(), locations)
+
+    def test_add_location_batch_to_sport_session_should_raise_not_active_error(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(
+            SportSession(
+                session_id=sport_session_id,
+                sport_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                started_at=datetime.datetime.fromisoformat("2022-01-01T00:00:00+00:00"),
+                is_active=False,
+            ),
+        )
+
+        sport_service = SportSessionService(mocked_db_session)
+        locations = [SportSessionLocationCreate(latitude=10.0, longitude=20.0)]
+
+        # When
+        with pytest.raises(NotActiveError):
+            sport_service.add_location_batch_to_sport_session(sport_session_id, locations)
+
     def test_finish_sport_session_should_return_metrics(self, mocked_db_session: Session) -> None:
         # Given
         sport_session_id = uuid.uuid4()
@@ -132,6 +244,33 @@ class TestSportSessionService:
         assert sport_session["max_heartrate"] == sport_session_finish.max_heartrate
         assert sport_session["avg_heartrate"] == sport_session_finish.avg_heartrate
 
+    def test_finish_sport_session_should_use_track_aggregates(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(
+            SportSession(
+                session_id=sport_session_id,
+                sport_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                started_at=datetime.datetime.fromisoformat("2022-01-01T00:00:00+00:00"),
+                is_active=True,
+                location_count=3,
+                tracked_distance=4.5,
+                speed_sum=30.0,
+                speed_count=3,
+            ),
+        )
+
+        sport_service = SportSessionService(mocked_db_session)
+        sport_session_finish = SportSessionFinish(duration=5, steps=1000)
+
+        # When
+        sport_session = sport_service.finish_sport_session(sport_session_id, sport_session_finish)
+
+        # Then
+        assert sport_session["distance"] == 4.5
+        assert sport_session["average_speed"] == 10.0
+
     def test_finish_sport_session_should_raise_not_found_error(self, mocked_db_session: Session) -> None:
         # Given
         sport_service = SportSessionService(mocked_db_session)
@@ -180,8 +319,9 @@ class TestSportSessionService:
         with pytest.raises(NotActiveError):
             sport_service.finish_sport_session(sport_session_id, sport_session_finish)
 
+    @patch("app.services.sport_sessions.SportSessionStatisticsService")
     @patch("app.services.sport_sessions.estimate_distance", return_value=1234)
-    def test_finish_sport_session_should_calculate_distance(self, mocked_db_session: Session) -> None:
+    def test_finish_sport_session_should_calculate_distance(self, mocked_db_session: Session, mocked_statistics_service) -> None:
         # Given
         sport_session_id = uuid.uuid4()
         mocked_db_session.add(
@@ -213,8 +353,9 @@ class TestSportSessionService:
         # Then
         assert sport_session["distance"] == 1234
 
+    @patch("app.services.sport_sessions.SportSessionStatisticsService")
     @patch("app.services.sport_sessions.estimate_calories_burned", return_value=1234)
-    def test_finish_sport_session_should_calculate_calories(self, mocked_db_session: Session) -> None:
+    def test_finish_sport_session_should_calculate_calories(self, mocked_db_session: Session, mocked_statistics_service) -> None:
         # Given
         sport_session_id = uuid.uuid4()
         mocked_db_session.add(
@@ -246,8 +387,9 @@ class TestSportSessionService:
         # Then
         assert sport_session["calories"] == 1234
 
+    @patch("app.services.sport_sessions.SportSessionStatisticsService")
     @patch("app.services.sport_sessions.estimate_speed", return_value=1234)
-    def test_finish_sport_session_should_calculate_speed(self, mocked_db_session: Session) -> None:
+    def test_finish_sport_session_should_calculate_speed(self, mocked_db_session: Session, mocked_statistics_service) -> None:
         # Given
         sport_session_id = uuid.uuid4()
         mocked_db_session.add(
@@ -309,6 +451,248 @@ class TestSportSessionService:
         with pytest.raises(NotFoundError):
             sport_service.get_sport_session(sport_session_id)
 
+    def test_get_sport_session_metrics_should_return_track_metrics(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        track = [
+            SimpleNamespace(latitude=0.0, longitude=0.0, accuracy=None, altitude=10.0, altitude_accuracy=None, heading=None, speed=3.0, created_at=started_at),
+            SimpleNamespace(
+                latitude=0.009,
+                longitude=0.0,
+                accuracy=None,
+                altitude=20.0,
+                altitude_accuracy=None,
+                heading=None,
+                speed=3.0,
+                created_at=started_at + datetime.timedelta(seconds=300),
+            ),
+        ]
+
+        session_query_mock = MagicMock()
+        track_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, track_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        track_query_mock.filter.return_value.order_by.return_value.all.return_value = track
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        metrics = sport_service.get_sport_session_metrics(sport_session.session_id)
+
+        # Then
+        assert metrics["session_id"] == str(sport_session.session_id)
+        assert metrics["distance"] == pytest.approx(1.0007, abs=0.001)
+        assert metrics["duration"] == 300
+        assert metrics["elevation_gain"] == 10.0
+        assert metrics["splits"][0]["split"] == 1
+
+    def test_get_sport_session_route_should_simplify_active_sessions_without_caching(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True)
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        track = [
+            SimpleNamespace(
+                latitude=0.0001 * index,
+                longitude=0.0,
+                accuracy=None,
+                altitude=None,
+                altitude_accuracy=None,
+                heading=None,
+                speed=None,
+                created_at=started_at + datetime.timedelta(seconds=index),
+            )
+            for index in range(10)
+        ]
+
+        session_query_mock = MagicMock()
+        track_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, track_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        track_query_mock.filter.return_value.order_by.return_value.all.return_value = track
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_session_route = sport_service.get_sport_session_route(sport_session.session_id, tolerance=1, max_points=100)
+
+        # Then
+        assert sport_session_route["original_point_count"] == 10
+        assert [point["latitude"] for point in sport_session_route["points"]] == pytest.approx([0.0, 0.0009])
+        db_mock.execute.assert_not_called()
+
+    def test_get_sport_session_route_should_cache_finished_sessions(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        track = [
+            SimpleNamespace(latitude=0.0, longitude=0.0, accuracy=None, altitude=None, altitude_accuracy=None, heading=None, speed=None, created_at=datetime.datetime(2022, 1, 1)),
+            SimpleNamespace(
+                latitude=0.001, longitude=0.0, accuracy=None, altitude=None, altitude_accuracy=None, heading=None, speed=None, created_at=datetime.datetime(2022, 1, 2)
+            ),
+        ]
+
+        session_query_mock = MagicMock()
+        cache_query_mock = MagicMock()
+        track_query_mock = MagicMock()
+        count_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, cache_query_mock, track_query_mock, count_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        cache_query_mock.filter.return_value.first.return_value = None
+        track_query_mock.filter.return_value.order_by.return_value.all.return_value = track
+        count_query_mock.select_from.return_value.filter.return_value.scalar.return_value = 0
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_session_route = sport_service.get_sport_session_route(sport_session.session_id)
+
+        # Then
+        assert len(sport_session_route["points"]) == 2
+        db_mock.execute.assert_called_once()
+        db_mock.commit.assert_called_once()
+
+    @patch("app.services.sport_sessions.Config.MAX_CACHED_ROUTES_PER_SESSION", 2)
+    def test_get_sport_session_route_should_not_cache_past_the_limit_of_the_session(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        track = [
+            SimpleNamespace(latitude=0.0, longitude=0.0, accuracy=None, altitude=None, altitude_accuracy=None, heading=None, speed=None, created_at=datetime.datetime(2022, 1, 1)),
+            SimpleNamespace(
+                latitude=0.001, longitude=0.0, accuracy=None, altitude=None, altitude_accuracy=None, heading=None, speed=None, created_at=datetime.datetime(2022, 1, 2)
+            ),
+        ]
+
+        session_query_mock = MagicMock()
+        cache_query_mock = MagicMock()
+        track_query_mock = MagicMock()
+        count_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, cache_query_mock, track_query_mock, count_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        cache_query_mock.filter.return_value.first.return_value = None
+        track_query_mock.filter.return_value.order_by.return_value.all.return_value = track
+        count_query_mock.select_from.return_value.filter.return_value.scalar.return_value = 2
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_session_route = sport_service.get_sport_session_route(sport_session.session_id, tolerance=3, max_points=100)
+
+        # Then
+        assert (sport_session_route["tolerance"], len(sport_session_route["points"])) == (3, 2)
+        db_mock.execute.assert_not_called()
+
+    def test_get_sport_session_route_should_return_cached_route(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        points = [
+            {
+                "latitude": 10.0,
+                "longitude": 20.0,
+                "accuracy": None,
+                "altitude": 5.0,
+                "altitude_accuracy": None,
+                "heading": None,
+                "speed": None,
+                "created_at": datetime.datetime(2022, 1, 1),
+            }
+        ]
+        cached_route = SportSessionRoute(session_id=sport_session.session_id, tolerance=5, max_points=500, original_point_count=120, track=encode_track(points))
+
+        session_query_mock = MagicMock()
+        cache_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, cache_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        cache_query_mock.filter.return_value.first.return_value = cached_route
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_session_route = sport_service.get_sport_session_route(sport_session.session_id, tolerance=5, max_points=500)
+
+        # Then
+        assert sport_session_route["original_point_count"] == 120
+        assert sport_session_route["points"] == [{"latitude": 10.0, "longitude": 20.0, "altitude": 5.0, "created_at": "2022-01-01T00:00:00"}]
+        db_mock.execute.assert_not_called()
+
+    def test_get_sport_session_metrics_should_raise_not_found_error(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_service = SportSessionService(mocked_db_session)
+
+        # When
+        with pytest.raises(NotFoundError):
+            sport_service.get_sport_session_metrics(uuid.uuid4())
+
+    def test_get_sport_session_track_should_decode_archived_track(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        created_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        track = [{"latitude": 10.0, "longitude": 20.0, "accuracy": None, "altitude": None, "altitude_accuracy": None, "heading": None, "speed": 3.0, "created_at": created_at}]
+        mocked_db_session.add(
+            SportSession(
+                session_id=sport_session_id,
+                sport_id=uuid.uuid4(),
+                user_id=uuid.uuid4(),
+                is_active=False,
+                track_archive=encode_track(track),
+                track_archived_at=created_at,
+            ),
+        )
+
+        sport_service = SportSessionService(mocked_db_session)
+
+        # When
+        sport_session_track = sport_service.get_sport_session_track(sport_session_id)
+
+        # Then
+        assert sport_session_track["session_id"] == str(sport_session_id)
+        assert sport_session_track["locations"] == [{**track[0], "created_at": created_at.isoformat()}]
+
+    def test_archive_sport_session_track_should_pack_locations(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        track = [
+            SimpleNamespace(
+                latitude=10.0, longitude=20.0, accuracy=None, altitude=None, altitude_accuracy=None, heading=None, speed=None, created_at=datetime.datetime(2022, 1, 1)
+            ),
+        ]
+
+        session_query_mock = MagicMock()
+        track_query_mock = MagicMock()
+        delete_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, track_query_mock, delete_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        track_query_mock.filter.return_value.order_by.return_value.all.return_value = track
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        archived = sport_service.archive_sport_session_track(sport_session.session_id)
+
+        # Then
+        assert archived
+        assert sport_session.track_archived_at is not None
+        assert decode_track(sport_session.track_archive)[0]["latitude"] == 10.0
+        delete_query_mock.filter.return_value.delete.assert_called_once()
+        db_mock.commit.assert_called_once()
+
+    def test_archive_sport_session_track_should_skip_active_sessions(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(SportSession(session_id=sport_session_id, sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True))
+        sport_service = SportSessionService(mocked_db_session)
+
+        # When
+        archived = sport_service.archive_sport_session_track(sport_session_id)
+
+        # Then
+        assert not archived
+
     def test_get_sport_sessions_should_return_sport_sessions(self, mocked_db_session: Session) -> None:
         # Given
         user_id = uuid.uuid4()
@@ -341,44 +725,363 @@ class TestSportSessionService:
         # Then
         assert len(sport_sessions) == 0
 
+    def test_get_sport_sessions_should_apply_filters_cursor_and_limit(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        query_mock = db_mock.query.return_value
+        query_mock.filter.return_value = query_mock
+        query_mock.order_by.return_value = query_mock
+        query_mock.limit.return_value = query_mock
+        query_mock.all.return_value = []
+        filters = SportSessionFilters(
+            sport_id=uuid.uuid4(),
+            started_from=datetime.datetime(2022, 1, 1, tzinfo=datetime.UTC),
+            started_to=datetime.datetime(2022, 2, 1, tzinfo=datetime.UTC),
+            is_active=False,
+        )
+        cursor = encode_sport_session_cursor(datetime.datetime(2022, 1, 15), uuid.uuid4())
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_service.get_sport_sessions(uuid.uuid4(), filters, limit=10, cursor=cursor)
+
+        # Then
+        assert query_mock.filter.call_count == 6
+        query_mock.limit.assert_called_once_with(10)
+
+    def test_get_sport_sessions_summary_should_only_select_list_columns(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        query_mock = db_mock.query.return_value
+        query_mock.filter.return_value.order_by.return_value.all.return_value = [
+            SimpleNamespace(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), started_at=datetime.datetime(2022, 1, 1), duration=60, distance=1.5, calories=10, is_active=False)
+        ]
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_sessions = sport_service.get_sport_sessions(uuid.uuid4(), summary=True)
+
+        # Then
+        assert len(db_mock.query.call_args.args) == 7
+        assert set(sport_sessions[0]) == {"session_id", "sport_id", "started_at", "duration", "distance", "calories", "is_active"}
+        assert sport_sessions[0]["started_at"] == "2022-01-01T00:00:00+00:00"
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions")
+    def test_get_sport_sessions_page_should_return_next_cursor_when_more_sessions_exist(self, mocked_get_sport_sessions) -> None:
+        # Given
+        sport_sessions = [{"session_id": str(uuid.uuid4()), "started_at": f"2022-01-0{day}T00:00:00+00:00"} for day in (3, 2, 1)]
+        mocked_get_sport_sessions.return_value = sport_sessions
+
+        sport_service = SportSessionService(MagicMock(spec=Session))
+
+        # When
+        page, next_cursor = sport_service.get_sport_sessions_page(uuid.uuid4(), limit=2)
+
+        # Then
+        assert page == sport_sessions[:2]
+        assert mocked_get_sport_sessions.call_args.args[2] == 3
+        assert decode_sport_session_cursor(next_cursor) == (datetime.datetime(2022, 1, 2), uuid.UUID(sport_sessions[1]["session_id"]))
+
+    @patch("app.services.sport_sessions.SportSessionService.get_sport_sessions", return_value=[])
+    def test_get_sport_sessions_page_should_not_return_cursor_on_last_page(self, mocked_get_sport_sessions) -> None:
+        sport_service = SportSessionService(MagicMock(spec=Session))
+
+        page, next_cursor = sport_service.get_sport_sessions_page(uuid.uuid4(), limit=2)
+
+        assert page == []
+        assert next_cursor is None
+
+    def test_add_location_to_sport_session_should_raise_not_owner_error(self, mocked_db_session: Session) -> None:
+        # Given
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(SportSession(session_id=sport_session_id, sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True))
+
+        sport_service = SportSessionService(mocked_db_session)
+
+        # When
+        with pytest.raises(NotOwnerError):
+            sport_service.add_location_to_sport_session(sport_session_id, SportSessionLocationCreate(latitude=10.0, longitude=20.0), user_id=uuid.uuid4())
+
+        # Then
+        mocked_db_session.commit.assert_not_called()
+
+    def test_finish_sport_session_should_check_owner_before_active_state(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False)
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        with pytest.raises(NotOwnerError):
+            sport_service.finish_sport_session(sport_session.session_id, SportSessionFinish(duration=5), user_id=uuid.uuid4())
+        with pytest.raises(NotActiveError):
+            sport_service.finish_sport_session(sport_session.session_id, SportSessionFinish(duration=5), user_id=sport_session.user_id)
+
+        # Then
+        assert db_mock.query.call_count == 2
+
+    def test_add_sensor_samples_to_sport_session_should_store_one_chunk_per_batch(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True, sensor_sample_count=0)
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+        samples = [
+            SportSessionSensorSample(heartrate=150, power=250, created_at=started_at + datetime.timedelta(seconds=1)),
+            SportSessionSensorSample(heartrate=140, cadence=90, created_at=started_at),
+        ]
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        samples_batch = sport_service.add_sensor_samples_to_sport_session(sport_session.session_id, samples)
+
+        # Then
+        chunk = db_mock.add.call_args.args[0]
+        assert isinstance(chunk, SportSessionSensorChunk)
+        assert (chunk.first_sample_at, chunk.last_sample_at, chunk.sample_count) == (started_at, started_at + datetime.timedelta(seconds=1), 2)
+        assert [sample["heartrate"] for sample in decode_track(chunk.samples, SENSOR_FIELDS)] == [140.0, 150.0]
+        assert samples_batch["samples_added"] == 2
+        assert samples_batch["avg_heartrate"] == 145.0
+        assert samples_batch["max_power"] == 250
+        db_mock.commit.assert_called_once()
+
+    @patch("app.services.sport_sessions.live_session_feed")
+    def test_add_location_to_sport_session_should_publish_live_state(self, mocked_live_feed) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True, location_count=0, tracked_distance=0)
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+        mocked_live_feed.has_subscribers.return_value = True
+        db_mock.execute.return_value = [SimpleNamespace(created_at=datetime.datetime(2022, 1, 1, 0, 0, 0))]
+        location = SportSessionLocationCreate(
+            latitude=10.0, longitude=20.0, accuracy=10.0, altitude=10.0, altitude_accuracy=10.0, heading=10.0, speed=2.5, created_at=datetime.datetime(2022, 1, 1, 0, 0, 0)
+        )
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sport_service.add_location_to_sport_session(sport_session.session_id, location)
+
+        # Then
+        sport_session_id, event, live_state = mocked_live_feed.publish.call_args.args
+        assert (sport_session_id, event) == (sport_session.session_id, "update")
+        assert (live_state["latitude"], live_state["longitude"], live_state["location_count"]) == (10.0, 20.0, 1)
+        assert live_state["last_location_at"] == "2022-01-01T00:00:00"
+
+    @patch("app.services.sport_sessions.live_session_feed")
+    def test_add_location_to_sport_session_should_not_build_live_state_without_subscribers(self, mocked_live_feed) -> None:
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True, location_count=0, tracked_distance=0)
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+        mocked_live_feed.has_subscribers.return_value = False
+
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0, accuracy=10.0, altitude=10.0, altitude_accuracy=10.0, heading=10.0, speed=10.0)
+
+        SportSessionService(db_mock).add_location_to_sport_session(sport_session.session_id, location)
+
+        mocked_live_feed.publish.assert_not_called()
+
+    def test_check_active_sport_session_should_only_read_owner_and_state(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        owner_id = uuid.uuid4()
+        started_at = datetime.datetime(2022, 1, 1)
+        db_mock.query.return_value.filter.return_value.first.side_effect = [
+            None,
+            SimpleNamespace(user_id=owner_id, is_active=True, started_at=started_at),
+            SimpleNamespace(user_id=owner_id, is_active=False, started_at=started_at),
+            SimpleNamespace(user_id=owner_id, is_active=True, started_at=started_at),
+        ]
+        early_location = SportSessionLocationCreate(latitude=10.0, longitude=20.0, created_at=datetime.datetime(2021, 12, 31))
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        with pytest.raises(NotFoundError):
+            sport_service.check_active_sport_session(uuid.uuid4())
+        with pytest.raises(NotOwnerError):
+            sport_service.check_active_sport_session(uuid.uuid4(), user_id=uuid.uuid4())
+        with pytest.raises(NotActiveError):
+            sport_service.check_active_sport_session(uuid.uuid4(), user_id=owner_id)
+        with pytest.raises(InvalidLocationError):
+            sport_service.check_active_sport_session(uuid.uuid4(), user_id=owner_id, locations=[early_location])
+
+        # Then
+        db_mock.query.assert_called_with(SportSession.user_id, SportSession.is_active, SportSession.started_at)
+
+    def test_get_live_sport_session_should_raise_not_active_error(self, mocked_db_session: Session) -> None:
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(SportSession(session_id=sport_session_id, sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False))
+
+        with pytest.raises(NotActiveError):
+            SportSessionService(mocked_db_session).get_live_sport_session(sport_session_id)
+
+    def test_get_live_sport_session_event_should_report_finished_sessions(self, mocked_db_session: Session) -> None:
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(
+            SportSession(session_id=sport_session_id, sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False, started_at=datetime.datetime(2022, 1, 1), duration=60)
+        )
+
+        live_event = SportSessionService(mocked_db_session).get_live_sport_session_event(sport_session_id)
+
+        assert (live_event["event"], live_event["data"]["session_id"], live_event["data"]["duration"]) == ("finished", str(sport_session_id), 60)
+
+    def test_add_sensor_samples_to_sport_session_should_raise_not_active_error(self, mocked_db_session: Session) -> None:
+        sport_session_id = uuid.uuid4()
+        mocked_db_session.add(SportSession(session_id=sport_session_id, sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=False))
+
+        sport_service = SportSessionService(mocked_db_session)
+
+        with pytest.raises(NotActiveError):
+            sport_service.add_sensor_samples_to_sport_session(sport_session_id, [SportSessionSensorSample(heartrate=120)])
+
+    def test_get_sport_session_sensor_samples_should_merge_chunks_in_time_order(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True)
+
+        def _chunk(*seconds):
+            samples = [{"heartrate": 100.0 + second, "cadence": None, "power": None, "created_at": started_at + datetime.timedelta(seconds=second)} for second in seconds]
+            return SimpleNamespace(samples=encode_track(samples, fields=SENSOR_FIELDS))
+
+        session_query_mock = MagicMock()
+        chunks_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, chunks_query_mock]
+        session_query_mock.filter.return_value.first.return_value = sport_session
+        chunks_query_mock.filter.return_value.order_by.return_value.all.return_value = [_chunk(0, 2), _chunk(1, 3)]
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        sensor_samples = sport_service.get_sport_session_sensor_samples(sport_session.session_id)
+
+        # Then
+        assert [sample["heartrate"] for sample in sensor_samples["samples"]] == [100.0, 101.0, 102.0, 103.0]
+        assert sensor_samples["samples"][0]["created_at"] == "2022-01-01T00:00:00"
+
+    @patch("app.services.sport_sessions.Config.HEARTRATE_ZONES", [0, 150])
+    def test_get_sport_session_sensor_summary_should_describe_zones(self) -> None:
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), user_id=uuid.uuid4(), sensor_sample_count=3, heartrate_zone_seconds=[10.0, 2.0], cadence_sum=180, cadence_count=2)
+        db_mock.query.return_value.filter.return_value.first.return_value = sport_session
+
+        sensor_summary = SportSessionService(db_mock).get_sport_session_sensor_summary(sport_session.session_id)
+
+        assert sensor_summary["avg_cadence"] == 90
+        assert sensor_summary["avg_power"] is None
+        assert sensor_summary["heartrate_zones"] == [
+            {"zone": 1, "min_heartrate": 0, "max_heartrate": 150, "seconds": 10.0},
+            {"zone": 2, "min_heartrate": 150, "max_heartrate": None, "seconds": 2.0},
+        ]
+
+    def test_finish_sport_session_should_keep_heartrate_from_sensor_samples(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(
+            session_id=uuid.uuid4(),
+            sport_id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            is_active=True,
+            started_at=datetime.datetime(2022, 1, 1),
+            location_count=0,
+            min_heartrate=100,
+            max_heartrate=170,
+            avg_heartrate=140,
+            heartrate_count=60,
+        )
+        db_mock.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+
+        sport_service = SportSessionService(db_mock)
+
+        # When
+        finished_sport_session = sport_service.finish_sport_session(sport_session.session_id, SportSessionFinish(duration=60, steps=10, max_heartrate=175))
+
+        # Then
+        assert (finished_sport_session["min_heartrate"], finished_sport_session["max_heartrate"], finished_sport_session["avg_heartrate"]) == (100, 175, 140)
+
     def test_get_active_sport_sessions(self):
         db_mock = MagicMock(spec=Session)
-        user_id_1 = fake.uuid4()
-        user_id_2 = fake.uuid4()
-        user_id_3 = fake.uuid4()
+
+        fake_positions = [
+            SimpleNamespace(user_id=fake.uuid4(), latitude=fake.latitude(), longitude=fake.longitude()),
+            SimpleNamespace(user_id=fake.uuid4(), latitude=fake.latitude(), longitude=fake.longitude()),
+            SimpleNamespace(user_id=fake.uuid4(), latitude=fake.latitude(), longitude=fake.longitude()),
+        ]
+        db_mock.query.return_value.all.return_value = fake_positions
+
+        sport_service = SportSessionService(db_mock)
+        sport_sessions = sport_service.get_active_sport_sessions()
+
+        assert len(sport_sessions) == 3
+        for sport_session, position in zip(sport_sessions, fake_positions):
+            assert sport_session["user_id"] == str(position.user_id)
+            assert sport_session["latitude"] == float(position.latitude)
+            assert sport_session["longitude"] == float(position.longitude)
+
+    def test_rebuild_active_sport_session_positions(self):
+        db_mock = MagicMock(spec=Session)
+        session_id = uuid.uuid4()
+        created_at = datetime.datetime(2022, 1, 1)
 
         class CMock:
-            user_id = MagicMock()
+            session_id = MagicMock()
             latest_created_at = MagicMock()
 
         class SubqueryMock:
             c = CMock()
 
-        class LocationMock:
-            def __init__(self, user_id, latitude, longitude):
-                self.user_id = user_id
-                self.latitude = latitude
-                self.longitude = longitude
-
-        fake_locations = [
-            LocationMock(user_id_1, fake.latitude(), fake.longitude()),
-            LocationMock(user_id_2, fake.latitude(), fake.longitude()),
-            LocationMock(user_id_3, fake.latitude(), fake.longitude()),
+        latest_locations = [
+            SimpleNamespace(session_id=session_id, user_id=uuid.uuid4(), latitude=10.0, longitude=20.0, created_at=created_at),
+            SimpleNamespace(session_id=session_id, user_id=uuid.uuid4(), latitude=10.0, longitude=20.0, created_at=created_at),
         ]
 
-        first_query_mock = MagicMock()
-        second_query_mock = MagicMock()
+        subquery_mock = MagicMock()
+        locations_query_mock = MagicMock()
+        delete_query_mock = MagicMock()
+        db_mock.query.side_effect = [subquery_mock, locations_query_mock, delete_query_mock]
+        subquery_mock.join.return_value.filter.return_value.group_by.return_value.subquery.return_value = SubqueryMock()
+        locations_query_mock.join.return_value.join.return_value.all.return_value = latest_locations
+
+        sport_service = SportSessionService(db_mock)
+        rebuilt_positions = sport_service.rebuild_active_sport_session_positions()
 
-        db_mock.query.side_effect = [first_query_mock, second_query_mock]
+        assert rebuilt_positions == 1
+        delete_query_mock.delete.assert_called_once()
+        assert len(list(db_mock.add_all.call_args.args[0])) == 1
+        db_mock.commit.assert_called_once()
 
-        first_query_mock.join.return_value.filter.return_value.group_by.return_value.subquery.return_value = SubqueryMock()
-        second_query_mock.join.return_value.join.return_value.filter.return_value.all.return_value = fake_locations
+    def test_get_active_sport_sessions_should_filter_by_polygon(self) -> None:
+        # Given
+        db_mock = MagicMock(spec=Session)
+        positions = [SimpleNamespace(user_id=uuid.uuid4(), latitude=2.0, longitude=2.0), SimpleNamespace(user_id=uuid.uuid4(), latitude=8.0, longitude=8.0)]
+        db_mock.query.return_value.filter.return_value.all.return_value = positions
+        area = ActiveSportSessionArea(polygon=[Coordinate(latitude=0.0, longitude=0.0), Coordinate(latitude=0.0, longitude=10.0), Coordinate(latitude=10.0, longitude=0.0)])
 
         sport_service = SportSessionService(db_mock)
-        sport_sessions = sport_service.get_active_sport_sessions()
 
-        assert len(sport_sessions) == 3
-        for sport_session in sport_sessions:
-            assert "user_id" in sport_session
-            assert "latitude" in sport_session
-            assert "longitude" in sport_session
+        # When
+        active_sport_sessions = sport_service.get_active_sport_sessions(area)
+
+        # Then
+        assert active_sport_sessions == [{"user_id": str(positions[0].user_id), "latitude": 2.0, "longitude": 2.0}]
+        assert "LIKE" in str(db_mock.query.return_value.filter.call_args.args[0])
+
+    def test_finish_sport_session_should_remove_active_position(self) -> None:
+        db_mock = MagicMock(spec=Session)
+        sport_session = SportSession(session_id=uuid.uuid4(), sport_id=uuid.uuid4(), user_id=uuid.uuid4(), is_active=True, started_at=datetime.datetime(2022, 1, 1))
+        session_query_mock = MagicMock()
+        position_query_mock = MagicMock()
+        db_mock.query.side_effect = [session_query_mock, position_query_mock]
+        session_query_mock.filter.return_value.with_for_update.return_value.first.return_value = sport_session
+
+        sport_service = SportSessionService(db_mock)
+        sport_service.finish_sport_session(sport_session.session_id, SportSessionFinish(duration=5, steps=10, distance=10, average_speed=1))
+
+        session_query_mock.filter.return_value.with_for_update.assert_called_once_with()
+        position_query_mock.filter.return_value.delete.assert_called_once()
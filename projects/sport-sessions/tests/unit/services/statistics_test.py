@@ -0,0 +1,116 @@
+import datetime
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import Session
+
+from app.models.model import SportSession
+from app.services.statistics import SportSessionStatisticsService, get_period_start, get_statistic_counters
+
+
+class TestSportSessionStatisticsService:
+    def test_get_period_start_should_return_monday_for_weeks(self):
+        assert get_period_start(datetime.datetime(2024, 4, 11, 18, 30), "week") == datetime.date(2024, 4, 8)
+
+    def test_get_period_start_should_return_first_day_for_months(self):
+        assert get_period_start(datetime.datetime(2024, 4, 11, 18, 30), "month") == datetime.date(2024, 4, 1)
+
+    def test_get_statistic_counters_should_skip_missing_heartrate(self):
+        sport_session = SportSession(distance=5, duration=1800, calories=300, steps=None, avg_heartrate=None)
+
+        counters = get_statistic_counters(sport_session)
+
+        assert counters == {
+            "session_count": 1,
+            "total_distance": 5.0,
+            "total_duration": 1800,
+            "total_calories": 300.0,
+            "total_steps": 0,
+            "heartrate_sum": 0.0,
+            "heartrate_count": 0,
+        }
+
+    def test_get_statistic_counters_should_count_values_as_stored(self):
+        finishing_session = SportSession(distance=5.7, duration=1800, calories=300.5, steps=6000, avg_heartrate=140.4)
+        stored_session = SportSession(distance=6, duration=1800, calories=300, steps=6000, avg_heartrate=140)
+
+        counters = get_statistic_counters(finishing_session)
+
+        assert counters == get_statistic_counters(stored_session)
+        assert (counters["total_distance"], counters["total_calories"], counters["heartrate_sum"]) == (6.0, 300.0, 140.0)
+
+    def test_record_finished_sport_session_should_upsert_week_and_month_rollups(self):
+        # Given
+        db_mock = MagicMock(spec=Session)
+        db_mock.get_bind.return_value.dialect.name = "sqlite"
+        sport_session = SportSession(
+            user_id=uuid.uuid4(), sport_id=uuid.uuid4(), started_at=datetime.datetime(2024, 4, 11), distance=5, duration=1800, calories=300, steps=6000, avg_heartrate=140
+        )
+
+        # When
+        SportSessionStatisticsService(db_mock).record_finished_sport_session(sport_session)
+
+        # Then
+        assert db_mock.execute.call_count == 2
+        period_starts = [call.args[0].compile().params["period_start"] for call in db_mock.execute.call_args_list]
+        assert period_starts == [datetime.date(2024, 4, 8), datetime.date(2024, 4, 1)]
+        db_mock.commit.assert_not_called()
+
+    def test_get_statistics_should_return_totals_and_averages(self):
+        # Given
+        db_mock = MagicMock(spec=Session)
+        sport_id = uuid.uuid4()
+        query_mock = db_mock.query.return_value.filter.return_value
+        query_mock.filter.return_value = query_mock
+        query_mock.order_by.return_value.all.return_value = [
+            SimpleNamespace(
+                sport_id=sport_id,
+                period="month",
+                period_start=datetime.date(2024, 4, 1),
+                session_count=2,
+                total_distance=15.0,
+                total_duration=3600,
+                total_calories=500.0,
+                total_steps=10000,
+                heartrate_sum=290.0,
+                heartrate_count=2,
+            )
+        ]
+
+        # When
+        statistics = SportSessionStatisticsService(db_mock).get_statistics(
+            uuid.uuid4(), "month", sport_id=sport_id, started_from=datetime.date(2024, 1, 1), started_to=datetime.date(2025, 1, 1)
+        )
+
+        # Then
+        assert query_mock.filter.call_count == 3
+        assert statistics[0]["period_start"] == "2024-04-01"
+        assert statistics[0]["average_distance"] == 7.5
+        assert statistics[0]["average_duration"] == 1800
+        assert statistics[0]["average_heartrate"] == 145
+
+    def test_rebuild_statistics_should_roll_up_finished_sessions(self):
+        # Given
+        db_mock = MagicMock(spec=Session)
+        user_id, sport_id = uuid.uuid4(), uuid.uuid4()
+        finished_sessions = [
+            SportSession(user_id=user_id, sport_id=sport_id, started_at=datetime.datetime(2024, 4, day), distance=5, duration=1800, calories=300, steps=6000, avg_heartrate=140)
+            for day in (8, 9, 15)
+        ]
+        sessions_query_mock = MagicMock()
+        delete_query_mock = MagicMock()
+        db_mock.query.side_effect = [sessions_query_mock, delete_query_mock]
+        sessions_query_mock.filter.return_value.yield_per.return_value = finished_sessions
+
+        # When
+        rollups_count = SportSessionStatisticsService(db_mock).rebuild_statistics()
+
+        # Then
+        rollups = {(rollup.period, rollup.period_start): rollup for rollup in db_mock.add_all.call_args.args[0]}
+        assert rollups_count == 3
+        assert rollups[("week", datetime.date(2024, 4, 8))].session_count == 2
+        assert rollups[("week", datetime.date(2024, 4, 15))].session_count == 1
+        assert rollups[("month", datetime.date(2024, 4, 1))].total_distance == 15
+        delete_query_mock.delete.assert_called_once()
+        db_mock.commit.assert_called_once()
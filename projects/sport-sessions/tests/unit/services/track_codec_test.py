@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+from app.services.track_codec import encode_track, decode_track, HEADER, SENSOR_FIELDS
+
+START = datetime.datetime(2024, 4, 10, 17, 55, 40, 63000)
+
+
+def _location(index, **overrides):
+    location = {
+        "latitude": 3.4516 + index * 0.0001,
+        "longitude": -76.5320 - index * 0.0001,
+        "accuracy": 5.0,
+        "altitude": 1000.0 + index,
+        "altitude_accuracy": None,
+        "heading": 90.0,
+        "speed": 3.25,
+        "created_at": START + datetime.timedelta(seconds=2 * index),
+    }
+    location.update(overrides)
+    return location
+
+
+class TestTrackCodec:
+    def test_should_round_trip_locations(self):
+        locations = [_location(index) for index in range(100)]
+
+        decoded = decode_track(encode_track(locations))
+
+        assert len(decoded) == 100
+        for original, restored in zip(locations, decoded):
+            assert restored["created_at"] == original["created_at"]
+            assert restored["latitude"] == pytest.approx(original["latitude"], abs=1e-7)
+            assert restored["longitude"] == pytest.approx(original["longitude"], abs=1e-7)
+            assert restored["altitude"] == pytest.approx(original["altitude"], abs=0.01)
+            assert restored["speed"] == 3.25
+            assert restored["altitude_accuracy"] is None
+
+    def test_should_keep_nulls_in_the_middle_of_a_column(self):
+        locations = [_location(0), _location(1, speed=None, accuracy=None), _location(2, speed=1.5)]
+
+        decoded = decode_track(encode_track(locations))
+
+        assert [location["speed"] for location in decoded] == [3.25, None, 1.5]
+        assert [location["accuracy"] for location in decoded] == [5.0, None, 5.0]
+
+    def test_should_support_large_deltas(self):
+        locations = [_location(0), _location(1, created_at=START + datetime.timedelta(days=40), latitude=-80.0, longitude=170.0)]
+
+        decoded = decode_track(encode_track(locations))
+
+        assert decoded[1]["created_at"] == START + datetime.timedelta(days=40)
+        assert decoded[1]["latitude"] == -80.0
+        assert decoded[1]["longitude"] == 170.0
+
+    def test_should_support_uncompressed_archives(self):
+        locations = [_location(index) for index in range(10)]
+
+        assert decode_track(encode_track(locations, compression_level=0)) == decode_track(encode_track(locations))
+
+    def test_should_be_smaller_than_raw_rows(self):
+        locations = [_location(index) for index in range(1000)]
+
+        # A row has two UUIDs, seven floats and a timestamp before any index or tuple overhead
+        assert len(encode_track(locations)) < 1000 * (2 * 16 + 7 * 8 + 8) / 10
+
+    def test_should_encode_empty_tracks(self):
+        assert decode_track(encode_track([])) == []
+
+    def test_should_reject_unknown_formats(self):
+        with pytest.raises(ValueError):
+            decode_track(HEADER.pack(b"NOPE", 1, 0, 0, 0))
+
+    def test_should_round_trip_sensor_samples(self):
+        samples = [
+            {"heartrate": 120.0 + index % 7, "cadence": 85.5 if index % 3 else None, "power": 210.0 + index, "created_at": START + datetime.timedelta(seconds=index)}
+            for index in range(3600)
+        ]
+
+        blob = encode_track(samples, fields=SENSOR_FIELDS)
+
+        assert decode_track(blob, SENSOR_FIELDS) == samples
+        assert len(blob) < 3600 * 4
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+from app.services import track_metrics
+from app.services.utils import _haversine
+
+START = datetime.datetime(2022, 1, 1, 0, 0, 0)
+
+
+def _timestamps(seconds):
+    return [START + datetime.timedelta(seconds=second) for second in seconds]
+
+
+class TestTrackMetrics:
+    def test_haversine_distances_should_match_scalar_haversine(self):
+        latitudes = [40.7128, 51.5074, 48.8566]
+        longitudes = [74.0060, 0.1278, 2.3522]
+
+        distances = track_metrics.haversine_distances(latitudes, longitudes)
+
+        assert len(distances) == 2
+        assert distances[0] == pytest.approx(_haversine(40.7128, 74.0060, 51.5074, 0.1278))
+        assert distances[1] == pytest.approx(_haversine(51.5074, 0.1278, 48.8566, 2.3522))
+
+    def test_haversine_distances_should_be_empty_for_a_single_point(self):
+        assert track_metrics.haversine_distances([10.0], [20.0]).size == 0
+
+    def test_elevation_gain_should_only_add_climbs(self):
+        assert track_metrics.elevation_gain([100.0, 110.0, None, 105.0, 120.0]) == 25.0
+
+    def test_elevation_gain_should_be_zero_without_altitudes(self):
+        assert track_metrics.elevation_gain([None, None]) == 0.0
+
+    def test_compute_track_metrics_should_compute_distance_duration_and_moving_time(self):
+        # Each 0.009 degrees of latitude is about one kilometer
+        latitudes = [0.0, 0.009, 0.009, 0.018]
+        longitudes = [0.0, 0.0, 0.0, 0.0]
+        timestamps = _timestamps([0, 300, 600, 900])
+
+        metrics = track_metrics.compute_track_metrics(latitudes, longitudes, timestamps, altitudes=[0.0, 5.0, 5.0, 2.0], speeds=[3.0, 3.0, None, 4.0])
+
+        assert metrics["distance"] == pytest.approx(2.0015, abs=0.001)
+        assert metrics["duration"] == 900
+        assert metrics["moving_time"] == 600
+        assert metrics["average_speed"] == pytest.approx(10 / 3)
+        assert metrics["moving_speed"] == pytest.approx(2001.5 / 600, abs=0.01)
+        assert metrics["elevation_gain"] == 5.0
+
+    def test_compute_track_metrics_should_compute_splits(self):
+        latitudes = [0.0, 0.009, 0.018]
+        longitudes = [0.0, 0.0, 0.0]
+        timestamps = _timestamps([0, 300, 660])
+
+        metrics = track_metrics.compute_track_metrics(latitudes, longitudes, timestamps, split_distance=1)
+
+        assert [split["split"] for split in metrics["splits"]] == [1, 2]
+        assert metrics["splits"][0]["pace"] == pytest.approx(300, abs=1)
+        assert metrics["splits"][1]["pace"] == pytest.approx(360, abs=1)
+
+    def test_compute_track_metrics_should_handle_empty_tracks(self):
+        metrics = track_metrics.compute_track_metrics([], [], [])
+
+        assert metrics["distance"] == 0
+        assert metrics["duration"] == 0
+        assert metrics["moving_time"] == 0
+        assert metrics["average_speed"] is None
+        assert metrics["splits"] == []
+
+    def test_compute_track_segments_should_detect_pauses_and_time_splits_on_moving_time(self):
+        # 0.001 degrees of longitude at the equator are ~111 m, covered in 30 s, with a 60 s stop after the 5th fix
+        longitudes = [index * 0.001 for index in range(6)] + [0.005] * 2 + [0.005 + index * 0.001 for index in range(1, 11)]
+        seconds = [index * 30 for index in range(6)] + [180, 210] + [210 + index * 30 for index in range(1, 11)]
+        speeds = [3.7] * 6 + [0.0, 0.0] + [3.7] * 10
+
+        segments = track_metrics.compute_track_segments([0.0] * len(longitudes), longitudes, _timestamps(seconds), speeds, 0.5, 1, 10)
+
+        assert segments["duration"] == 510
+        assert segments["paused_time"] == 60
+        assert segments["moving_time"] == 450
+        assert segments["pauses"] == [{"started_at": "2022-01-01T00:02:30", "ended_at": "2022-01-01T00:03:30", "duration": 60.0}]
+        assert len(segments["splits"]) == 1
+        assert segments["splits"][0]["duration"] == pytest.approx(270, abs=1)
+        assert segments["moving_speed"] == pytest.approx(3.7, abs=0.05)
+
+    def test_compute_track_segments_should_ignore_short_stops(self):
+        seconds = [0, 5, 8, 13]
+        segments = track_metrics.compute_track_segments([0.0] * 4, [0.0, 0.0001, 0.0001, 0.0002], _timestamps(seconds), None, 0.5, 1, 10)
+
+        assert segments["pauses"] == []
+        assert segments["moving_time"] == 13
+
+    def test_compute_track_segments_should_handle_empty_tracks(self):
+        segments = track_metrics.compute_track_segments([], [], [], [])
+
+        assert (segments["duration"], segments["moving_time"], segments["moving_speed"], segments["pauses"], segments["splits"]) == (0.0, 0.0, None, [], [])
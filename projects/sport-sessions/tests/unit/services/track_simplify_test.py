@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.services import track_simplify
+
+
+class TestTrackSimplify:
+    def test_simplify_track_should_keep_short_tracks(self):
+        assert track_simplify.simplify_track([10.0, 10.001], [20.0, 20.001]).tolist() == [0, 1]
+
+    def test_simplify_track_should_drop_collinear_fixes(self):
+        latitudes = [0.0, 0.001, 0.002, 0.003, 0.004]
+        longitudes = [0.0, 0.0, 0.0, 0.0, 0.0]
+
+        assert track_simplify.simplify_track(latitudes, longitudes, tolerance=1).tolist() == [0, 4]
+
+    def test_simplify_track_should_keep_corners_beyond_tolerance(self):
+        # An L shaped route with ~110 m legs
+        latitudes = [0.0, 0.0005, 0.001, 0.001, 0.001]
+        longitudes = [0.0, 0.0, 0.0, 0.0005, 0.001]
+
+        assert track_simplify.simplify_track(latitudes, longitudes, tolerance=5).tolist() == [0, 2, 4]
+
+    def test_simplify_track_should_stop_at_max_points_keeping_largest_deviations(self):
+        latitudes = [0.0, 0.0001, 0.0, 0.01, 0.0, 0.0]
+        longitudes = [0.0, 0.001, 0.002, 0.003, 0.004, 0.005]
+
+        kept = track_simplify.simplify_track(latitudes, longitudes, tolerance=0, max_points=3)
+
+        assert kept.tolist() == [0, 3, 5]
+
+    def test_simplify_track_should_handle_loops_returning_to_start(self):
+        latitudes = [0.0, 0.001, 0.001, 0.0]
+        longitudes = [0.0, 0.0, 0.001, 0.0]
+
+        kept = track_simplify.simplify_track(latitudes, longitudes, tolerance=5)
+
+        assert isinstance(kept, np.ndarray)
+        assert kept.tolist() == [0, 1, 2, 3]
@@ -1,7 +1,12 @@
+import datetime
 import unittest
+import uuid
+from types import SimpleNamespace
 from unittest.mock import patch
 from app.services import utils
-from app.models.model import Location
+from app.exceptions.exceptions import InvalidCursorError, InvalidLocationError
+from app.models.model import Location, SportSession
+from app.models.schemas.schema import SportSessionLocationCreate
 
 
 class TestUtils(unittest.TestCase):
@@ -40,6 +45,11 @@ class TestUtils(unittest.TestCase):
         result = utils.estimate_speed(0, 0, locations)
         self.assertEqual(result, 10.0)
 
+    def test_estimate_speed_should_leave_out_stationary_locations(self):
+        locations = [SimpleNamespace(speed=speed) for speed in (4.0, 0.0, 0.1, 2.0, None)]
+        result = utils.estimate_speed(0, 0, locations)
+        self.assertEqual(result, 3.0)
+
     def test_estimate_speed_without_locations(self):
         distance = 1000
         duration = 100
@@ -49,3 +59,149 @@ class TestUtils(unittest.TestCase):
     def test_estimate_speed_should_return_none(self):
         result = utils.estimate_speed(0, 0, [])
         self.assertIsNone(result)
+
+    def test_to_utc_naive_should_convert_aware_dates(self):
+        date = datetime.datetime.fromisoformat("2022-01-01T05:00:00+05:00")
+        result = utils.to_utc_naive(date)
+        self.assertEqual(result, datetime.datetime(2022, 1, 1, 0, 0, 0))
+
+    def test_to_utc_naive_should_keep_naive_dates(self):
+        date = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        result = utils.to_utc_naive(date)
+        self.assertEqual(result, date)
+
+    def test_check_location_timestamps_should_bound_client_timestamps(self):
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        now = datetime.datetime(2022, 1, 1, 1, 0, 0)
+        location = SportSessionLocationCreate(latitude=10.0, longitude=20.0)
+
+        utils.check_location_timestamps([location, location.model_copy(update={"created_at": now + datetime.timedelta(minutes=1)})], started_at, now)
+        with self.assertRaises(InvalidLocationError):
+            utils.check_location_timestamps([location.model_copy(update={"created_at": started_at - datetime.timedelta(seconds=1)})], started_at, now)
+        with self.assertRaises(InvalidLocationError):
+            utils.check_location_timestamps([location.model_copy(update={"created_at": datetime.datetime.fromisoformat("2099-01-01T00:00:00+00:00")})], started_at, now)
+
+    def test_bucket_route_parameters(self):
+        self.assertEqual(utils.bucket_route_parameters(2.4, 520), (2.0, 500))
+        self.assertEqual(utils.bucket_route_parameters(1.6, 549), (2.0, 500))
+        self.assertEqual(utils.bucket_route_parameters(0.2, 30), (0.0, 30))
+
+    def test_estimate_distance_with_tracked_distance(self):
+        result = utils.estimate_distance(1000, [], tracked_distance=12.5)
+        self.assertEqual(result, 12.5)
+
+    def test_estimate_speed_with_speed_aggregates(self):
+        result = utils.estimate_speed(1000, 100, [], speed_sum=30.0, speed_count=3)
+        self.assertEqual(result, 10.0)
+
+    def test_update_track_aggregates_should_start_track_on_first_location(self):
+        sport_session = SportSession(location_count=0)
+        created_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+
+        utils.update_track_aggregates(sport_session, 40.7128, 74.0060, 5.0, created_at)
+
+        self.assertEqual(sport_session.location_count, 1)
+        self.assertEqual(sport_session.tracked_distance, 0)
+        self.assertEqual(sport_session.speed_sum, 5.0)
+        self.assertEqual(sport_session.speed_count, 1)
+        self.assertEqual((sport_session.last_latitude, sport_session.last_longitude, sport_session.last_location_at), (40.7128, 74.0060, created_at))
+        self.assertEqual((sport_session.min_latitude, sport_session.max_latitude), (40.7128, 40.7128))
+        self.assertEqual((sport_session.min_longitude, sport_session.max_longitude), (74.0060, 74.0060))
+
+    def test_update_track_aggregates_should_accumulate_following_locations(self):
+        sport_session = SportSession(location_count=0)
+        created_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+
+        utils.update_track_aggregates(sport_session, 40.7128, 74.0060, 5.0, created_at)
+        utils.update_track_aggregates(sport_session, 51.5074, 0.1278, None, created_at + datetime.timedelta(hours=1))
+
+        self.assertEqual(sport_session.location_count, 2)
+        self.assertAlmostEqual(sport_session.tracked_distance, 5570.271, delta=1)
+        self.assertEqual(sport_session.speed_count, 1)
+        self.assertEqual((sport_session.last_latitude, sport_session.last_longitude), (51.5074, 0.1278))
+        self.assertEqual((sport_session.min_latitude, sport_session.max_latitude), (40.7128, 51.5074))
+        self.assertEqual((sport_session.min_longitude, sport_session.max_longitude), (0.1278, 74.0060))
+
+    def test_update_track_aggregates_should_not_move_track_end_for_late_locations(self):
+        sport_session = SportSession(location_count=0)
+        created_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        utils.update_track_aggregates(sport_session, 0.0, 0.0, None, created_at)
+        utils.update_track_aggregates(sport_session, 0.0, 0.002, None, created_at + datetime.timedelta(seconds=20))
+        distance = sport_session.tracked_distance
+
+        utils.update_track_aggregates(sport_session, 0.001, 0.001, 3.0, created_at + datetime.timedelta(seconds=10))
+
+        self.assertEqual(sport_session.location_count, 3)
+        self.assertEqual(sport_session.tracked_distance, distance)
+        self.assertEqual((sport_session.last_latitude, sport_session.last_longitude), (0.0, 0.002))
+        self.assertEqual((sport_session.max_latitude, sport_session.speed_count), (0.001, 1))
+
+    def test_correct_distance_for_late_locations(self):
+        created_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        window = [(0.0, 0.0, created_at), (0.001, 0.001, created_at + datetime.timedelta(seconds=10)), (0.0, 0.002, created_at + datetime.timedelta(seconds=20))]
+        sport_session = SportSession(tracked_distance=utils._haversine(0.0, 0.0, 0.0, 0.002))
+
+        utils.correct_distance_for_late_locations(sport_session, window, {created_at + datetime.timedelta(seconds=10)})
+
+        self.assertAlmostEqual(sport_session.tracked_distance, 2 * utils._haversine(0.0, 0.0, 0.001, 0.001), places=6)
+
+    def test_update_track_aggregates_should_skip_untracked_sessions(self):
+        sport_session = SportSession(location_count=None)
+
+        utils.update_track_aggregates(sport_session, 40.7128, 74.0060, 5.0, datetime.datetime(2022, 1, 1, 0, 0, 0))
+
+        self.assertIsNone(sport_session.location_count)
+        self.assertIsNone(sport_session.last_latitude)
+
+    def test_sport_session_cursor_should_round_trip(self):
+        started_at = datetime.datetime(2022, 1, 1, 10, 30, 15, 123456)
+        session_id = uuid.uuid4()
+
+        cursor = utils.encode_sport_session_cursor(started_at, session_id)
+
+        self.assertEqual(utils.decode_sport_session_cursor(cursor), (started_at, session_id))
+
+    def test_decode_sport_session_cursor_should_reject_malformed_cursors(self):
+        with self.assertRaises(InvalidCursorError):
+            utils.decode_sport_session_cursor("not-a-cursor")
+
+    def test_heartrate_zone(self):
+        zones = [0, 114, 133, 152, 171]
+
+        self.assertEqual([utils.heartrate_zone(heartrate, zones) for heartrate in (60, 114, 140, 171, 200)], [0, 1, 2, 4, 4])
+
+    @patch("app.services.utils.Config.HEARTRATE_ZONES", [0, 114, 133, 152, 171])
+    @patch("app.services.utils.Config.SENSOR_MAX_SAMPLE_GAP", 5)
+    def test_update_sensor_aggregates_should_accumulate_summaries_and_zones(self):
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 0)
+        sport_session = SportSession(sensor_sample_count=0, heartrate_sum=0, heartrate_count=0, cadence_sum=0, cadence_count=0, power_sum=0, power_count=0)
+        samples = [
+            {"heartrate": 100.0, "cadence": 80.0, "power": None, "created_at": started_at},
+            {"heartrate": 140.0, "cadence": None, "power": 200.0, "created_at": started_at + datetime.timedelta(seconds=2)},
+            {"heartrate": None, "cadence": 90.0, "power": 300.0, "created_at": started_at + datetime.timedelta(seconds=3)},
+            # A 60 seconds dropout only counts as the maximum gap
+            {"heartrate": 150.0, "cadence": None, "power": None, "created_at": started_at + datetime.timedelta(seconds=62)},
+        ]
+
+        utils.update_sensor_aggregates(sport_session, samples)
+
+        self.assertEqual(sport_session.sensor_sample_count, 4)
+        self.assertEqual((sport_session.min_heartrate, sport_session.max_heartrate), (100.0, 150.0))
+        self.assertAlmostEqual(sport_session.avg_heartrate, 130.0)
+        self.assertEqual((sport_session.cadence_sum, sport_session.cadence_count), (170.0, 2))
+        self.assertEqual((sport_session.power_sum, sport_session.power_count, sport_session.max_power), (500.0, 2, 300.0))
+        self.assertEqual(sport_session.heartrate_zone_seconds, [2.0, 0.0, 5.0, 0.0, 0.0])
+        self.assertEqual(sport_session.last_heartrate_at, started_at + datetime.timedelta(seconds=62))
+
+    @patch("app.services.utils.Config.HEARTRATE_ZONES", [0, 114, 133, 152, 171])
+    def test_update_sensor_aggregates_should_not_count_late_samples_in_zones(self):
+        started_at = datetime.datetime(2022, 1, 1, 0, 0, 10)
+        sport_session = SportSession(
+            sensor_sample_count=1, heartrate_sum=160.0, heartrate_count=1, min_heartrate=160, max_heartrate=160, last_heartrate=160.0, last_heartrate_at=started_at
+        )
+
+        utils.update_sensor_aggregates(sport_session, [{"heartrate": 100.0, "cadence": None, "power": None, "created_at": started_at - datetime.timedelta(seconds=5)}])
+
+        self.assertEqual(sport_session.min_heartrate, 100.0)
+        self.assertEqual(sport_session.heartrate_zone_seconds, [0.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(sport_session.last_heartrate_at, started_at)
@@ -1,7 +1,9 @@
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 import faker
+from sqlalchemy.dialects import postgresql, sqlite
 
+from app.models.model import ActiveSportSessionPosition
 from app.utils import utils
 
 fake = faker.Faker()
@@ -29,3 +31,19 @@ class TestUtils:
                 utils.validate_api_key(None)
             except Exception as e:
                 assert str(e) == "Invalid API key"
+
+    def test_dialect_insert_sqlite(self):
+        db_mock = MagicMock()
+        db_mock.get_bind.return_value.dialect.name = "sqlite"
+
+        statement = utils.dialect_insert(db_mock, ActiveSportSessionPosition)
+
+        assert isinstance(statement, sqlite.Insert)
+
+    def test_dialect_insert_postgresql(self):
+        db_mock = MagicMock()
+        db_mock.get_bind.return_value.dialect.name = "postgresql"
+
+        statement = utils.dialect_insert(db_mock, ActiveSportSessionPosition)
+
+        assert isinstance(statement, postgresql.Insert)
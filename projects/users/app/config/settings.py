@@ -9,8 +9,27 @@ class Config:
     REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", 10080))
     JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "secret")
-    TOTAL_USERS_BY_RUN = int(os.getenv("TOTAL_USERS_BY_RUN", 50))
+    REGISTRATION_MIN_BATCH_SIZE = int(os.getenv("REGISTRATION_MIN_BATCH_SIZE", 10))
+    REGISTRATION_MAX_BATCH_SIZE = int(os.getenv("REGISTRATION_MAX_BATCH_SIZE", 500))
     SYNC_EVERY = int(os.getenv("SYNC_EVERY_MINUTES", 2))
+    REGISTRATION_BATCH_WAIT_SECONDS = float(os.getenv("REGISTRATION_BATCH_WAIT_SECONDS", 0.05))
+    # "memory" keeps registrations in the worker that received them, "database" shares them between workers
+    REGISTRATION_QUEUE_BACKEND = os.getenv("REGISTRATION_QUEUE_BACKEND", "memory")
+    REGISTRATION_QUEUE_POLL_SECONDS = float(os.getenv("REGISTRATION_QUEUE_POLL_SECONDS", 0.2))
+    REGISTRATION_CLAIM_TIMEOUT_SECONDS = float(os.getenv("REGISTRATION_CLAIM_TIMEOUT_SECONDS", 60))
+    REGISTRATION_RETENTION_SECONDS = float(os.getenv("REGISTRATION_RETENTION_SECONDS", 3600))
+    REGISTRATION_RETRY_MIN_SECONDS = float(os.getenv("REGISTRATION_RETRY_MIN_SECONDS", 0.5))
+    REGISTRATION_RETRY_MAX_SECONDS = float(os.getenv("REGISTRATION_RETRY_MAX_SECONDS", 30))
+    # Same variable uvicorn reads for its number of workers
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+    # Profiles are cached per worker, "database" adds a layer shared by every worker and a version per user checked before
+    # serving a local entry, so an update is seen by all of them. "memory" is only enabled with a single worker
+    PROFILE_CACHE_BACKEND = os.getenv("PROFILE_CACHE_BACKEND", "memory")
+    PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", 10000))
+    PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 60))
+    PROFILE_CACHE_SHARED_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_SHARED_TTL_SECONDS", 600))
+    PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
     PASSWORD_REGEX = os.getenv("PASSWORD_REGEX", r"((?=.*\d)(?=.*[a-z])(?=.*[A-Z])(?=.*[\W]).{8,64})")
     EMAIL_REGEX = os.getenv("EMAIL_REGEX", r"[^@]+@[^@]+\.[^@]+")
     HOUR_REGEX = os.getenv("HOUR_REGEX", r"^(1[0-2]|0?[1-9]):([0-5][0-9])\s?(AM|PM)$")
@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import Literal
 from uuid import uuid4, UUID
 
-from sqlalchemy import Column, Uuid, Enum, String, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Uuid, Enum, String, Integer, Float, ForeignKey, DateTime, Index, LargeBinary
 from sqlalchemy.orm import relationship
 
 from app.config.db import base
@@ -48,6 +48,14 @@ class PremiumAppointmentType(enum.Enum):
     IN_PERSON = "in_person"
 
 
+class RegistrationStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    CREATED = "created"
+    EXISTS = "exists"
+    FAILED = "failed"
+
+
 @dataclass
 class Trainer(base):
     __tablename__ = "trainers"
@@ -140,3 +148,36 @@ class User(base):
     subscription_type: UserSubscriptionType = Column(Enum(UserSubscriptionType), default=UserSubscriptionType.FREE)
     subscription_start_date: datetime = Column(DateTime, nullable=True)
     subscription_end_date: datetime = Column(DateTime, nullable=True)
+
+
+@dataclass
+class UserRegistration(base):
+    __tablename__ = "user_registrations"
+    registration_id: UUID = Column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    first_name: str = Column(String, nullable=False)
+    last_name: str = Column(String, nullable=False)
+    email: str = Column(String, nullable=False)
+    hashed_password: str = Column(String, nullable=True)
+    status: RegistrationStatus = Column(Enum(RegistrationStatus), nullable=False, default=RegistrationStatus.PENDING)
+    user_id: UUID = Column(Uuid(as_uuid=True), nullable=True)
+    created_at: datetime = Column(DateTime, nullable=False, default=datetime.now)
+    claimed_at: datetime = Column(DateTime, nullable=True)
+    completed_at: datetime = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_user_registrations_status_created_at", "status", "created_at"),)
+
+
+@dataclass
+class UserProfileCacheEntry(base):
+    __tablename__ = "user_profile_cache"
+    cache_key: str = Column(String, primary_key=True)
+    value: bytes = Column(LargeBinary, nullable=False)
+    version: int = Column(Integer, nullable=False, default=0)
+    expires_at: datetime = Column(DateTime, nullable=False)
+
+
+@dataclass
+class UserProfileCacheVersion(base):
+    __tablename__ = "user_profile_cache_versions"
+    user_id: str = Column(String, primary_key=True)
+    version: int = Column(Integer, nullable=False, default=0)
@@ -1,18 +1,18 @@
-import asyncio
 import json
 
 from typing import Annotated
 from uuid import UUID
 from fastapi import Depends, APIRouter, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from sse_starlette import EventSourceResponse
 
 from app.config.db import get_db
+from app.exceptions.exceptions import EntityExistsError
 from app.models.schemas.profiles_schema import UserPersonalProfile, UserNutritionalProfile, UserSportsProfileUpdate
 from app.models.schemas.schema import UserCreate, UserAdditionalInformation, UserCredentials, UpdateSubscriptionType, PremiumSportsmanAppointment
 from app.services.users import UsersService
-from app.utils.user_cache import UserCache
+from app.services.registration_queue import registration_queue
 
 router = APIRouter(
     prefix="/users",
@@ -26,40 +26,37 @@ router = APIRouter(
 
 @router.post("/registration")
 async def register_user(user: UserCreate):
-    UserCache.users.append(user)
-
-    async def event_generator(user_to_add):
-        while True:
-            if user_to_add.email in UserCache.users_with_errors_by_email_map:
-                del UserCache.users_with_errors_by_email_map[user_to_add.email]
-                response = {"status": "error", "message": "User already exists"}
-                yield json.dumps(response)
-                break
-            elif user_to_add.email in UserCache.users_success_by_email_map:
-                user_created = UserCache.users_success_by_email_map[user_to_add.email]
-                del UserCache.users_success_by_email_map[user_to_add.email]
-                response = {
-                    "status": "success",
-                    "message": "User created",
-                    "data": {
-                        "id": user_created["user_id"],
-                        "email": user_created["email"],
-                        "first_name": user_created["first_name"],
-                        "last_name": user_created["last_name"],
-                    },
-                }
-                yield json.dumps(response)
-                break
-            response = {"status": "processing", "message": "Processing..."}
-            yield json.dumps(response)
-            await asyncio.sleep(1)
-
-    return EventSourceResponse(event_generator(user))
+    pending_registration = await registration_queue.submit(user)
+
+    async def event_generator(registration):
+        yield json.dumps({"status": "processing", "message": "Processing..."})
+        try:
+            user_created = await registration_queue.wait(registration)
+        except EntityExistsError:
+            yield json.dumps({"status": "error", "message": "User already exists"})
+            return
+        except Exception:
+            yield json.dumps({"status": "error", "message": "User could not be created"})
+            return
+
+        response = {
+            "status": "success",
+            "message": "User created",
+            "data": {
+                "id": user_created["user_id"],
+                "email": user_created["email"],
+                "first_name": user_created["first_name"],
+                "last_name": user_created["last_name"],
+            },
+        }
+        yield json.dumps(response)
+
+    return EventSourceResponse(event_generator(pending_registration))
 
 
 @router.post("/login")
 async def login_user(user_credentials: UserCredentials, db: Session = Depends(get_db)):
-    login_user_response = UsersService(db).authenticate_user(user_credentials)
+    login_user_response = await UsersService(db).authenticate_user(user_credentials)
     return JSONResponse(content=login_user_response, status_code=200)
 
 
@@ -96,19 +93,19 @@ async def get_premium_trainers(user_id: Annotated[UUID, Header()], db: Session =
 @router.get("/profiles/personal")
 async def get_user_personal_information(user_id: Annotated[UUID, Header()], db: Session = Depends(get_db)):
     user_personal_information = UsersService(db).get_user_personal_information(user_id)
-    return JSONResponse(content=user_personal_information, status_code=200)
+    return Response(content=user_personal_information, media_type="application/json", status_code=200)
 
 
 @router.get("/profiles/sports")
 async def get_user_sports_information(user_id: Annotated[UUID, Header()], db: Session = Depends(get_db)):
     user_sports_information = UsersService(db).get_user_sports_information(user_id)
-    return JSONResponse(content=user_sports_information, status_code=200)
+    return Response(content=user_sports_information, media_type="application/json", status_code=200)
 
 
 @router.get("/profiles/nutritional")
 async def get_user_nutritional_information(user_id: Annotated[UUID, Header()], db: Session = Depends(get_db)):
     user_nutritional_information = UsersService(db).get_user_nutritional_information(user_id)
-    return JSONResponse(content=user_nutritional_information, status_code=200)
+    return Response(content=user_nutritional_information, media_type="application/json", status_code=200)
 
 
 @router.patch("/profiles/personal")
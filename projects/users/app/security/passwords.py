@@ -1,16 +1,60 @@
+import asyncio
 import hashlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from app.config.settings import Config
+
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
 
 
 class PasswordManager:
+    # bcrypt releases the GIL while hashing, so a thread pool spreads the work over the available cores
+    _executor = None
+
     @staticmethod
     def get_password_hash(password: str) -> str:
-        password_bytes = password.encode()
-        sha256 = hashlib.sha256()
-        sha256.update(password_bytes)
-        hashed_password = sha256.hexdigest()
-        return hashed_password
+        salt = bcrypt.gensalt(rounds=Config.PASSWORD_HASH_ROUNDS)
+        return bcrypt.hashpw(password.encode()[:BCRYPT_MAX_PASSWORD_BYTES], salt).decode()
 
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
-        provided_hash = PasswordManager.get_password_hash(password)
-        return provided_hash == hashed_password
+        if PasswordManager.is_legacy_hash(hashed_password):
+            legacy_hash = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy_hash, hashed_password)
+        return bcrypt.checkpw(password.encode()[:BCRYPT_MAX_PASSWORD_BYTES], hashed_password.encode())
+
+    @staticmethod
+    def is_legacy_hash(hashed_password: str) -> bool:
+        # Passwords used to be stored as plain SHA-256 hex digests
+        return not hashed_password.startswith("$2")
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        if PasswordManager.is_legacy_hash(hashed_password):
+            return True
+        rounds = int(hashed_password.split("$")[2])
+        return rounds < Config.PASSWORD_HASH_ROUNDS
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return cls._executor
+
+    @classmethod
+    async def get_password_hash_async(cls, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(cls._get_executor(), cls.get_password_hash, password)
+
+    @classmethod
+    async def verify_password_async(cls, password: str, hashed_password: str) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(cls._get_executor(), cls.verify_password, password, hashed_password)
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True)
+            cls._executor = None
@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import select, delete
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.models.users import UserProfileCacheEntry, UserProfileCacheVersion
+from app.utils.utils import dialect_insert
+
+PROFILES = ("personal", "sports", "nutritional")
+
+
+class ProfileCacheBackend(ABC):
+    """Entries are stamped with the version of the user they were built for, get only returns an entry of the given version."""
+
+    @abstractmethod
+    def get(self, key: str, version: int = 0) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float, version: int = 0):
+        pass
+
+    @abstractmethod
+    def delete(self, keys: list[str]):
+        pass
+
+
+class LRUProfileCache(ProfileCacheBackend):
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int = 0) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_version, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            if entry_version != version:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, version: int = 0):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > version:
+                return
+            self._entries[key] = (self.clock() + ttl_seconds, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: list[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseProfileCache(ProfileCacheBackend):
+    """Cache entries in the user_profile_cache table, shared by every worker. A read is a primary key lookup of the rendered
+    bytes instead of the user row, its relationships and the mapping.
+
+    The version of each user is kept in user_profile_cache_versions and increased on every update, entries built for an older
+    version are never returned and never replace a newer one."""
+
+    def __init__(self, session_factory=session_local):
+        self.session_factory = session_factory
+
+    def get(self, key: str, version: int = 0) -> Optional[bytes]:
+        with self.session_factory() as db:
+            return db.scalar(
+                select(UserProfileCacheEntry.value).where(
+                    UserProfileCacheEntry.cache_key == key, UserProfileCacheEntry.version == version, UserProfileCacheEntry.expires_at > datetime.now()
+                )
+            )
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, version: int = 0):
+        expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+        with self.session_factory() as db:
+            insert_statement = dialect_insert(db, UserProfileCacheEntry).values(cache_key=key, value=value, version=version, expires_at=expires_at)
+            db.execute(
+                insert_statement.on_conflict_do_update(
+                    index_elements=[UserProfileCacheEntry.cache_key],
+                    set_={"value": value, "version": version, "expires_at": expires_at},
+                    where=UserProfileCacheEntry.version <= version,
+                )
+            )
+            db.commit()
+
+    def get_version(self, user_id) -> int:
+        with self.session_factory() as db:
+            return db.scalar(select(UserProfileCacheVersion.version).where(UserProfileCacheVersion.user_id == str(user_id))) or 0
+
+    def increment_version(self, user_id):
+        with self.session_factory() as db:
+            insert_statement = dialect_insert(db, UserProfileCacheVersion).values(user_id=str(user_id), version=1)
+            db.execute(insert_statement.on_conflict_do_update(index_elements=[UserProfileCacheVersion.user_id], set_={"version": UserProfileCacheVersion.version + 1}))
+            db.commit()
+
+    def delete(self, keys: list[str]):
+        with self.session_factory() as db:
+            db.execute(delete(UserProfileCacheEntry).where(UserProfileCacheEntry.cache_key.in_(keys)))
+            db.commit()
+
+
+class ProfileCache:
+    """Rendered profile responses by user, kept in a local LRU and, when configured, in a shared backend.
+
+    With a shared backend the version of the user is read first, so a local entry built before an update made by another
+    worker is not served. Builds that started before an invalidation made by this worker don't fill the local layer."""
+
+    def __init__(
+        self,
+        local: ProfileCacheBackend,
+        shared: Optional[DatabaseProfileCache] = None,
+        ttl_seconds: float = Config.PROFILE_CACHE_TTL_SECONDS,
+        shared_ttl_seconds: float = Config.PROFILE_CACHE_SHARED_TTL_SECONDS,
+    ):
+        self.local = local
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self.shared_ttl_seconds = shared_ttl_seconds
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(user_id, profile: str) -> str:
+        return f"{user_id}:{profile}"
+
+    @staticmethod
+    def render(content: dict) -> bytes:
+        # Same encoding as JSONResponse, so cached and uncached responses are byte for byte equal
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    def get_or_build(self, user_id, profile: str, build: Callable[[], dict]) -> bytes:
+        key = self.get_key(user_id, profile)
+        generation = self._generation
+        version = self.shared.get_version(user_id) if self.shared is not None else 0
+        value = self.local.get(key, version)
+        if value is not None:
+            return value
+
+        if self.shared is not None:
+            value = self.shared.get(key, version)
+            if value is not None:
+                self._set_local(key, value, version, generation)
+                return value
+
+        value = self.render(build())
+        self._set_local(key, value, version, generation)
+        if self.shared is not None:
+            self.shared.set(key, value, self.shared_ttl_seconds, version)
+        return value
+
+    def _set_local(self, key: str, value: bytes, version: int, generation: int):
+        with self._lock:
+            if self._generation == generation:
+                self.local.set(key, value, self.ttl_seconds, version)
+
+    def invalidate(self, user_id):
+        keys = [self.get_key(user_id, profile) for profile in PROFILES]
+        with self._lock:
+            self._generation += 1
+            self.local.delete(keys)
+        if self.shared is not None:
+            self.shared.increment_version(user_id)
+            self.shared.delete(keys)
+
+
+def create_profile_cache(backend: str) -> ProfileCache:
+    if backend == "database":
+        return ProfileCache(LRUProfileCache(Config.PROFILE_CACHE_MAX_ENTRIES), DatabaseProfileCache())
+    # Invalidations of a memory cache only reach the worker that made the update, other workers would serve stale profiles
+    max_entries = Config.PROFILE_CACHE_MAX_ENTRIES if Config.WEB_CONCURRENCY <= 1 else 0
+    return ProfileCache(LRUProfileCache(max_entries))
+
+
+profile_cache = create_profile_cache(Config.PROFILE_CACHE_BACKEND)
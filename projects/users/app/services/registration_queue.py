@@ -0,0 +1,328 @@
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, update, delete, or_, and_, func
+
+from app.config.db import session_local
+from app.config.settings import Config
+from app.exceptions.exceptions import EntityExistsError
+from app.models.schemas.schema import UserCreate
+from app.models.users import UserRegistration, RegistrationStatus
+from app.security.passwords import PasswordManager
+
+
+@dataclass
+class PendingRegistration:
+    registration_id: UUID
+    user: dict
+    result: Optional[asyncio.Future] = field(default=None, repr=False)
+    user_created: Optional[dict] = None
+    error: Optional[Exception] = None
+
+    def resolve(self, user_created: dict):
+        self.user_created = user_created
+
+    def reject(self, error: Exception):
+        self.error = error
+
+    def reset(self):
+        self.user_created = None
+        self.error = None
+
+    def notify(self):
+        # The result is only local to the worker that received the registration, and the client may have disconnected already
+        if self.result is None or self.result.done():
+            return
+        if self.error:
+            self.result.set_exception(self.error)
+        else:
+            self.result.set_result(self.user_created)
+
+
+class RegistrationQueue(ABC):
+    """Registrations waiting to be inserted. Any consumer takes batches with get_batch and reports them with complete, or gives
+    them back with release when they could not be processed. The stream of each registration waits for its outcome with wait."""
+
+    def __init__(self):
+        self._loop = None
+
+    def _bind_loop(self):
+        # Futures and queues belong to the running loop, a new loop (e.g. a new test client) starts with fresh ones
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._reset_loop_state()
+        return loop
+
+    @staticmethod
+    async def _to_registration(user: UserCreate):
+        # Passwords are hashed before being queued, so a plain one is never stored
+        hashed_password = await PasswordManager.get_password_hash_async(user.password)
+        return {"first_name": user.first_name, "last_name": user.last_name, "email": user.email, "hashed_password": hashed_password}
+
+    @abstractmethod
+    def _reset_loop_state(self):
+        pass
+
+    @abstractmethod
+    async def submit(self, user: UserCreate) -> PendingRegistration:
+        pass
+
+    @abstractmethod
+    async def get_batch(self, max_size: int, max_wait_seconds: float) -> list[PendingRegistration]:
+        pass
+
+    @abstractmethod
+    async def depth(self) -> int:
+        pass
+
+    @abstractmethod
+    async def complete(self, pending_registrations: list[PendingRegistration]):
+        pass
+
+    @abstractmethod
+    async def release(self, pending_registrations: list[PendingRegistration]):
+        pass
+
+    @abstractmethod
+    async def wait(self, pending_registration: PendingRegistration) -> dict:
+        pass
+
+
+class InMemoryRegistrationQueue(RegistrationQueue):
+    """Queue local to the process, registrations are only batched by the worker that received them."""
+
+    def _reset_loop_state(self):
+        self._queue = asyncio.Queue()
+
+    def _get_queue(self) -> asyncio.Queue:
+        self._bind_loop()
+        return self._queue
+
+    async def submit(self, user: UserCreate) -> PendingRegistration:
+        registration = await self._to_registration(user)
+        pending_registration = PendingRegistration(uuid4(), registration, self._bind_loop().create_future())
+        self._get_queue().put_nowait(pending_registration)
+        return pending_registration
+
+    async def get_batch(self, max_size: int, max_wait_seconds: float) -> list[PendingRegistration]:
+        queue = self._get_queue()
+        batch = [await queue.get()]
+
+        # Once the first registration arrives, the batch is sent when full or when the deadline passes
+        deadline = asyncio.get_running_loop().time() + max_wait_seconds
+        while len(batch) < max_size:
+            if queue.empty():
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except TimeoutError:
+                    break
+            else:
+                batch.append(queue.get_nowait())
+        return batch
+
+    async def depth(self) -> int:
+        return self.qsize()
+
+    async def complete(self, pending_registrations: list[PendingRegistration]):
+        for pending_registration in pending_registrations:
+            pending_registration.notify()
+
+    async def release(self, pending_registrations: list[PendingRegistration]):
+        queue = self._get_queue()
+        for pending_registration in pending_registrations:
+            if pending_registration.result is None or not pending_registration.result.done():
+                pending_registration.reset()
+                queue.put_nowait(pending_registration)
+
+    async def wait(self, pending_registration: PendingRegistration) -> dict:
+        return await pending_registration.result
+
+    def qsize(self) -> int:
+        return self._get_queue().qsize()
+
+
+class DatabaseRegistrationQueue(RegistrationQueue):
+    """Queue stored in the user_registrations table and shared by every worker.
+
+    Batches are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never take the same registrations.
+    Claimed rows not completed within the claim timeout (e.g. the worker died) are claimed again. The worker that received a
+    registration is notified directly when it also claimed it, otherwise its stream polls the row until it's completed.
+    Queries are blocking, they run in a thread so the event loop keeps serving requests meanwhile.
+    """
+
+    def __init__(
+        self, session_factory=session_local, poll_seconds: float = Config.REGISTRATION_QUEUE_POLL_SECONDS, claim_timeout_seconds: float = Config.REGISTRATION_CLAIM_TIMEOUT_SECONDS
+    ):
+        super().__init__()
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+
+    def _reset_loop_state(self):
+        self._results = {}
+        self._claimed = set()
+        self._submitted = asyncio.Event()
+
+    async def submit(self, user: UserCreate) -> PendingRegistration:
+        registration = await self._to_registration(user)
+        pending_registration = PendingRegistration(uuid4(), registration, self._bind_loop().create_future())
+        await asyncio.to_thread(self._insert, pending_registration)
+
+        self._results[pending_registration.registration_id] = pending_registration.result
+        self._submitted.set()
+        return pending_registration
+
+    def _insert(self, pending_registration: PendingRegistration):
+        with self.session_factory() as db:
+            db.add(UserRegistration(registration_id=pending_registration.registration_id, **pending_registration.user))
+            db.commit()
+
+    def _claim(self, max_size: int):
+        now = datetime.now()
+        with self.session_factory() as db:
+            claimable = or_(
+                UserRegistration.status == RegistrationStatus.PENDING,
+                and_(UserRegistration.status == RegistrationStatus.PROCESSING, UserRegistration.claimed_at < now - timedelta(seconds=self.claim_timeout_seconds)),
+            )
+            registrations = db.scalars(select(UserRegistration).where(claimable).order_by(UserRegistration.created_at).limit(max_size).with_for_update(skip_locked=True)).all()
+            if not registrations:
+                db.rollback()
+                return []
+
+            db.execute(
+                update(UserRegistration)
+                .where(UserRegistration.registration_id.in_([registration.registration_id for registration in registrations]))
+                .values(status=RegistrationStatus.PROCESSING, claimed_at=now)
+            )
+            batch = [
+                PendingRegistration(
+                    registration.registration_id,
+                    {"first_name": registration.first_name, "last_name": registration.last_name, "email": registration.email, "hashed_password": registration.hashed_password},
+                )
+                for registration in registrations
+            ]
+            db.commit()
+            return batch
+
+    async def get_batch(self, max_size: int, max_wait_seconds: float) -> list[PendingRegistration]:
+        self._bind_loop()
+        while True:
+            self._submitted.clear()
+            batch = await asyncio.to_thread(self._claim, max_size)
+            if batch:
+                # Registrations received by this worker are answered through their future, their streams stop polling
+                for pending_registration in batch:
+                    pending_registration.result = self._results.get(pending_registration.registration_id)
+                    if pending_registration.result is not None:
+                        self._claimed.add(pending_registration.registration_id)
+                return batch
+            # Registrations received by this worker wake it up at once, the ones from other workers are seen on the next poll
+            try:
+                await asyncio.wait_for(self._submitted.wait(), self.poll_seconds)
+                await asyncio.sleep(max_wait_seconds)
+            except TimeoutError:
+                pass
+
+    async def depth(self) -> int:
+        return await asyncio.to_thread(self._count_pending)
+
+    def _count_pending(self) -> int:
+        with self.session_factory() as db:
+            return db.scalar(select(func.count()).select_from(UserRegistration).where(UserRegistration.status == RegistrationStatus.PENDING))
+
+    async def complete(self, pending_registrations: list[PendingRegistration]):
+        try:
+            await asyncio.to_thread(self._store_outcomes, pending_registrations)
+        finally:
+            # Local streams don't poll, they are answered even when the outcomes could not be stored
+            for pending_registration in pending_registrations:
+                pending_registration.notify()
+
+    def _store_outcomes(self, pending_registrations: list[PendingRegistration]):
+        now = datetime.now()
+        with self.session_factory() as db:
+            for pending_registration in pending_registrations:
+                if pending_registration.error:
+                    status = RegistrationStatus.EXISTS if isinstance(pending_registration.error, EntityExistsError) else RegistrationStatus.FAILED
+                    values = {"status": status}
+                else:
+                    values = {"status": RegistrationStatus.CREATED, "user_id": UUID(pending_registration.user_created["user_id"])}
+                db.execute(
+                    update(UserRegistration)
+                    .where(UserRegistration.registration_id == pending_registration.registration_id)
+                    .values(hashed_password=None, completed_at=now, **values)
+                )
+            # Outcomes nobody came back for, e.g. the client disconnected, are dropped after the retention window
+            db.execute(delete(UserRegistration).where(UserRegistration.completed_at < now - timedelta(seconds=Config.REGISTRATION_RETENTION_SECONDS)))
+            db.commit()
+
+    async def release(self, pending_registrations: list[PendingRegistration]):
+        await asyncio.to_thread(self._release, pending_registrations)
+        for pending_registration in pending_registrations:
+            pending_registration.reset()
+            self._claimed.discard(pending_registration.registration_id)
+
+    def _release(self, pending_registrations: list[PendingRegistration]):
+        # Only claims still held go back to pending, outcomes already stored are kept
+        with self.session_factory() as db:
+            db.execute(
+                update(UserRegistration)
+                .where(UserRegistration.registration_id.in_([pending_registration.registration_id for pending_registration in pending_registrations]))
+                .where(UserRegistration.status == RegistrationStatus.PROCESSING)
+                .values(status=RegistrationStatus.PENDING, claimed_at=None)
+            )
+            db.commit()
+
+    def _get_outcome(self, registration_id: UUID):
+        with self.session_factory() as db:
+            registration = db.get(UserRegistration, registration_id)
+            if registration is None or registration.status in (RegistrationStatus.PENDING, RegistrationStatus.PROCESSING):
+                return None
+            return {
+                "status": registration.status,
+                "user_id": str(registration.user_id),
+                "first_name": registration.first_name,
+                "last_name": registration.last_name,
+                "email": registration.email,
+            }
+
+    async def wait(self, pending_registration: PendingRegistration) -> dict:
+        try:
+            while True:
+                if pending_registration.registration_id in self._claimed:
+                    return await pending_registration.result
+                try:
+                    return await asyncio.wait_for(asyncio.shield(pending_registration.result), self.poll_seconds)
+                except TimeoutError:
+                    # Claimed by this worker meanwhile, the next iteration waits for the future instead of polling
+                    if pending_registration.registration_id in self._claimed:
+                        continue
+                    outcome = await asyncio.to_thread(self._get_outcome, pending_registration.registration_id)
+                    if outcome is None:
+                        continue
+                    if outcome["status"] == RegistrationStatus.EXISTS:
+                        raise EntityExistsError("User already exists")
+                    if outcome["status"] == RegistrationStatus.FAILED:
+                        raise Exception("User could not be created")
+                    del outcome["status"]
+                    return outcome
+        finally:
+            self._results.pop(pending_registration.registration_id, None)
+            self._claimed.discard(pending_registration.registration_id)
+
+
+def create_registration_queue(backend: str) -> RegistrationQueue:
+    if backend == "database":
+        return DatabaseRegistrationQueue()
+    return InMemoryRegistrationQueue()
+
+
+registration_queue = create_registration_queue(Config.REGISTRATION_QUEUE_BACKEND)
@@ -1,7 +1,6 @@
 from datetime import datetime, timedelta
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert
 
 from app.config.settings import Config
 from app.models.schemas.schema import SubscriptionPaymentStatus, UpdateSubscriptionTypeResponse, UpdateSubscriptionType, PremiumSportsmanAppointment
@@ -11,7 +10,8 @@ from app.models.mappers.user_mapper import DataClassMapper
 from app.exceptions.exceptions import NotFoundError, InvalidCredentialsError, PlanPaymentError
 from app.security.passwords import PasswordManager
 from app.services.external import ExternalServices
-from app.utils.utils import calculate_age
+from app.services.profile_cache import profile_cache
+from app.utils.utils import calculate_age, dialect_insert
 
 
 class UsersServiceHelpers:
@@ -48,20 +48,25 @@ class UsersService:
         self.db = db
         self.jwt_manager = JWTManager(Config.JWT_SECRET_KEY, Config.JWT_ALGORITHM, Config.ACCESS_TOKEN_EXPIRE_MINUTES, Config.REFRESH_TOKEN_EXPIRE_MINUTES)
         self.external_services = ExternalServices()
-
-    def create_users(self, users_create):
-        values_to_insert = []
-        for user_create in users_create:
-            user = user_create.model_dump()
-            user["hashed_password"] = PasswordManager.get_password_hash(user["password"])
-            del user["password"]
-            values_to_insert.append(user)
-        if not values_to_insert:
-            return []
-        insert_statement = insert(User).values(values_to_insert).returning(User.user_id, User.first_name, User.last_name, User.email)
-        created_users = self.db.execute(insert_statement).fetchall()
+        self.profile_cache = profile_cache
+
+    def create_users(self, users_to_create: list[dict]):
+        # Registrations come with the password already hashed. Emails already taken, or repeated in the batch, are skipped
+        # by the insert itself and reported back as conflicting
+        if not users_to_create:
+            return [], []
+        insert_statement = (
+            dialect_insert(self.db, User)
+            .values(users_to_create)
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User.user_id, User.first_name, User.last_name, User.email)
+        )
+        created_users = [UsersServiceHelpers.create_user_dict(user) for user in self.db.execute(insert_statement).fetchall()]
         self.db.commit()
-        return [UsersServiceHelpers.create_user_dict(user) for user in created_users]
+
+        created_emails = {user["email"] for user in created_users}
+        conflicting_emails = [user["email"] for user in users_to_create if user["email"] not in created_emails]
+        return created_users, conflicting_emails
 
     def complete_user_registration(self, user_id, user_additional_information):
         user = self.db.query(User).filter(User.user_id == user_id).first()
@@ -79,26 +84,26 @@ class UsersService:
         user.birth_date = user_additional_information.birth_date
 
         self.db.commit()
+        self.profile_cache.invalidate(user.user_id)
 
         return DataClassMapper.to_dict(user)
 
-    def authenticate_user(self, user_credentials):
+    async def authenticate_user(self, user_credentials):
         if user_credentials.refresh_token:
             return self._process_refresh_token_login(user_credentials.refresh_token)
         else:
-            return self._process_email_password_login(user_credentials.email, user_credentials.password)
+            return await self._process_email_password_login(user_credentials.email, user_credentials.password)
+
+    # Profiles are returned as rendered JSON, repeated reads are served from the cache without loading the user
 
     def get_user_personal_information(self, user_id):
-        user = self.get_user_by_id(user_id)
-        return DataClassMapper.to_user_personal_profile(user)
+        return self.profile_cache.get_or_build(user_id, "personal", lambda: DataClassMapper.to_user_personal_profile(self.get_user_by_id(user_id)))
 
     def get_user_sports_information(self, user_id):
-        user = self.get_user_by_id(user_id)
-        return DataClassMapper.to_user_sports_profile(user)
+        return self.profile_cache.get_or_build(user_id, "sports", lambda: DataClassMapper.to_user_sports_profile(self.get_user_by_id(user_id)))
 
     def get_user_nutritional_information(self, user_id):
-        user = self.get_user_by_id(user_id)
-        return DataClassMapper.to_user_nutritional_profile(user)
+        return self.profile_cache.get_or_build(user_id, "nutritional", lambda: DataClassMapper.to_user_nutritional_profile(self.get_user_by_id(user_id)))
 
     # noinspection PyMethodMayBeStatic
     def get_nutritional_limitations(self):
@@ -111,6 +116,7 @@ class UsersService:
             setattr(user, field, getattr(personal_profile, field))
 
         self.db.commit()
+        self.profile_cache.invalidate(user.user_id)
 
         if self._should_create_nutritional_plan(user):
             self.generate_nutritional_plan(user)
@@ -131,6 +137,7 @@ class UsersService:
                 raise NotFoundError(f"Nutritional limitation with id {limitation_id} not found")
 
         self.db.commit()
+        self.profile_cache.invalidate(user.user_id)
 
         if self._should_create_nutritional_plan(user):
             self.generate_nutritional_plan(user)
@@ -154,6 +161,7 @@ class UsersService:
         should_update_training_plan = user.training_objective and user.available_training_hours and user.available_weekdays and user.preferred_training_start_time
 
         self.db.commit()
+        self.profile_cache.invalidate(user.user_id)
 
         if should_update_training_plan:
             self.external_services.create_training_plan(user.user_id, DataClassMapper.to_training_plan_create(user), self.user_token)
@@ -177,6 +185,7 @@ class UsersService:
             user.subscription_start_date = None
             user.subscription_end_date = None
             self.db.commit()
+            self.profile_cache.invalidate(user.user_id)
             return DataClassMapper.to_dict(UpdateSubscriptionTypeResponse(status=SubscriptionPaymentStatus.SUCCESS, message="Subscription updated successfully"), pydantic=True)
         else:
             payment_approved, error = self.external_services.process_payment(update_subscription_type.payment_data)
@@ -186,6 +195,7 @@ class UsersService:
                 user.subscription_start_date = datetime.now()
                 user.subscription_end_date = user.subscription_start_date + timedelta(days=30)
                 self.db.commit()
+                self.profile_cache.invalidate(user.user_id)
                 response = UpdateSubscriptionTypeResponse(
                     status=SubscriptionPaymentStatus.SUCCESS,
                     message="Subscription updated successfully",
@@ -244,14 +254,19 @@ class UsersService:
             ],
         )
 
-    def _process_email_password_login(self, user_credentials_email, user_credentials_password):
+    async def _process_email_password_login(self, user_credentials_email, user_credentials_password):
         user = self.db.query(User).filter(User.email == user_credentials_email).first()
         if not user:
             raise InvalidCredentialsError("Invalid email or password")
 
-        if not PasswordManager.verify_password(user_credentials_password, user.hashed_password):
+        if not await PasswordManager.verify_password_async(user_credentials_password, user.hashed_password):
             raise InvalidCredentialsError("Invalid email or password")
 
+        # Legacy SHA-256 hashes, or hashes with fewer rounds than configured, are upgraded while the password is known
+        if PasswordManager.needs_rehash(user.hashed_password):
+            user.hashed_password = await PasswordManager.get_password_hash_async(user_credentials_password)
+            self.db.commit()
+
         return self.jwt_manager.generate_tokens(user.user_id, user.subscription_type)
 
     def _process_refresh_token_login(self, refresh_token):
@@ -1,19 +1,73 @@
+import asyncio
+
 from app.config.settings import Config
-from app.models.users import User
+from app.exceptions.exceptions import EntityExistsError
 from app.services.users import UsersService
-from app.utils.user_cache import UserCache
+from app.services.registration_queue import registration_queue, PendingRegistration
+
+
+def get_batch_size(queue_depth: int) -> int:
+    # Small batches keep sign-ups fast when traffic is low, a backlog is drained with fewer and larger inserts
+    return min(max(queue_depth, Config.REGISTRATION_MIN_BATCH_SIZE), Config.REGISTRATION_MAX_BATCH_SIZE)
+
+
+def process_registrations(db, pending_registrations: list[PendingRegistration]):
+    # The first registration of each email is inserted, later ones in the same batch are reported as existing
+    registrations_by_email = {}
+    for pending_registration in pending_registrations:
+        if pending_registration.user["email"] in registrations_by_email:
+            pending_registration.reject(EntityExistsError("User already exists"))
+        else:
+            registrations_by_email[pending_registration.user["email"]] = pending_registration
 
+    try:
+        users_created, conflicting_emails = UsersService(db).create_users([pending_registration.user for pending_registration in registrations_by_email.values()])
+    except Exception as e:
+        # A failed batch must not leave its streams waiting forever nor stop the task
+        db.rollback()
+        for pending_registration in registrations_by_email.values():
+            pending_registration.reject(e)
+        return
 
-async def sync_users(db, sleep):
+    for user_created in users_created:
+        registrations_by_email[user_created["email"]].resolve(user_created)
+    for email in conflicting_emails:
+        registrations_by_email[email].reject(EntityExistsError("User already exists"))
+
+
+async def release_registrations(queue, pending_registrations: list[PendingRegistration]):
+    try:
+        await queue.release(pending_registrations)
+    except Exception as e:
+        # Claims that could not be released are taken again once the claim timeout passes
+        print(f"Error releasing registrations: {e}")
+
+
+async def sync_users(db, queue=registration_queue):
+    retry_seconds = Config.REGISTRATION_RETRY_MIN_SECONDS
+    processed_registrations = []
     while Config.SYNC_USERS:
-        if UserCache.users:
-            process_users = UserCache.users[: Config.TOTAL_USERS_BY_RUN]
-            repeated_users = db.query(User).filter(User.email.in_([user.email for user in process_users])).all()
-            for user in repeated_users:
-                UserCache.users_with_errors_by_email_map[user.email] = user
-
-            users_to_save = [user for user in process_users if user.email not in [repeated_user.email for repeated_user in repeated_users]]
-            users_created = UsersService(db).create_users(users_to_save)
-            UserCache.users = UserCache.users[Config.TOTAL_USERS_BY_RUN :]
-            UserCache.users_success_by_email_map.update({user["email"]: user for user in users_created})
-        await sleep(1)
+        pending_registrations = []
+        try:
+            # Outcomes of a batch already inserted are stored again rather than inserting the batch twice
+            if processed_registrations:
+                await queue.complete(processed_registrations)
+                processed_registrations = []
+                retry_seconds = Config.REGISTRATION_RETRY_MIN_SECONDS
+                continue
+
+            batch_size = get_batch_size(await queue.depth())
+            pending_registrations = await queue.get_batch(batch_size, Config.REGISTRATION_BATCH_WAIT_SECONDS)
+            process_registrations(db, pending_registrations)
+            processed_registrations = pending_registrations
+            await queue.complete(pending_registrations)
+            processed_registrations = []
+            retry_seconds = Config.REGISTRATION_RETRY_MIN_SECONDS
+        except Exception as e:
+            # The task must keep running, otherwise every later registration waits forever
+            print(f"Error syncing users: {e}")
+            db.rollback()
+            if pending_registrations and not processed_registrations:
+                await release_registrations(queue, pending_registrations)
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, Config.REGISTRATION_RETRY_MAX_SECONDS)
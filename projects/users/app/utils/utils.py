@@ -2,6 +2,9 @@ import asyncio
 import math
 from datetime import datetime
 
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
 
 async def async_sleep(seconds):
     if seconds < 0:
@@ -9,6 +12,13 @@ async def async_sleep(seconds):
     return await asyncio.sleep(seconds)
 
 
+def dialect_insert(db: Session, model):
+    # ON CONFLICT clauses are dialect specific, SQLite is only used by the test mode
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
 def calculate_bmi(weight, height):
     if height == 0:
         return 0
@@ -8,8 +8,8 @@ from fastapi.responses import JSONResponse
 from app.routes import users_routes
 from app.exceptions.exceptions import NotFoundError, InvalidValueError, InvalidCredentialsError, EntityExistsError, PlanPaymentError, ExternalServiceError
 from app.config.db import engine, base, session_local
+from app.security.passwords import PasswordManager
 from app.tasks.sync_db import sync_users
-from app.utils.utils import async_sleep
 
 load_dotenv()
 app = FastAPI()
@@ -23,12 +23,24 @@ app.include_router(users_routes.router)
 @app.on_event("startup")
 async def startup_event():
     try:
-        asyncio.create_task(sync_users(db=session_local(), sleep=async_sleep))
+        app.state.sync_users_db = session_local()
+        app.state.sync_users_task = asyncio.create_task(sync_users(db=app.state.sync_users_db))
     except Exception as e:
         print(f"Error creating task: {e}")
         raise e
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.sync_users_task.cancel()
+    try:
+        await app.state.sync_users_task
+    except asyncio.CancelledError:
+        pass
+    app.state.sync_users_db.close()
+    PasswordManager.shutdown()
+
+
 @app.exception_handler(NotFoundError)
 async def not_found_error_handler(request, exc):
     return JSONResponse(status_code=404, content={"message": str(exc)})
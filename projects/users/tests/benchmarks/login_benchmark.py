@@ -0,0 +1,124 @@
+"""
+Measures email and password logins per second, and per core, against the in process app for several hashing pool sizes.
+While logins run, /ping is called in a loop to show how long the event loop is held up by password hashing.
+
+Run from projects/users with: python -m tests.benchmarks.login_benchmark --logins 200 --concurrency 32 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+from tests.benchmarks.stats import percentile
+
+USERS_BASE_URL = "/users"
+PASSWORD = "Benchmark1234!"
+
+
+def create_user(app, hashed_password: str):
+    from app.config.db import base, get_db
+    from app.models.users import User
+
+    # Tests override the database of the app, the user has to be created wherever the login route will look for it
+    db_generator = app.dependency_overrides.get(get_db, get_db)()
+    db = next(db_generator)
+    try:
+        base.metadata.create_all(bind=db.get_bind())
+        email = f"benchmark-{uuid.uuid4()}@sportapp.com"
+        db.add(User(email=email, first_name="Benchmark", last_name="User", hashed_password=hashed_password))
+        db.commit()
+        return email
+    finally:
+        db_generator.close()
+
+
+async def ping_while(client: httpx.AsyncClient, running: asyncio.Event):
+    latencies = []
+    while not running.is_set():
+        started = time.perf_counter()
+        await client.get("/ping")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run_logins(logins: int, concurrency: int, workers: int, rounds: int):
+    os.environ.setdefault("DB_DRIVER", "test")
+    from app.config.settings import Config
+    from app.security.passwords import PasswordManager
+    from main import app
+
+    settings = Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_ROUNDS
+    Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_ROUNDS = workers, rounds
+    PasswordManager.shutdown()
+    try:
+        email = create_user(app, PasswordManager.get_password_hash(PASSWORD))
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://users") as client:
+
+            async def login():
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(f"{USERS_BASE_URL}/login", json={"email": email, "password": PASSWORD})
+                    latencies.append(time.perf_counter() - started)
+                    errors += not response.is_success
+
+            done = asyncio.Event()
+            pings = asyncio.create_task(ping_while(client, done))
+            started = time.perf_counter()
+            await asyncio.gather(*(login() for _ in range(logins)))
+            elapsed = time.perf_counter() - started
+            done.set()
+            ping_latencies = sorted(await pings)
+    finally:
+        PasswordManager.shutdown()
+        Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_ROUNDS = settings
+
+    latencies = sorted(latencies)
+    cores = min(workers, os.cpu_count() or 1)
+    return {
+        "workers": workers,
+        "logins": logins,
+        "errors": errors,
+        "logins_per_second": logins / elapsed,
+        "logins_per_second_per_core": logins / elapsed / cores,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "ping_p95_ms": percentile(ping_latencies, 0.95) * 1000 if ping_latencies else None,
+    }
+
+
+async def run_benchmark(logins: int, concurrency: int, workers: list[int], rounds: int):
+    return [await run_logins(logins, concurrency, pool_size, rounds) for pool_size in workers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16, help="logins in flight at the same time")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="hashing pool sizes to compare")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run_benchmark(args.logins, args.concurrency, args.workers, args.rounds))
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, bcrypt rounds {args.rounds}, {os.cpu_count()} cores")
+    print(f"  {'workers':<9}{'errors':>8}{'logins/s':>10}{'per core':>10}{'p50 ms':>9}{'p95 ms':>9}{'ping p95':>10}")
+    for row in rows:
+        ping = f"{row['ping_p95_ms']:10.1f}" if row["ping_p95_ms"] is not None else f"{'n/a':>10}"
+        print(
+            f"  {row['workers']:<9}{row['errors']:>8}{row['logins_per_second']:>10.1f}{row['logins_per_second_per_core']:>10.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{ping}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import pytest
+
+from tests.benchmarks.login_benchmark import run_benchmark
+from tests.benchmarks.stats import percentile
+
+
+@pytest.mark.asyncio
+async def test_run_benchmark_should_report_every_pool_size():
+    rows = await run_benchmark(logins=6, concurrency=3, workers=[1, 2], rounds=4)
+
+    assert [row["workers"] for row in rows] == [1, 2]
+    assert all(row["errors"] == 0 for row in rows)
+    assert all(row["logins_per_second"] > 0 for row in rows)
+    assert all(row["logins_per_second_per_core"] <= row["logins_per_second"] for row in rows)
+
+
+def test_percentile():
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([], 0.5) is None
@@ -1,3 +1,4 @@
+import hashlib
 import json
 from asyncio import get_event_loop
 from datetime import timedelta
@@ -214,6 +215,31 @@ async def test_authenticate_user_email_password(test_db):
         assert response_json["refresh_token_expires_minutes"] == Config.REFRESH_TOKEN_EXPIRE_MINUTES
 
 
+@pytest.mark.asyncio
+async def test_authenticate_user_email_password_rehashes_legacy_hash(test_db):
+    async with TestClient(app) as client:
+        helper_db = TestingSessionLocal()
+        user_data = generate_random_user_create_data(fake)
+        created_user = User(
+            email=user_data.email,
+            first_name=user_data.first_name,
+            last_name=user_data.last_name,
+            hashed_password=hashlib.sha256(user_data.password.encode()).hexdigest(),
+        )
+        helper_db.add(created_user)
+        helper_db.commit()
+
+        response = await client.post(f"{Constants.USERS_BASE_PATH}/login", json={"email": user_data.email, "password": user_data.password})
+        helper_db.refresh(created_user)
+
+        assert response.status_code == HTTPStatus.OK
+        assert not PasswordManager.is_legacy_hash(created_user.hashed_password)
+        assert PasswordManager.verify_password(user_data.password, created_user.hashed_password)
+
+        second_response = await client.post(f"{Constants.USERS_BASE_PATH}/login", json={"email": user_data.email, "password": user_data.password})
+        assert second_response.status_code == HTTPStatus.OK
+
+
 @pytest.mark.asyncio
 async def test_authenticate_user_email_password_wrong_password(test_db):
     async with TestClient(app) as client:
@@ -470,6 +496,29 @@ async def test_get_users_nutritional_limitations(test_db):
         assert response_json[1]["description"] == nutritional_limitation_2.description
 
 
+@pytest.mark.asyncio
+async def test_get_user_personal_profile_after_update(test_db, mocker):
+    async with TestClient(app) as client:
+        helper_db = TestingSessionLocal()
+        user_created = generate_random_user(fake)
+        helper_db.add(user_created)
+        helper_db.commit()
+        mocker.patch("app.services.external.ExternalServices.create_nutritional_plan")
+        client.headers["user-id"] = str(user_created.user_id)
+
+        first_response = await client.get(f"{Constants.USERS_BASE_PATH}/profiles/personal")
+        second_response = await client.get(f"{Constants.USERS_BASE_PATH}/profiles/personal")
+        new_first_name = fake.first_name()
+        await client.patch(f"{Constants.USERS_BASE_PATH}/profiles/personal", json={"first_name": new_first_name})
+        updated_response = await client.get(f"{Constants.USERS_BASE_PATH}/profiles/personal")
+
+        assert first_response.status_code == HTTPStatus.OK
+        assert Constants.APPLICATION_JSON in first_response.headers["content-type"]
+        assert first_response.content == second_response.content
+        assert first_response.json()["first_name"] == user_created.first_name
+        assert updated_response.json()["first_name"] == new_first_name
+
+
 @pytest.mark.asyncio
 async def test_update_user_personal_profile(test_db, mocker):
     async with TestClient(app) as client:
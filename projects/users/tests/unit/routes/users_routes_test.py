@@ -1,3 +1,4 @@
+import asyncio
 import json
 import unittest
 
@@ -5,9 +6,10 @@ from unittest.mock import patch, MagicMock
 
 from faker import Faker
 
+from app.exceptions.exceptions import EntityExistsError
 from app.models.schemas.schema import UserAdditionalInformation, UserCreate, UserCredentials
 from app.routes import users_routes
-from app.utils.user_cache import UserCache
+from app.services.registration_queue import InMemoryRegistrationQueue
 from app.models.users import UserIdentificationType, Gender, TrainingObjective, FoodPreference, PremiumAppointmentType
 from tests.utils.users_util import (
     generate_random_user_personal_profile,
@@ -22,9 +24,10 @@ fake = Faker()
 
 class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
-        UserCache.users = []
-        UserCache.users_with_errors_by_email_map = {}
-        UserCache.users_success_by_email_map = {}
+        self.registration_queue = InMemoryRegistrationQueue()
+        patcher = patch("app.routes.users_routes.registration_queue", self.registration_queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     async def test_register_user(self):
         first_name = fake.first_name()
@@ -36,27 +39,29 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
 
         user_create = UserCreate(**user_data)
 
-        user_data["user_id"] = fake.uuid4()
-        UserCache.users_success_by_email_map = {email: user_data}
         response = await users_routes.register_user(user_create)
         async_gen = response.body_iterator
 
-        async for data in async_gen:
-            json_data = json.loads(data.strip())
-            self.assertEqual(json_data["status"], "success")
-            self.assertEqual(json_data["message"], "User created")
-            self.assertEqual(json_data["data"]["id"], user_data["user_id"])
-            self.assertEqual(json_data["data"]["email"], email)
-            self.assertEqual(json_data["data"]["first_name"], first_name)
-            self.assertEqual(json_data["data"]["last_name"], last_name)
-            break
-
-        self.assertEqual(len(UserCache.users), 1)
-        self.assertEqual(UserCache.users[0].first_name, first_name)
-        self.assertEqual(UserCache.users[0].last_name, last_name)
-        self.assertEqual(UserCache.users[0].email, email)
-        self.assertEqual(UserCache.users[0].password, password)
-        self.assertEqual(len(UserCache.users_success_by_email_map), 0)
+        processing_response = json.loads(await anext(async_gen))
+        self.assertEqual(processing_response, {"status": "processing", "message": "Processing..."})
+
+        pending_registration = (await self.registration_queue.get_batch(1, 0))[0]
+        self.assertEqual(pending_registration.user["email"], email)
+        self.assertNotIn("password", pending_registration.user)
+
+        user_data["user_id"] = fake.uuid4()
+        pending_registration.resolve(user_data)
+        await self.registration_queue.complete([pending_registration])
+        json_data = json.loads(await anext(async_gen))
+
+        self.assertEqual(json_data["status"], "success")
+        self.assertEqual(json_data["message"], "User created")
+        self.assertEqual(json_data["data"]["id"], user_data["user_id"])
+        self.assertEqual(json_data["data"]["email"], email)
+        self.assertEqual(json_data["data"]["first_name"], first_name)
+        self.assertEqual(json_data["data"]["last_name"], last_name)
+        with self.assertRaises(StopAsyncIteration):
+            await anext(async_gen)
 
     async def test_register_user_email_repeated(self):
         first_name = fake.first_name()
@@ -68,24 +73,32 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
 
         user_create = UserCreate(**user_data)
 
-        UserCache.users_with_errors_by_email_map = {email: user_data}
         response = await users_routes.register_user(user_create)
         async_gen = response.body_iterator
+        await anext(async_gen)
+
+        pending_registration = (await self.registration_queue.get_batch(1, 0))[0]
+        pending_registration.reject(EntityExistsError("User already exists"))
+        await self.registration_queue.complete([pending_registration])
+        json_data = json.loads(await anext(async_gen))
 
-        error_response = {"status": "error", "message": "User already exists"}
+        self.assertEqual(json_data, {"status": "error", "message": "User already exists"})
+        with self.assertRaises(StopAsyncIteration):
+            await anext(async_gen)
 
-        async for data in async_gen:
-            json_data = json.loads(data.strip())
-            self.assertEqual(json_data["status"], error_response["status"])
-            self.assertEqual(json_data["message"], error_response["message"])
-            break
+    async def test_register_user_error(self):
+        user_create = UserCreate(first_name=fake.first_name(), last_name=fake.last_name(), email=fake.email(), password=f"{fake.password()}A123!")
 
-        self.assertEqual(len(UserCache.users), 1)
-        self.assertEqual(UserCache.users[0].first_name, first_name)
-        self.assertEqual(UserCache.users[0].last_name, last_name)
-        self.assertEqual(UserCache.users[0].email, email)
-        self.assertEqual(UserCache.users[0].password, password)
-        self.assertEqual(len(UserCache.users_with_errors_by_email_map), 0)
+        response = await users_routes.register_user(user_create)
+        async_gen = response.body_iterator
+        await anext(async_gen)
+
+        pending_registration = (await self.registration_queue.get_batch(1, 0))[0]
+        pending_registration.reject(Exception("Database error"))
+        await self.registration_queue.complete([pending_registration])
+        json_data = json.loads(await anext(async_gen))
+
+        self.assertEqual(json_data, {"status": "error", "message": "User could not be created"})
 
     async def test_register_user_processing(self):
         first_name = fake.first_name()
@@ -99,23 +112,18 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
 
         response = await users_routes.register_user(user_create)
         async_gen = response.body_iterator
-        max_loops = 3
 
         processing_response = {"status": "processing", "message": "Processing..."}
+        json_data = json.loads(await anext(async_gen))
+        self.assertEqual(json_data, processing_response)
+
+        # Nothing else is sent until the registration is resolved
+        next_event = asyncio.ensure_future(anext(async_gen))
+        await asyncio.sleep(0.01)
+        self.assertFalse(next_event.done())
+        next_event.cancel()
 
-        async for data in async_gen:
-            json_data = json.loads(data.strip())
-            self.assertEqual(json_data["status"], processing_response["status"])
-            self.assertEqual(json_data["message"], processing_response["message"])
-            max_loops -= 1
-            if max_loops == 0:
-                break
-        self.assertEqual(UserCache.users[0].first_name, first_name)
-        self.assertEqual(UserCache.users[0].last_name, last_name)
-        self.assertEqual(UserCache.users[0].email, email)
-        self.assertEqual(UserCache.users[0].password, password)
-        self.assertEqual(len(UserCache.users_success_by_email_map), 0)
-        self.assertEqual(len(UserCache.users_with_errors_by_email_map), 0)
+        self.assertEqual(self.registration_queue.qsize(), 1)
 
     @patch("app.services.users.UsersService.complete_user_registration")
     async def test_complete_user_registration(self, complete_user_registration):
@@ -218,13 +226,14 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
             "birth_date": fake.date_of_birth(minimum_age=18).strftime("%Y-%m-%d"),
         }
 
-        get_user_personal_information_mock.return_value = user_data
+        get_user_personal_information_mock.return_value = json.dumps(user_data).encode()
 
         db = MagicMock()
         response = await users_routes.get_user_personal_information(user_id, db)
         response_body = json.loads(response.body)
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.media_type, "application/json")
         get_user_personal_information_mock.assert_called_once_with(user_id)
         self.assertEqual(response_body, user_data)
 
@@ -241,7 +250,7 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
             "preferred_training_start_time": fake.time("%H:%M:%S"),
         }
 
-        get_user_sports_information_mock.return_value = user_sports_profile_data
+        get_user_sports_information_mock.return_value = json.dumps(user_sports_profile_data).encode()
 
         db = MagicMock()
         response = await users_routes.get_user_sports_information(user_id, db)
@@ -259,7 +268,7 @@ class TestUsersRoutes(unittest.IsolatedAsyncioTestCase):
             "nutritional_limitations": [str(fake.uuid4()) for _ in range(fake.random_int(min=1, max=5))],
         }
 
-        get_user_nutritional_information_mock.return_value = user_sports_profile_data
+        get_user_nutritional_information_mock.return_value = json.dumps(user_sports_profile_data).encode()
 
         db = MagicMock()
         response = await users_routes.get_user_nutritional_information(user_id, db)
@@ -1,52 +1,74 @@
-import json
+import hashlib
 import unittest
 
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 from faker import Faker
+
+from app.config.settings import Config
 from app.security.passwords import PasswordManager
 
 fake = Faker()
 
 
-def fake_encode_function(payload, secret, algorithm):
-    return json.dumps({"payload": payload, "secret": secret, "algorithm": algorithm})
+class TestPasswordManager(unittest.TestCase):
+    def test_hash_password(self):
+        fake_password = f"{fake.password()}A123!"
 
+        hashed_password = PasswordManager.get_password_hash(fake_password)
 
-def fake_decode_function(token, _, _2):
-    return json.loads(token)
+        self.assertTrue(hashed_password.startswith("$2"))
+        self.assertNotEqual(hashed_password, PasswordManager.get_password_hash(fake_password))
+        self.assertTrue(PasswordManager.verify_password(fake_password, hashed_password))
 
+    @patch("bcrypt.gensalt")
+    @patch("bcrypt.hashpw")
+    def test_hash_password_truncates_long_passwords(self, mock_hashpw, mock_gensalt):
+        mock_hashpw.return_value = b"$2b$04$hashed"
 
-class TestPasswordManager(unittest.TestCase):
-    @patch("hashlib.sha256")
-    def test_hash_password(self, mock_sha256):
-        fake_password = fake.word()
-        fake_hashed_password = f"hashed-{fake_password}"
-        sha256_mock = MagicMock()
-        mock_sha256.return_value = sha256_mock
-        sha256_mock.update.return_value = None
-        sha256_mock.hexdigest.return_value = fake_hashed_password
+        PasswordManager.get_password_hash("a" * 100)
 
-        hashed_password = PasswordManager.get_password_hash(fake_password)
-        self.assertEqual(hashed_password, fake_hashed_password)
-
-    @patch("hashlib.sha256")
-    def test_verify_password(self, mock_sha256):
-        fake_password = fake.word()
-        fake_hashed_password = f"hashed-{fake_password}"
-        sha256_mock = MagicMock()
-        mock_sha256.return_value = sha256_mock
-        sha256_mock.update.return_value = None
-        sha256_mock.hexdigest.return_value = fake_hashed_password
-
-        is_valid = PasswordManager.verify_password(fake_password, fake_hashed_password)
-        self.assertTrue(is_valid)
-
-    @patch("bcrypt.checkpw")
-    def test_verify_password_invalid(self, mock_checkpw):
-        fake_password = fake.word()
-        fake_hashed_password = fake.word()
-        mock_checkpw.return_value = False
-
-        is_valid = PasswordManager.verify_password(fake_password, fake_hashed_password)
+        self.assertEqual(mock_hashpw.call_args[0][0], b"a" * 72)
+        mock_gensalt.assert_called_once_with(rounds=Config.PASSWORD_HASH_ROUNDS)
+
+    def test_verify_password_invalid(self):
+        hashed_password = PasswordManager.get_password_hash(f"{fake.password()}A123!")
+
+        is_valid = PasswordManager.verify_password(fake.word(), hashed_password)
         self.assertFalse(is_valid)
+
+    def test_verify_legacy_password(self):
+        fake_password = f"{fake.password()}A123!"
+        legacy_hash = hashlib.sha256(fake_password.encode()).hexdigest()
+
+        self.assertTrue(PasswordManager.verify_password(fake_password, legacy_hash))
+        self.assertFalse(PasswordManager.verify_password(fake.word(), legacy_hash))
+
+    def test_needs_rehash(self):
+        legacy_hash = hashlib.sha256(fake.word().encode()).hexdigest()
+        hashed_password = PasswordManager.get_password_hash(fake.word())
+
+        self.assertTrue(PasswordManager.needs_rehash(legacy_hash))
+        self.assertFalse(PasswordManager.needs_rehash(hashed_password))
+        with patch.object(Config, "PASSWORD_HASH_ROUNDS", Config.PASSWORD_HASH_ROUNDS + 1):
+            self.assertTrue(PasswordManager.needs_rehash(hashed_password))
+
+
+class TestPasswordManagerAsync(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        PasswordManager.shutdown()
+
+    async def test_hash_and_verify_password_async(self):
+        fake_password = f"{fake.password()}A123!"
+
+        hashed_password = await PasswordManager.get_password_hash_async(fake_password)
+
+        self.assertTrue(await PasswordManager.verify_password_async(fake_password, hashed_password))
+        self.assertFalse(await PasswordManager.verify_password_async(fake.word(), hashed_password))
+
+    async def test_pool_is_bounded(self):
+        with patch.object(Config, "PASSWORD_HASH_WORKERS", 2):
+            PasswordManager.shutdown()
+            await PasswordManager.get_password_hash_async(fake.word())
+
+            self.assertEqual(PasswordManager._get_executor()._max_workers, 2)
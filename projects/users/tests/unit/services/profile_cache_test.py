@@ -0,0 +1,214 @@
+import json
+import unittest
+
+import faker
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+from app.config.db import base
+from app.config.settings import Config
+from app.services.profile_cache import LRUProfileCache, DatabaseProfileCache, ProfileCache, create_profile_cache
+
+fake = faker.Faker()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LRUProfileCache(max_entries=2, clock=self.clock)
+
+    def test_get_set(self):
+        self.cache.set("key", b"value", 10)
+
+        self.assertEqual(self.cache.get("key"), b"value")
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_get_expired(self):
+        self.cache.set("key", b"value", 10)
+        self.clock.now = 10
+
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_set_evicts_least_recently_used(self):
+        self.cache.set("first", b"1", 10)
+        self.cache.set("second", b"2", 10)
+        self.cache.get("first")
+
+        self.cache.set("third", b"3", 10)
+
+        self.assertEqual(self.cache.get("first"), b"1")
+        self.assertIsNone(self.cache.get("second"))
+        self.assertEqual(self.cache.get("third"), b"3")
+
+    def test_delete(self):
+        self.cache.set("key", b"value", 10)
+
+        self.cache.delete(["key", "missing"])
+
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_get_other_version(self):
+        self.cache.set("key", b"value", 10, version=1)
+
+        self.assertIsNone(self.cache.get("key", version=2))
+
+    def test_set_older_version(self):
+        self.cache.set("key", b"updated", 10, version=2)
+        self.cache.set("key", b"stale", 10, version=1)
+
+        self.assertEqual(self.cache.get("key", version=2), b"updated")
+
+    def test_disabled(self):
+        cache = LRUProfileCache(max_entries=0)
+
+        cache.set("key", b"value", 10)
+
+        self.assertIsNone(cache.get("key"))
+
+
+class TestDatabaseProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        base.metadata.create_all(bind=self.engine)
+        self.cache = DatabaseProfileCache(sessionmaker(autocommit=False, autoflush=False, bind=self.engine))
+
+    def tearDown(self):
+        base.metadata.drop_all(bind=self.engine)
+
+    def test_get_set(self):
+        self.cache.set("key", b"value", 10)
+        self.cache.set("key", b"updated", 10)
+
+        self.assertEqual(self.cache.get("key"), b"updated")
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_get_expired(self):
+        self.cache.set("key", b"value", -1)
+
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_delete(self):
+        self.cache.set("key", b"value", 10)
+
+        self.cache.delete(["key"])
+
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_set_older_version(self):
+        self.cache.set("key", b"updated", 10, version=2)
+        self.cache.set("key", b"stale", 10, version=1)
+
+        self.assertEqual(self.cache.get("key", version=2), b"updated")
+        self.assertIsNone(self.cache.get("key", version=1))
+
+    def test_increment_version(self):
+        user_id = fake.uuid4()
+
+        self.assertEqual(self.cache.get_version(user_id), 0)
+        self.cache.increment_version(user_id)
+        self.cache.increment_version(user_id)
+
+        self.assertEqual(self.cache.get_version(user_id), 2)
+
+
+class TestProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        base.metadata.create_all(bind=self.engine)
+        self.shared = DatabaseProfileCache(sessionmaker(autocommit=False, autoflush=False, bind=self.engine))
+        self.cache = ProfileCache(LRUProfileCache(max_entries=100), self.shared, ttl_seconds=10, shared_ttl_seconds=60)
+        self.user_id = fake.uuid4()
+        self.builds = 0
+
+    def tearDown(self):
+        base.metadata.drop_all(bind=self.engine)
+
+    def build(self):
+        self.builds += 1
+        return {"first_name": "Álvaro", "weight": 70.5}
+
+    def test_get_or_build(self):
+        first_value = self.cache.get_or_build(self.user_id, "personal", self.build)
+        second_value = self.cache.get_or_build(self.user_id, "personal", self.build)
+
+        self.assertEqual(first_value, second_value)
+        self.assertEqual(json.loads(first_value), self.build())
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.shared.get(ProfileCache.get_key(self.user_id, "personal")), first_value)
+
+    def test_get_or_build_from_shared(self):
+        other_worker_cache = ProfileCache(LRUProfileCache(max_entries=100), self.shared)
+        other_worker_cache.get_or_build(self.user_id, "sports", self.build)
+
+        value = self.cache.get_or_build(self.user_id, "sports", self.build)
+
+        self.assertEqual(json.loads(value), {"first_name": "Álvaro", "weight": 70.5})
+        self.assertEqual(self.builds, 1)
+
+    def test_invalidate(self):
+        for profile in ["personal", "sports", "nutritional"]:
+            self.cache.get_or_build(self.user_id, profile, self.build)
+
+        self.cache.invalidate(self.user_id)
+        self.cache.get_or_build(self.user_id, "nutritional", self.build)
+
+        self.assertEqual(self.builds, 4)
+        self.assertIsNone(self.shared.get(ProfileCache.get_key(self.user_id, "personal")))
+
+    def test_get_or_build_after_update_from_other_worker(self):
+        other_worker_cache = ProfileCache(LRUProfileCache(max_entries=100), self.shared)
+        self.cache.get_or_build(self.user_id, "personal", self.build)
+
+        other_worker_cache.invalidate(self.user_id)
+        self.cache.get_or_build(self.user_id, "personal", self.build)
+
+        self.assertEqual(self.builds, 2)
+
+    def test_get_or_build_started_before_update_from_other_worker(self):
+        other_worker_cache = ProfileCache(LRUProfileCache(max_entries=100), self.shared)
+
+        def build_during_update():
+            other_worker_cache.invalidate(self.user_id)
+            return self.build()
+
+        self.cache.get_or_build(self.user_id, "personal", build_during_update)
+        self.cache.get_or_build(self.user_id, "personal", self.build)
+        other_worker_cache.get_or_build(self.user_id, "personal", self.build)
+
+        self.assertEqual(self.builds, 2)
+
+    def test_get_or_build_started_before_local_update(self):
+        cache = ProfileCache(LRUProfileCache(max_entries=100))
+
+        def build_during_update():
+            cache.invalidate(self.user_id)
+            return self.build()
+
+        cache.get_or_build(self.user_id, "personal", build_during_update)
+        cache.get_or_build(self.user_id, "personal", self.build)
+
+        self.assertEqual(self.builds, 2)
+
+    def test_render(self):
+        self.assertEqual(ProfileCache.render({"name": "Álvaro", "values": [1, 2]}), '{"name":"Álvaro","values":[1,2]}'.encode("utf-8"))
+
+    def test_create_profile_cache(self):
+        self.assertIsNone(create_profile_cache("memory").shared)
+        self.assertIsInstance(create_profile_cache("database").shared, DatabaseProfileCache)
+
+    def test_create_profile_cache_with_several_workers(self):
+        Config.WEB_CONCURRENCY = 2
+        try:
+            self.assertEqual(create_profile_cache("memory").local.max_entries, 0)
+            self.assertGreater(create_profile_cache("database").local.max_entries, 0)
+        finally:
+            Config.WEB_CONCURRENCY = 1
@@ -0,0 +1,257 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import faker
+from sqlalchemy import create_engine, StaticPool
+from sqlalchemy.orm import sessionmaker
+
+from app.config.db import base
+from app.exceptions.exceptions import EntityExistsError
+from app.models.users import UserRegistration, RegistrationStatus
+from app.services.registration_queue import InMemoryRegistrationQueue, DatabaseRegistrationQueue, create_registration_queue
+from tests.utils.users_util import generate_random_user_create_data
+
+fake = faker.Faker()
+
+
+def generate_created_user(pending_registration):
+    return {
+        "user_id": fake.uuid4(),
+        "first_name": pending_registration.user["first_name"],
+        "last_name": pending_registration.user["last_name"],
+        "email": pending_registration.user["email"],
+    }
+
+
+class TestInMemoryRegistrationQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.queue = InMemoryRegistrationQueue()
+
+    async def test_submit_hashes_password(self):
+        user = generate_random_user_create_data(fake)
+
+        pending_registration = await self.queue.submit(user)
+
+        self.assertEqual(pending_registration.user["email"], user.email)
+        self.assertNotEqual(pending_registration.user["hashed_password"], user.password)
+        self.assertNotIn("password", pending_registration.user)
+
+    async def test_get_batch_flushes_when_full(self):
+        users = [generate_random_user_create_data(fake) for _ in range(3)]
+        for user in users:
+            await self.queue.submit(user)
+
+        batch = await asyncio.wait_for(self.queue.get_batch(2, 60), 1)
+
+        self.assertEqual([pending_registration.user["email"] for pending_registration in batch], [user.email for user in users[:2]])
+        self.assertEqual(self.queue.qsize(), 1)
+
+    async def test_get_batch_flushes_on_deadline(self):
+        user = generate_random_user_create_data(fake)
+        await self.queue.submit(user)
+
+        batch = await asyncio.wait_for(self.queue.get_batch(50, 0.01), 1)
+
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(batch[0].user["email"], user.email)
+
+    async def test_get_batch_waits_for_first_registration(self):
+        batch_task = asyncio.create_task(self.queue.get_batch(50, 0.01))
+        await asyncio.sleep(0.02)
+        self.assertFalse(batch_task.done())
+
+        await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(batch_task, 1)
+
+        self.assertEqual(len(batch), 1)
+
+    async def test_depth(self):
+        for _ in range(3):
+            await self.queue.submit(generate_random_user_create_data(fake))
+
+        self.assertEqual(await self.queue.depth(), 3)
+
+    async def test_complete_notifies_waiters(self):
+        pending_registrations = [await self.queue.submit(generate_random_user_create_data(fake)) for _ in range(2)]
+        user_created = generate_created_user(pending_registrations[0])
+        pending_registrations[0].resolve(user_created)
+        pending_registrations[1].reject(EntityExistsError("User already exists"))
+
+        await self.queue.complete(pending_registrations)
+
+        self.assertEqual(await self.queue.wait(pending_registrations[0]), user_created)
+        with self.assertRaises(EntityExistsError):
+            await self.queue.wait(pending_registrations[1])
+
+    async def test_complete_after_disconnect(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        pending_registration.result.cancel()
+
+        pending_registration.resolve({"user_id": fake.uuid4()})
+        await self.queue.complete([pending_registration])
+
+        self.assertTrue(pending_registration.result.cancelled())
+
+    async def test_release_requeues_registrations(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await self.queue.get_batch(1, 0)
+        batch[0].reject(Exception("Database error"))
+
+        await self.queue.release(batch)
+
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertIsNone(pending_registration.error)
+
+
+class TestDatabaseRegistrationQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.queue = DatabaseRegistrationQueue(self.session_factory, poll_seconds=0.01, claim_timeout_seconds=60)
+        # A second worker sharing the same table
+        self.other_worker_queue = DatabaseRegistrationQueue(self.session_factory, poll_seconds=0.01, claim_timeout_seconds=60)
+
+    async def asyncTearDown(self):
+        base.metadata.drop_all(bind=self.engine)
+
+    def get_registration(self, registration_id):
+        with self.session_factory() as db:
+            return db.get(UserRegistration, registration_id)
+
+    async def test_submit_stores_registration(self):
+        user = generate_random_user_create_data(fake)
+
+        pending_registration = await self.queue.submit(user)
+        registration = self.get_registration(pending_registration.registration_id)
+
+        self.assertEqual(registration.email, user.email)
+        self.assertEqual(registration.status, RegistrationStatus.PENDING)
+        self.assertEqual(registration.hashed_password, pending_registration.user["hashed_password"])
+        self.assertNotEqual(registration.hashed_password, user.password)
+
+    async def test_get_batch_claims_registrations_once(self):
+        for _ in range(3):
+            await self.queue.submit(generate_random_user_create_data(fake))
+
+        first_batch = await asyncio.wait_for(self.queue.get_batch(2, 0), 1)
+        second_batch = await asyncio.wait_for(self.other_worker_queue.get_batch(2, 0), 1)
+
+        self.assertEqual(len(first_batch), 2)
+        self.assertEqual(len(second_batch), 1)
+        self.assertFalse({pending.registration_id for pending in first_batch} & {pending.registration_id for pending in second_batch})
+        self.assertTrue(all(self.get_registration(pending.registration_id).status == RegistrationStatus.PROCESSING for pending in first_batch + second_batch))
+
+    async def test_depth(self):
+        for _ in range(3):
+            await self.queue.submit(generate_random_user_create_data(fake))
+        await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+
+        self.assertEqual(await self.other_worker_queue.depth(), 2)
+
+    async def test_get_batch_reclaims_expired_claims(self):
+        await self.queue.submit(generate_random_user_create_data(fake))
+        await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+        self.other_worker_queue.claim_timeout_seconds = 0
+
+        batch = await asyncio.wait_for(self.other_worker_queue.get_batch(1, 0), 1)
+
+        self.assertEqual(len(batch), 1)
+
+    async def test_release_returns_claims_to_pending(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+
+        await self.queue.release(batch)
+        other_worker_batch = await asyncio.wait_for(self.other_worker_queue.get_batch(1, 0), 1)
+
+        self.assertEqual([pending.registration_id for pending in other_worker_batch], [pending_registration.registration_id])
+
+    async def test_wait_local_registration(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+        user_created = generate_created_user(batch[0])
+        batch[0].resolve(user_created)
+
+        await self.queue.complete(batch)
+
+        self.assertIs(batch[0].result, pending_registration.result)
+        self.assertEqual(await asyncio.wait_for(self.queue.wait(pending_registration), 1), user_created)
+        registration = self.get_registration(pending_registration.registration_id)
+        self.assertEqual(registration.status, RegistrationStatus.CREATED)
+        self.assertIsNone(registration.hashed_password)
+
+    async def test_wait_local_claim_does_not_poll(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+        wait_task = asyncio.create_task(self.queue.wait(pending_registration))
+
+        with patch.object(self.queue, "_get_outcome", wraps=self.queue._get_outcome) as mocked_get_outcome:
+            await asyncio.sleep(0.05)
+            user_created = generate_created_user(batch[0])
+            batch[0].resolve(user_created)
+            await self.queue.complete(batch)
+
+            self.assertEqual(await asyncio.wait_for(wait_task, 1), user_created)
+            mocked_get_outcome.assert_not_called()
+
+    async def test_complete_notifies_local_waiters_when_outcomes_are_not_stored(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.queue.get_batch(1, 0), 1)
+        user_created = generate_created_user(batch[0])
+        batch[0].resolve(user_created)
+
+        with patch.object(self.queue, "_store_outcomes", side_effect=Exception("Database error")):
+            with self.assertRaises(Exception):
+                await self.queue.complete(batch)
+
+        self.assertEqual(await asyncio.wait_for(self.queue.wait(pending_registration), 1), user_created)
+
+    async def test_wait_registration_completed_by_other_worker(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.other_worker_queue.get_batch(1, 0), 1)
+        user_created = generate_created_user(batch[0])
+        batch[0].resolve(user_created)
+        self.assertIsNone(batch[0].result)
+
+        await self.other_worker_queue.complete(batch)
+
+        self.assertEqual(await asyncio.wait_for(self.queue.wait(pending_registration), 1), user_created)
+
+    async def test_wait_existing_email_completed_by_other_worker(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.other_worker_queue.get_batch(1, 0), 1)
+        batch[0].reject(EntityExistsError("User already exists"))
+
+        await self.other_worker_queue.complete(batch)
+
+        with self.assertRaises(EntityExistsError):
+            await asyncio.wait_for(self.queue.wait(pending_registration), 1)
+
+    async def test_wait_failed_registration_completed_by_other_worker(self):
+        pending_registration = await self.queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(self.other_worker_queue.get_batch(1, 0), 1)
+        batch[0].reject(Exception("Database error"))
+
+        await self.other_worker_queue.complete(batch)
+
+        with self.assertRaises(Exception):
+            await asyncio.wait_for(self.queue.wait(pending_registration), 1)
+        self.assertEqual(self.get_registration(pending_registration.registration_id).status, RegistrationStatus.FAILED)
+
+    async def test_get_batch_waits_for_first_registration(self):
+        batch_task = asyncio.create_task(self.queue.get_batch(50, 0))
+        await asyncio.sleep(0.03)
+        self.assertFalse(batch_task.done())
+
+        await self.other_worker_queue.submit(generate_random_user_create_data(fake))
+        batch = await asyncio.wait_for(batch_task, 1)
+
+        self.assertEqual(len(batch), 1)
+
+
+class TestCreateRegistrationQueue(unittest.TestCase):
+    def test_create_registration_queue(self):
+        self.assertIsInstance(create_registration_queue("memory"), InMemoryRegistrationQueue)
+        self.assertIsInstance(create_registration_queue("database"), DatabaseRegistrationQueue)
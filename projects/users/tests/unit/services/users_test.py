@@ -1,3 +1,5 @@
+import hashlib
+import json
 import unittest
 
 from unittest.mock import MagicMock, patch
@@ -9,6 +11,8 @@ from sqlalchemy.orm import Session
 from app.models.mappers.user_mapper import DataClassMapper
 from app.models.schemas.profiles_schema import UserSportsProfileUpdate
 from app.models.schemas.schema import CreateTrainingLimitation
+from app.security.passwords import PasswordManager
+from app.services.profile_cache import ProfileCache, LRUProfileCache
 from app.services.users import UsersService
 from app.exceptions.exceptions import NotFoundError, InvalidCredentialsError, PlanPaymentError
 from app.models.users import User, NutritionalLimitation, TrainingLimitation, UserSubscriptionType, PremiumAppointmentType
@@ -38,36 +42,47 @@ class TestUsersService(unittest.TestCase):
         self.users_service = UsersService(db=self.mock_db)
         self.users_service.jwt_manager = self.mock_jwt
         self.users_service.external_services = self.external_services
+        self.users_service.profile_cache = ProfileCache(LRUProfileCache(100))
 
-    @patch("hashlib.sha256")
-    def test_create_users(self, mock_sha256):
-        user_1 = generate_random_user_create_data(fake)
-        user_2 = generate_random_user_create_data(fake)
-        user_3 = generate_random_user_create_data(fake)
-
-        users_data = [user_1, user_2, user_3]
-
-        users_created_fetch_all = [
-            [user_1.first_name, user_1.last_name, user_1.email, "hashed" + user_1.password],
-            [user_2.first_name, user_2.last_name, user_2.email, "hashed" + user_2.password],
-            [user_3.first_name, user_3.last_name, user_3.email, "hashed" + user_3.password],
+    def test_create_users(self):
+        users_data = [
+            {"first_name": user.first_name, "last_name": user.last_name, "email": user.email, "hashed_password": f"hashed-{user.password}"}
+            for user in [generate_random_user_create_data(fake) for _ in range(3)]
         ]
 
+        users_created_fetch_all = [[fake.uuid4(), user["first_name"], user["last_name"], user["email"]] for user in users_data]
+
         execute_mock = MagicMock()
         self.mock_db.execute.return_value = execute_mock
         execute_mock.fetchall.return_value = users_created_fetch_all
         self.mock_db.commit.return_value = None
-        self.users_service.create_users(users_data)
+        users_created, conflicting_emails = self.users_service.create_users(users_data)
 
-        sha256_mock = MagicMock()
-        mock_sha256.return_value = sha256_mock
-        sha256_mock.update.return_value = None
-        sha256_mock.hexdigest.side_effect = lambda password, salt: b"hashed" + password
-
-        self.assertEqual(mock_sha256.call_count, 3)
         self.assertEqual(self.mock_db.execute.call_count, 1)
         self.assertEqual(execute_mock.fetchall.call_count, 1)
         self.assertEqual(self.mock_db.commit.call_count, 1)
+        self.assertEqual([user["email"] for user in users_created], [user["email"] for user in users_data])
+        self.assertEqual(conflicting_emails, [])
+
+    def test_create_users_conflicting_emails(self):
+        users_data = [
+            {"first_name": user.first_name, "last_name": user.last_name, "email": user.email, "hashed_password": f"hashed-{user.password}"}
+            for user in [generate_random_user_create_data(fake) for _ in range(3)]
+        ]
+        self.mock_db.execute.return_value.fetchall.return_value = [[fake.uuid4(), users_data[1]["first_name"], users_data[1]["last_name"], users_data[1]["email"]]]
+
+        users_created, conflicting_emails = self.users_service.create_users(users_data)
+
+        self.assertEqual([user["email"] for user in users_created], [users_data[1]["email"]])
+        self.assertEqual(conflicting_emails, [users_data[0]["email"], users_data[2]["email"]])
+        self.assertIn("ON CONFLICT (email) DO NOTHING", str(self.mock_db.execute.call_args[0][0]))
+
+    def test_create_users_empty(self):
+        users_created, conflicting_emails = self.users_service.create_users([])
+
+        self.assertEqual(users_created, [])
+        self.assertEqual(conflicting_emails, [])
+        self.mock_db.execute.assert_not_called()
 
     @patch("app.models.mappers.user_mapper.DataClassMapper.to_dict")
     def test_complete_user_registration(self, mock_to_dict):
@@ -128,105 +143,40 @@ class TestUsersService(unittest.TestCase):
             self.users_service.complete_user_registration(user_id, user_additional_info)
         self.assertEqual(str(context.exception), f"User with id {user_id} not found")
 
-    @patch("app.security.passwords.PasswordManager.verify_password")
-    def test_authenticate_user_email_password(self, mock_verify_password):
-        user_credentials = generate_random_user_login_data(fake)
-
-        mock_query = MagicMock()
-        mock_filter = MagicMock()
-        mocked_user = MagicMock()
-
-        self.mock_db.query.return_value = mock_query
-        mock_query.filter.return_value = mock_filter
-        mock_filter.first.return_value = mocked_user
-        mocked_user.hashed_password = f"hashed-{user_credentials.password}"
-
-        mock_verify_password.return_value = True
-
-        token_data = {
-            "user_id": fake.uuid4(),
-            "access_token": fake.sha256(),
-            "access_token_expires_minutes": fake.random_int(min=1, max=60),
-            "refresh_token": fake.sha256(),
-            "refresh_token_expires_minutes": fake.random_int(min=1, max=60),
-        }
-        self.users_service.jwt_manager.generate_tokens.return_value = token_data
-
-        response = self.users_service.authenticate_user(user_credentials)
-
-        self.assertEqual(response, token_data)
-
-    @patch("app.security.passwords.PasswordManager.verify_password")
-    def test_authenticate_user_email_password_invalid_password(self, mock_verify_password):
-        user_credentials = generate_random_user_login_data(fake)
-        mock_query = MagicMock()
-        mock_filter = MagicMock()
-        mocked_user = MagicMock()
-
-        self.mock_db.query.return_value = mock_query
-        mock_query.filter.return_value = mock_filter
-        mock_filter.first.return_value = mocked_user
-        mock_verify_password.return_value = False
-
-        with self.assertRaises(InvalidCredentialsError) as context:
-            self.users_service.authenticate_user(user_credentials)
-        self.assertEqual(str(context.exception), "Invalid email or password")
-
-    def test_authenticate_user_email_password_user_not_found(self):
-        user_credentials = generate_random_user_login_data(fake)
-        mock_query = MagicMock()
-        mock_filter = MagicMock()
-        self.mock_db.query.return_value = mock_query
-        mock_query.filter.return_value = mock_filter
-        mock_filter.first.return_value = None
-
-        with self.assertRaises(InvalidCredentialsError) as context:
-            self.users_service.authenticate_user(user_credentials)
-        self.assertEqual(str(context.exception), "Invalid email or password")
-
-    def test_authenticate_user_refresh_token(self):
-        user_credentials = generate_random_user_login_data(fake, token=True)
+    @patch("app.models.mappers.user_mapper.DataClassMapper.to_user_personal_profile")
+    def test_get_user_personal_profile(self, mock_to_user_personal_profile):
+        user_id = fake.uuid4()
         user = generate_random_user(fake)
-        user.user_id = fake.uuid4()
-
-        token_data = {
-            "user_id": fake.uuid4(),
-            "access_token": fake.sha256(),
-            "access_token_expires_minutes": fake.random_int(min=1, max=60),
-            "refresh_token": fake.sha256(),
-            "refresh_token_expires_minutes": fake.random_int(min=1, max=60),
-        }
-        self.users_service.jwt_manager.decode_refresh_token.return_value = user.user_id
+        user_personal_profile = DataClassMapper.to_dict(generate_random_user_personal_profile(fake), pydantic=True)
         self.mock_db.query.return_value.filter.return_value.first.return_value = user
-        self.users_service.jwt_manager.generate_tokens.return_value = token_data
-
-        response = self.users_service.authenticate_user(user_credentials)
-
-        self.assertEqual(response, token_data)
-
-    def test_authenticate_user_refresh_token_invalid_token(self):
-        user_credentials = generate_random_user_login_data(fake, token=True)
+        mock_to_user_personal_profile.return_value = user_personal_profile
 
-        self.users_service.jwt_manager.decode_refresh_token.side_effect = InvalidCredentialsError("Invalid or expired refresh token")
+        response = self.users_service.get_user_personal_information(user_id)
 
-        with self.assertRaises(InvalidCredentialsError) as context:
-            self.users_service.authenticate_user(user_credentials)
-        self.assertEqual(str(context.exception), "Invalid or expired refresh token")
+        self.assertEqual(json.loads(response), user_personal_profile)
+        mock_to_user_personal_profile.assert_called_once_with(user)
+        self.mock_db.query.assert_called_once_with(User)
+        self.mock_db.query.return_value.filter.assert_called_once()
 
     @patch("app.models.mappers.user_mapper.DataClassMapper.to_user_personal_profile")
-    def test_get_user_personal_profile(self, mock_to_user_personal_profile):
+    def test_get_user_personal_profile_cached(self, mock_to_user_personal_profile):
         user_id = fake.uuid4()
         user = generate_random_user(fake)
-        user_personal_profile = generate_random_user_personal_profile(fake)
+        user.user_id = user_id
         self.mock_db.query.return_value.filter.return_value.first.return_value = user
-        mock_to_user_personal_profile.return_value = user_personal_profile
+        mock_to_user_personal_profile.return_value = {"first_name": user.first_name}
 
-        response = self.users_service.get_user_personal_information(user_id)
+        first_response = self.users_service.get_user_personal_information(user_id)
+        second_response = self.users_service.get_user_personal_information(user_id)
 
-        self.assertEqual(response, user_personal_profile)
+        self.assertEqual(first_response, second_response)
         mock_to_user_personal_profile.assert_called_once_with(user)
         self.mock_db.query.assert_called_once_with(User)
-        self.mock_db.query.return_value.filter.assert_called_once()
+
+        self.users_service.update_user_personal_information(user_id, generate_random_user_personal_profile(fake))
+        mock_to_user_personal_profile.return_value = {"first_name": "Updated"}
+
+        self.assertEqual(json.loads(self.users_service.get_user_personal_information(user_id)), {"first_name": "Updated"})
 
     def test_get_user_personal_profile_user_not_found(self):
         user_id = fake.uuid4()
@@ -245,7 +195,7 @@ class TestUsersService(unittest.TestCase):
         self.mock_db.query.return_value.filter.return_value.first.return_value = user
         mock_to_user_sports_profile.return_value = user_sports_profile_dict
 
-        response = self.users_service.get_user_sports_information(user_id)
+        response = json.loads(self.users_service.get_user_sports_information(user_id))
 
         self.assertEqual(response, user_sports_profile_dict)
         mock_to_user_sports_profile.assert_called_once_with(user)
@@ -263,7 +213,7 @@ class TestUsersService(unittest.TestCase):
         self.mock_db.query.return_value.filter.return_value.first.return_value = user
         mock_to_user_sports_profile.return_value = user_sports_profile_dict
 
-        response = self.users_service.get_user_sports_information(user_id)
+        response = json.loads(self.users_service.get_user_sports_information(user_id))
 
         self.assertEqual(response, user_sports_profile_dict)
         self.assertNotIn("bmi", response)
@@ -291,7 +241,7 @@ class TestUsersService(unittest.TestCase):
         self.mock_db.query.return_value.filter.return_value.first.return_value = user
         mock_to_user_nutritional_profile.return_value = user_nutritional_profile_dict
 
-        response = self.users_service.get_user_nutritional_information(user_id)
+        response = json.loads(self.users_service.get_user_nutritional_information(user_id))
 
         self.assertEqual(response, user_nutritional_profile_dict)
         mock_to_user_nutritional_profile.assert_called_once_with(user)
@@ -669,3 +619,110 @@ class TestUsersService(unittest.TestCase):
             self.assertIn("trainer_id", trainer)
             self.assertIn("first_name", trainer)
             self.assertIn("last_name", trainer)
+
+
+class TestUsersServiceAuthentication(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_db = MagicMock(spec=Session)
+        self.users_service = UsersService(db=self.mock_db)
+        self.users_service.jwt_manager = MagicMock()
+        self.users_service.external_services = MagicMock()
+
+    @patch("app.security.passwords.PasswordManager.verify_password_async")
+    async def test_authenticate_user_email_password(self, mock_verify_password):
+        user_credentials = generate_random_user_login_data(fake)
+
+        mock_query = MagicMock()
+        mock_filter = MagicMock()
+        mocked_user = MagicMock()
+
+        self.mock_db.query.return_value = mock_query
+        mock_query.filter.return_value = mock_filter
+        mock_filter.first.return_value = mocked_user
+        mocked_user.hashed_password = PasswordManager.get_password_hash(user_credentials.password)
+
+        mock_verify_password.return_value = True
+
+        token_data = {
+            "user_id": fake.uuid4(),
+            "access_token": fake.sha256(),
+            "access_token_expires_minutes": fake.random_int(min=1, max=60),
+            "refresh_token": fake.sha256(),
+            "refresh_token_expires_minutes": fake.random_int(min=1, max=60),
+        }
+        self.users_service.jwt_manager.generate_tokens.return_value = token_data
+
+        response = await self.users_service.authenticate_user(user_credentials)
+
+        self.assertEqual(response, token_data)
+        self.mock_db.commit.assert_not_called()
+
+    async def test_authenticate_user_email_password_legacy_hash(self):
+        user_credentials = generate_random_user_login_data(fake)
+        mocked_user = MagicMock()
+        mocked_user.hashed_password = hashlib.sha256(user_credentials.password.encode()).hexdigest()
+        self.mock_db.query.return_value.filter.return_value.first.return_value = mocked_user
+        self.users_service.jwt_manager.generate_tokens.return_value = {"access_token": fake.sha256()}
+
+        await self.users_service.authenticate_user(user_credentials)
+
+        self.assertTrue(mocked_user.hashed_password.startswith("$2"))
+        self.assertTrue(PasswordManager.verify_password(user_credentials.password, mocked_user.hashed_password))
+        self.mock_db.commit.assert_called_once()
+
+    @patch("app.security.passwords.PasswordManager.verify_password_async")
+    async def test_authenticate_user_email_password_invalid_password(self, mock_verify_password):
+        user_credentials = generate_random_user_login_data(fake)
+        mock_query = MagicMock()
+        mock_filter = MagicMock()
+        mocked_user = MagicMock()
+
+        self.mock_db.query.return_value = mock_query
+        mock_query.filter.return_value = mock_filter
+        mock_filter.first.return_value = mocked_user
+        mock_verify_password.return_value = False
+
+        with self.assertRaises(InvalidCredentialsError) as context:
+            await self.users_service.authenticate_user(user_credentials)
+        self.assertEqual(str(context.exception), "Invalid email or password")
+
+    async def test_authenticate_user_email_password_user_not_found(self):
+        user_credentials = generate_random_user_login_data(fake)
+        mock_query = MagicMock()
+        mock_filter = MagicMock()
+        self.mock_db.query.return_value = mock_query
+        mock_query.filter.return_value = mock_filter
+        mock_filter.first.return_value = None
+
+        with self.assertRaises(InvalidCredentialsError) as context:
+            await self.users_service.authenticate_user(user_credentials)
+        self.assertEqual(str(context.exception), "Invalid email or password")
+
+    async def test_authenticate_user_refresh_token(self):
+        user_credentials = generate_random_user_login_data(fake, token=True)
+        user = generate_random_user(fake)
+        user.user_id = fake.uuid4()
+
+        token_data = {
+            "user_id": fake.uuid4(),
+            "access_token": fake.sha256(),
+            "access_token_expires_minutes": fake.random_int(min=1, max=60),
+            "refresh_token": fake.sha256(),
+            "refresh_token_expires_minutes": fake.random_int(min=1, max=60),
+        }
+        self.users_service.jwt_manager.decode_refresh_token.return_value = user.user_id
+        self.mock_db.query.return_value.filter.return_value.first.return_value = user
+        self.users_service.jwt_manager.generate_tokens.return_value = token_data
+
+        response = await self.users_service.authenticate_user(user_credentials)
+
+        self.assertEqual(response, token_data)
+
+    async def test_authenticate_user_refresh_token_invalid_token(self):
+        user_credentials = generate_random_user_login_data(fake, token=True)
+
+        self.users_service.jwt_manager.decode_refresh_token.side_effect = InvalidCredentialsError("Invalid or expired refresh token")
+
+        with self.assertRaises(InvalidCredentialsError) as context:
+            await self.users_service.authenticate_user(user_credentials)
+        self.assertEqual(str(context.exception), "Invalid or expired refresh token")
@@ -1,28 +1,31 @@
+import asyncio
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import faker
 
+from app.exceptions.exceptions import EntityExistsError
 from app.tasks import sync_db
-from app.utils.user_cache import UserCache
+from app.services.registration_queue import InMemoryRegistrationQueue
 from app.config.settings import Config
 from tests.utils.users_util import generate_random_user_create_data
 
 
-async def modified_sleep(seconds):
-    Config.SYNC_USERS = False
+fake = faker.Faker()
 
 
-fake = faker.Faker()
+def generate_created_user(user):
+    return {"email": user.email, "first_name": user.first_name, "last_name": user.last_name, "user_id": fake.uuid4()}
 
 
 class TestSyncDb(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
-        UserCache.users = []
-        UserCache.users_with_errors_by_email_map = {}
-        UserCache.users_success_by_email_map = {}
-        Config.TOTAL_USERS_BY_RUN = 0
+        Config.REGISTRATION_MIN_BATCH_SIZE = 10
+        Config.REGISTRATION_MAX_BATCH_SIZE = 500
         Config.SYNC_USERS = True
+        Config.REGISTRATION_RETRY_MIN_SECONDS = 0
+        Config.REGISTRATION_RETRY_MAX_SECONDS = 0
+        self.queue = InMemoryRegistrationQueue()
         self.mock_db = MagicMock()
         self.user_1 = generate_random_user_create_data(fake)
         self.user_2 = generate_random_user_create_data(fake)
@@ -30,69 +33,142 @@ class TestSyncDb(unittest.IsolatedAsyncioTestCase):
 
     @patch("app.services.users.UsersService.create_users")
     async def test_sync_users(self, mock_create_users):
-        UserCache.users = [self.user_1, self.user_2, self.user_3]
-
-        mock_query = MagicMock()
-        mock_filter = MagicMock()
-
-        self.mock_db.query.return_value = mock_query
-        mock_query.filter.return_value = mock_filter
-        mock_filter.all.return_value = []
-
-        fake_created_users = [
-            {
-                "email": self.user_1.email,
-                "first_name": self.user_1.first_name,
-                "last_name": self.user_1.last_name,
-                "user_id": fake.uuid4(),
-            },
-            {
-                "email": self.user_2.email,
-                "first_name": self.user_2.first_name,
-                "last_name": self.user_2.last_name,
-                "user_id": fake.uuid4(),
-            },
-        ]
-        mock_create_users.return_value = fake_created_users
-        Config.TOTAL_USERS_BY_RUN = 2
-        await sync_db.sync_users(self.mock_db, modified_sleep)
+        pending_registrations = [await self.queue.submit(user) for user in [self.user_1, self.user_2, self.user_3]]
+        fake_created_users = [generate_created_user(self.user_1), generate_created_user(self.user_2)]
+
+        def stop_sync(users):
+            Config.SYNC_USERS = False
+            return fake_created_users, []
+
+        mock_create_users.side_effect = stop_sync
+        Config.REGISTRATION_MIN_BATCH_SIZE = 1
+        Config.REGISTRATION_MAX_BATCH_SIZE = 2
+        await sync_db.sync_users(self.mock_db, self.queue)
 
         self.assertEqual(mock_create_users.call_count, 1)
-        self.assertEqual(self.mock_db.query.call_count, 1)
-        self.assertEqual(mock_query.filter.call_count, 1)
-        self.assertEqual(mock_filter.all.call_count, 1)
-        self.assertEqual(len(UserCache.users), 1)
-        self.assertEqual(UserCache.users[0], self.user_3)
-        self.assertEqual(len(UserCache.users_success_by_email_map), 2)
-        self.assertEqual(len(UserCache.users_with_errors_by_email_map), 0)
+        self.assertEqual([user["email"] for user in mock_create_users.call_args[0][0]], [self.user_1.email, self.user_2.email])
+        self.assertEqual(await pending_registrations[0].result, fake_created_users[0])
+        self.assertEqual(await pending_registrations[1].result, fake_created_users[1])
+        self.assertFalse(pending_registrations[2].result.done())
+        self.assertEqual(self.queue.qsize(), 1)
 
     @patch("app.services.users.UsersService.create_users")
     async def test_sync_users_with_repeated_email(self, mock_create_users):
-        UserCache.users = [self.user_1, self.user_2, self.user_3]
-
-        mock_query = MagicMock()
-        mock_filter = MagicMock()
-
-        self.mock_db.query.return_value = mock_query
-        mock_query.filter.return_value = mock_filter
-        mock_filter.all.return_value = [self.user_1, self.user_2]
-        fake_created_user = {
-            "email": self.user_3.email,
-            "first_name": self.user_3.first_name,
-            "last_name": self.user_3.last_name,
-            "user_id": fake.uuid4(),
-        }
-        mock_create_users.return_value = [fake_created_user]
-        Config.TOTAL_USERS_BY_RUN = 3
-        await sync_db.sync_users(self.mock_db, modified_sleep)
+        pending_registrations = [await self.queue.submit(user) for user in [self.user_1, self.user_2, self.user_3]]
+        fake_created_user = generate_created_user(self.user_3)
+        mock_create_users.return_value = [fake_created_user], [self.user_1.email, self.user_2.email]
 
-        self.assertEqual(mock_create_users.call_count, 1)
-        self.assertEqual(self.mock_db.query.call_count, 1)
-        self.assertEqual(mock_query.filter.call_count, 1)
-        self.assertEqual(mock_filter.all.call_count, 1)
-        self.assertEqual(len(UserCache.users), 0)
-        self.assertEqual(len(UserCache.users_success_by_email_map), 1)
-        self.assertEqual(len(UserCache.users_with_errors_by_email_map), 2)
-
-    async def test_sync_users_empty_users(self):
-        await sync_db.sync_users(self.mock_db, modified_sleep)
+        batch = await self.queue.get_batch(3, 0)
+        sync_db.process_registrations(self.mock_db, batch)
+        await self.queue.complete(batch)
+
+        mock_create_users.assert_called_once_with([pending_registration.user for pending_registration in pending_registrations])
+        with self.assertRaises(EntityExistsError):
+            await pending_registrations[0].result
+        with self.assertRaises(EntityExistsError):
+            await pending_registrations[1].result
+        self.assertEqual(await pending_registrations[2].result, fake_created_user)
+
+    @patch("app.services.users.UsersService.create_users")
+    async def test_sync_users_with_repeated_email_in_batch(self, mock_create_users):
+        self.user_2.email = self.user_1.email
+        pending_registrations = [await self.queue.submit(user) for user in [self.user_1, self.user_2]]
+        fake_created_user = generate_created_user(self.user_1)
+        mock_create_users.return_value = [fake_created_user], []
+
+        batch = await self.queue.get_batch(2, 0)
+        sync_db.process_registrations(self.mock_db, batch)
+        await self.queue.complete(batch)
+
+        mock_create_users.assert_called_once_with([pending_registrations[0].user])
+        self.assertEqual(await pending_registrations[0].result, fake_created_user)
+        with self.assertRaises(EntityExistsError):
+            await pending_registrations[1].result
+
+    @patch("app.services.users.UsersService.create_users")
+    async def test_sync_users_insert_error(self, mock_create_users):
+        pending_registration = await self.queue.submit(self.user_1)
+        mock_create_users.side_effect = Exception("Database error")
+
+        batch = await self.queue.get_batch(1, 0)
+        sync_db.process_registrations(self.mock_db, batch)
+        await self.queue.complete(batch)
+
+        self.mock_db.rollback.assert_called_once()
+        with self.assertRaises(Exception):
+            await pending_registration.result
+
+    @patch("app.services.users.UsersService.create_users")
+    async def test_sync_users_keeps_running_after_queue_error(self, mock_create_users):
+        pending_registration = await self.queue.submit(self.user_1)
+        get_batch = self.queue.get_batch
+
+        async def fail_once(max_size, max_wait_seconds):
+            if self.queue.get_batch.call_count == 1:
+                raise Exception("Queue unavailable")
+            return await get_batch(max_size, max_wait_seconds)
+
+        self.queue.get_batch = AsyncMock(side_effect=fail_once)
+        fake_created_user = generate_created_user(self.user_1)
+
+        def stop_sync(users):
+            Config.SYNC_USERS = False
+            return [fake_created_user], []
+
+        mock_create_users.side_effect = stop_sync
+        await asyncio.wait_for(sync_db.sync_users(self.mock_db, self.queue), 1)
+
+        self.mock_db.rollback.assert_called_once()
+        self.assertEqual(self.queue.get_batch.call_count, 2)
+        self.assertEqual(await pending_registration.result, fake_created_user)
+
+    @patch("app.services.users.UsersService.create_users")
+    async def test_sync_users_releases_batch_after_error(self, mock_create_users):
+        pending_registration = await self.queue.submit(self.user_1)
+        fake_created_user = generate_created_user(self.user_1)
+        mock_create_users.return_value = [fake_created_user], []
+
+        def stop_sync(db, pending_registrations):
+            if self.process_registrations.call_count == 1:
+                raise Exception("Unexpected error")
+            Config.SYNC_USERS = False
+            process_registrations(db, pending_registrations)
+
+        process_registrations = sync_db.process_registrations
+        with patch("app.tasks.sync_db.process_registrations", side_effect=stop_sync) as self.process_registrations:
+            await asyncio.wait_for(sync_db.sync_users(self.mock_db, self.queue), 1)
+
+        self.assertEqual(self.process_registrations.call_count, 2)
+        self.assertEqual(await pending_registration.result, fake_created_user)
+        self.assertEqual(self.queue.qsize(), 0)
+
+    @patch("app.services.users.UsersService.create_users")
+    async def test_sync_users_stores_outcomes_again_after_complete_error(self, mock_create_users):
+        pending_registration = await self.queue.submit(self.user_1)
+        fake_created_user = generate_created_user(self.user_1)
+        mock_create_users.return_value = [fake_created_user], []
+        complete = self.queue.complete
+
+        async def fail_once(pending_registrations):
+            if self.queue.complete.call_count == 1:
+                raise Exception("Queue unavailable")
+            Config.SYNC_USERS = False
+            await complete(pending_registrations)
+
+        self.queue.complete = AsyncMock(side_effect=fail_once)
+        await asyncio.wait_for(sync_db.sync_users(self.mock_db, self.queue), 1)
+
+        mock_create_users.assert_called_once()
+        self.assertEqual(self.queue.complete.call_args[0][0][0].registration_id, pending_registration.registration_id)
+        self.assertEqual(await pending_registration.result, fake_created_user)
+
+    async def test_sync_users_disabled(self):
+        Config.SYNC_USERS = False
+        await sync_db.sync_users(self.mock_db, self.queue)
+
+        self.mock_db.execute.assert_not_called()
+
+    def test_get_batch_size(self):
+        self.assertEqual(sync_db.get_batch_size(0), 10)
+        self.assertEqual(sync_db.get_batch_size(120), 120)
+        self.assertEqual(sync_db.get_batch_size(10000), 500)